@@ -0,0 +1,64 @@
+import argparse
+import copy
+import time
+import numpy as np
+import torch
+import yaml
+from src.agents.dqn_agent import DQNAgent
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+def make_agent(config, state_size, action_size, **overrides):
+    config = dict(copy.deepcopy(config), **overrides)
+    agent = DQNAgent(state_size, action_size, seed=0, config=config)
+    # Fill the replay buffer with random transitions, no simulator needed
+    n = config['memory_size']
+    rng = np.random.default_rng(0)
+    masks = np.ones((n, action_size), dtype=bool)
+    masks[:, action_size // 2:] = rng.random((n, action_size - action_size // 2)) < 0.5
+    agent.memory.add_batch(rng.random((n, state_size), dtype=np.float32), rng.integers(0, action_size, n),
+                           rng.standard_normal(n).astype(np.float32), rng.random((n, state_size), dtype=np.float32),
+                           (rng.random(n) < 0.01).astype(np.float32), masks,
+                           np.full(n, agent.gamma ** agent.n_step, dtype=np.float32))
+    return agent
+
+def time_learn(agent, updates, warmup):
+    """Average wall time of one sample() + learn() call, in milliseconds."""
+    for _ in range(warmup):
+        agent.learn(agent.memory.sample(), agent.gamma)
+    if agent.device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(updates):
+        agent.learn(agent.memory.sample(), agent.gamma)
+    if agent.device.type == 'cuda':
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / updates * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure DQNAgent.learn() speed: reference vs fused (vs compiled) step.")
+    parser.add_argument("--updates", type=int, default=2000, help="Timed learn() calls per variant")
+    parser.add_argument("--warmup", type=int, default=100, help="Untimed learn() calls first (compilation happens here)")
+    parser.add_argument("--state-size", type=int, default=20)
+    parser.add_argument("--action-size", type=int, default=4)
+    parser.add_argument("--compile", action="store_true", help="Also time the torch.compile'd fused step")
+    args = parser.parse_args()
+
+    config = load_config("configs/agent.yaml")['agent']
+    config.update(memory_size=10000, replay_storage='array', prefetch_batches=0)
+    # n_step 1 would drop the discounts column, keep the buffer layout the same for every variant
+    config['n_step'] = max(config.get('n_step', 1), 2)
+
+    variants = [('reference', dict(fused_learn=False)), ('fused', dict(fused_learn=True, compile_learn=False))]
+    if args.compile:
+        variants.append(('fused+compile', dict(fused_learn=True, compile_learn=True)))
+
+    baseline = None
+    print(f"{'variant':<15}{'ms/update':>10}{'speedup':>10}")
+    for name, overrides in variants:
+        agent = make_agent(config, args.state_size, args.action_size, **overrides)
+        ms = time_learn(agent, args.updates, args.warmup)
+        baseline = baseline or ms
+        print(f"{name:<15}{ms:>10.3f}{baseline / ms:>9.2f}x")
@@ -3,6 +3,7 @@ import pandas as pd
 import time
 import os
 import altair as alt
+from src.analysis.metrics_tail import MetricsTail, DOWNSAMPLERS
 
 st.set_page_config(page_title="Aimsun AI Control Center", layout="wide")
 
@@ -12,7 +13,18 @@ st.markdown("Watching the AI learn to drive... hopefully it doesn't crash everyt
 # Sidebar for controls
 st.sidebar.header("Control Panel")
 refresh_rate = st.sidebar.slider("Refresh Rate (seconds)", 1, 60, 5)
-log_file = "logs/training_metrics.csv"
+max_points = st.sidebar.slider("Max Chart Points", 200, 5000, 2000, step=100)
+downsampler = st.sidebar.selectbox("Downsampling", list(DOWNSAMPLERS), format_func={'lttb': 'LTTB', 'minmax': 'Min/Max bins'}.get)
+telemetry_channel = st.sidebar.selectbox("Telemetry Channel", ['reward', 'action', 'learn'])
+# MetricTracker writes one of these depending on metrics.format in configs/logging.yaml
+log_file = "logs/training_metrics.bin" if os.path.exists("logs/training_metrics.bin") else "logs/training_metrics.csv"
+# Per-step summaries from the Telemetry channels (telemetry section of configs/logging.yaml)
+telemetry_file = "logs/telemetry.bin" if os.path.exists("logs/telemetry.bin") else "logs/telemetry.csv"
+
+@st.cache_resource
+def get_tail(path):
+    # Survives Streamlit reruns, so a slider change doesn't re-read the whole file
+    return MetricsTail(path)
 
 if not os.path.exists(log_file):
     st.error("Waiting for training to start... (No log file found)")
@@ -20,18 +32,22 @@ if not os.path.exists(log_file):
 
 # Main Dashboard Loop
 placeholder = st.empty()
+tail = get_tail(log_file)
+telemetry = get_tail(telemetry_file)
 
 while True:
     try:
-        df = pd.read_csv(log_file)
+        # Only the rows appended since the last refresh are parsed
+        tail.poll()
+        episodes, rewards = tail.column('Episode'), tail.column('Reward')
         
         with placeholder.container():
             # Metrics Row
             kpi1, kpi2, kpi3 = st.columns(3)
             
-            latest_reward = df['Reward'].iloc[-1] if not df.empty else 0
-            best_reward = df['Reward'].max() if not df.empty else 0
-            curr_episode = df['Episode'].iloc[-1] if not df.empty else 0
+            latest_reward = rewards[-1] if len(tail) else 0
+            best_reward = rewards.max() if len(tail) else 0
+            curr_episode = episodes[-1] if len(tail) else 0
             
             kpi1.metric(label="Current Episode", value=int(curr_episode))
             kpi2.metric(label="Latest Reward", value=f"{latest_reward:.2f}")
@@ -40,8 +56,10 @@ while True:
             # Charts
             st.markdown("### Learning Progress")
             
-            # Altair Chart for interactive goodness
-            chart = alt.Chart(df).mark_line(point=True).encode(
+            # Altair Chart for interactive goodness, downsampled so the chart stays small however long the run
+            kept = DOWNSAMPLERS[downsampler](episodes, rewards, max_points)
+            df = pd.DataFrame({'Episode': episodes[kept], 'Reward': rewards[kept]})
+            chart = alt.Chart(df).mark_line(point=len(kept) < 500).encode(
                 x='Episode',
                 y='Reward',
                 tooltip=['Episode', 'Reward']
@@ -51,8 +69,29 @@ while True:
             
             st.altair_chart(chart, use_container_width=True)
             
+            telemetry.poll()
+            if len(telemetry):
+                st.markdown("### Step Telemetry")
+                steps = telemetry.column('Step')
+                # Window means of the channel's series (action: the share of each action)
+                picked = [c for c in telemetry.columns if c.startswith(telemetry_channel + '/')
+                          and (telemetry_channel == 'action' or c.endswith('/mean'))]
+                if picked:
+                    kept = DOWNSAMPLERS[downsampler](steps, telemetry.column(picked[0]), max_points)
+                    df = pd.DataFrame({'Step': steps[kept], **{c: telemetry.column(c)[kept] for c in picked}})
+                    df = df.melt('Step', var_name='Series', value_name='Value')
+                    telemetry_chart = alt.Chart(df).mark_line().encode(
+                        x='Step',
+                        y='Value',
+                        color='Series',
+                        tooltip=['Step', 'Series', 'Value']
+                    ).properties(
+                        height=300
+                    ).interactive()
+                    st.altair_chart(telemetry_chart, use_container_width=True)
+
             with st.expander("See Raw Data"):
-                st.dataframe(df.tail(10))
+                st.dataframe(pd.DataFrame({name: tail.column(name)[-10:] for name in tail.columns or []}))
 
         time.sleep(refresh_rate)
         
@@ -1,20 +1,54 @@
+import argparse
 import yaml
 import os
 import numpy as np
+import random
 import time
+import torch
 from collections import deque
 from src.core.aimsun_env import AimsunEnv
 from src.agents.dqn_agent import DQNAgent
+from src.agents.inference import export_policy
 from src.analysis.logger import setup_logging, MetricTracker
+from src.analysis.profiler import profiler
+from src.analysis.telemetry import Telemetry
+from src.core.vector_env import make_vector_env
+from src.training.async_trainer import AsyncTrainer
+from src.training.checkpoint import CheckpointManager, rng_state, set_rng_state
+from src.training.episode import run_episode
+from src.training.vector_trainer import VectorTrainer
 
 def load_config(path):
     with open(path, 'r') as f:
         return yaml.safe_load(f)
 
-def run():
+def save_policy(agent, agent_config, logger):
+    # Weights for deployment (src/agents/inference.py), no optimizer or replay state
+    export = agent_config['training'].get('export')
+    if not export:
+        return
+    os.makedirs(os.path.dirname(export['path']) or '.', exist_ok=True)
+    export_policy(agent.qnetwork_local, export['path'], quantize=export.get('quantize', False))
+    logger.info(f"Exported policy to {export['path']}")
+
+def make_telemetry(logging_config, writer, agent, action_size, width):
+    # Per-step KPIs, actions and update statistics, aggregated into logs/telemetry.csv and TensorBoard
+    telemetry_config = logging_config.get('telemetry', {})
+    if not telemetry_config.get('enabled', False):
+        return None
+    telemetry = Telemetry(writer, "logs/", capacity=telemetry_config.get('capacity', 10000),
+                          aggregate_every=telemetry_config.get('aggregate_every', 500),
+                          file_format=logging_config.get('metrics', {}).get('format', 'csv'))
+    telemetry.add_channel("reward", width, fields=AimsunEnv.REWARD_COMPONENTS)
+    telemetry.add_action_channel("action", action_size, width)
+    agent.attach_telemetry(telemetry)
+    return telemetry
+
+def run(mode=None, resume=None):
     # Load Configurations
     sim_config = load_config("configs/simulation.yaml")
     agent_config = load_config("configs/agent.yaml")
+    mode = mode or agent_config['training'].get('mode', 'sync')
     
     # Setup Logging
     log_dir = "logs" # simplistic, better from config
@@ -24,14 +58,30 @@ def run():
     # Let's simple hardcode a path that both agree on or re-parse. 
     # For now, let's just assume logs/latest for the dashboard.
     
-    tracker = MetricTracker(writer, log_dir="logs/") # Just dumping in root logs/ for simplicity of the dashboard finding it.
+    logging_config = load_config("configs/logging.yaml")['logging']
+    metrics_config = logging_config.get('metrics', {})
+    tracker = MetricTracker(writer, log_dir="logs/", # Just dumping in root logs/ for simplicity of the dashboard finding it.
+                            file_format=metrics_config.get('format', 'csv'),
+                            flush_every=metrics_config.get('flush_every', 100),
+                            flush_interval=metrics_config.get('flush_interval', 5.0))
+    # Hot-path timers (no-ops unless profiling.enabled), per-episode breakdown in logs/profile.csv
+    profiling_config = logging_config.get('profiling', {})
+    profiler.configure(enabled=profiling_config.get('enabled', False),
+                       report_every=profiling_config.get('report_every', 10),
+                       log_dir="logs/", cprofile=profiling_config.get('cprofile'))
     
+    # Seed every generator the env and agent draw from, so runs (and resumed runs) are reproducible
+    seed = sim_config['simulation']['random_seed']
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
     logger.info("Initializing Aimsun Environment...")
     env = AimsunEnv(sim_config)
     
-    # Get State and Action sizes
-    state_size = env.observation_space.shape[0]
-    action_size = env.action_space.n
+    # Get State and Action sizes (per junction, the network is shared in multi-agent mode)
+    state_size = env.observation_space.shape[-1]
+    action_size = env.action_dim
     
     logger.info(f"State Size: {state_size}, Action Size: {action_size}")
     
@@ -45,42 +95,100 @@ def run():
     eps_end = agent_config['agent']['epsilon_end']
     eps_decay = agent_config['agent']['epsilon_decay']
     
+    if mode in ('async', 'vector'):
+        if resume:
+            raise ValueError(f"--resume is only supported by the sync training loop, not '{mode}'")
+        if env.multi_agent:
+            raise ValueError(f"env.multi_agent is only supported by the sync training loop, not '{mode}'")
+        env.close()
+        if mode == 'async':
+            # Actors run their own environments in separate processes, this process only learns
+            trainer = AsyncTrainer(agent, sim_config, agent_config, seed=sim_config['simulation']['random_seed'])
+            # Env steps happen in the actor processes, only the learner's update statistics are recorded here
+            telemetry = make_telemetry(logging_config, writer, agent, action_size, 1)
+        else:
+            # N environments stepped in lockstep, one batched forward pass per step
+            vector = agent_config['training'].get('vector', {})
+            vec_env = make_vector_env(sim_config, vector.get('num_envs', 4), vector.get('backend', 'sync'),
+                                      max_episode_steps=max_t)
+            telemetry = make_telemetry(logging_config, writer, agent, action_size, vec_env.num_envs)
+            trainer = VectorTrainer(agent, vec_env, agent_config, telemetry=telemetry)
+        profiler.start()
+        scores = trainer.train(n_episodes, tracker)
+        if mode == 'vector':
+            vec_env.close()
+        logger.info(f"Average Score (last 100): {np.mean(scores[-100:]):.2f}")
+        agent.memory.flush()
+        save_policy(agent, agent_config, logger)
+        if telemetry is not None:
+            telemetry.close()
+        agent.close()
+        profiler.close()
+        tracker.close()
+        logger.info("Training finished.")
+        return
+
+    telemetry = make_telemetry(logging_config, writer, agent, action_size, env.num_agents if env.multi_agent else 1)
     scores = []                        # list containing scores from each episode
     scores_window = deque(maxlen=100)  # last 100 scores
     eps = eps_start                    # initialize epsilon
+    start_episode = 1
+
+    ckpt_config = agent_config['training'].get('checkpoint', {})
+    checkpoints = CheckpointManager(ckpt_config.get('dir', 'checkpoints/'), keep_last=ckpt_config.get('keep_last', 3),
+                                    keep_best=ckpt_config.get('keep_best', 1))
+    save_freq = ckpt_config.get('save_freq', 0)
+    if resume:
+        path = checkpoints.latest() if resume == 'latest' else resume
+        checkpoint = checkpoints.load(path)
+        agent.load_state_dict(checkpoint['agent'])
+        eps, scores = checkpoint['eps'], checkpoint['scores']
+        scores_window.extend(scores[-100:])
+        start_episode = checkpoint['episode'] + 1
+        if 'env' in checkpoint:  # older checkpoints don't have the simulator's generators
+            env.load_state_dict(checkpoint['env'])
+        # Restored last, so the run continues with exactly the random draws it would have made
+        set_rng_state(checkpoint['rng'])
+        logger.info(f"Resumed from {path} at episode {start_episode}")
     
-    for i_episode in range(1, n_episodes + 1):
-        state, _ = env.reset()
-        score = 0
-        for t in range(max_t):
-            action = agent.act(state, eps)
-            next_state, reward, done, truncated, _ = env.step(action)
-            
-            agent.step(state, action, reward, next_state, done)
-            state = next_state
-            score += reward
-            
-            if done or truncated:
-                break 
-                
+    profiler.start(start_episode)
+    for i_episode in range(start_episode, n_episodes + 1):
+        score = run_episode(env, agent, eps, max_t, telemetry)
         scores_window.append(score)       # save most recent score
         scores.append(score)              # save most recent score
         
         eps = max(eps_end, eps_decay * eps) # decrease epsilon
         
-        tracker.log_episode(i_episode, score, eps)
+        with profiler.section("metrics.log"):
+            tracker.log_episode(i_episode, score, eps)
         
         print('\rEpisode {}\tAverage Score: {:.2f}'.format(i_episode, np.mean(scores_window)), end="")
         if i_episode % 100 == 0:
             print('\rEpisode {}\tAverage Score: {:.2f}'.format(i_episode, np.mean(scores_window)))
             
-        if i_episode % agent_config['logging']['save_freq'] == 0:
-             # Save model
-             # agent.save("checkpoint.pth")
-             pass
+        if save_freq and i_episode % save_freq == 0:
+            # Snapshot is copied here, serialization and disk writes happen on the writer thread
+            checkpoints.save({'agent': agent.state_dict(), 'episode': i_episode, 'eps': eps,
+                              'scores': list(scores), 'rng': rng_state(), 'env': env.state_dict()},
+                             i_episode, float(np.mean(scores_window)))
+        profiler.end_episode(i_episode)
 
+    checkpoints.close()
+    env.close()
+    agent.memory.flush() # Keeps a disk-backed replay buffer around for the next run
+    save_policy(agent, agent_config, logger)
+    if telemetry is not None:
+        telemetry.close()
+    agent.close()
+    profiler.close()
     tracker.close()
     logger.info("Training finished.")
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Train the DQN traffic signal agent.")
+    parser.add_argument("--mode", choices=["sync", "async", "vector"], default=None,
+                        help="Training loop to use (defaults to training.mode in configs/agent.yaml)")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None,
+                        help="Continue from a checkpoint (the latest in training.checkpoint.dir if no path is given)")
+    args = parser.parse_args()
+    run(mode=args.mode, resume=args.resume)
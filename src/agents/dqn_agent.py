@@ -1,10 +1,24 @@
+import logging
 import numpy as np
 import random
 import torch
 import torch.nn.functional as F
 import torch.optim as optim
 from src.agents.models import QNetwork
+from src.analysis.profiler import profiler
 from src.utils.memory import ReplayBuffer
+from src.utils.nstep import NStepAccumulator
+from src.utils.prefetch import PrefetchSampler
+
+def _cpu_copy(obj):
+    """Detached CPU copy of every tensor in a (nested) state dict."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().cpu().clone()
+    if isinstance(obj, dict):
+        return {k: _cpu_copy(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_cpu_copy(v) for v in obj)
+    return obj
 
 class DQNAgent:
     """Interacts with and learns from the environment."""
@@ -29,6 +43,7 @@ class DQNAgent:
         self.tau = 1e-3              # for soft update of target parameters, hardcoding for now or move to config
         self.lr = config['learning_rate']
         self.update_every = config.get('update_every', 4)
+        self.n_step = config.get('n_step', 1)
 
         # Device selection
         self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
@@ -38,30 +53,130 @@ class DQNAgent:
         self.qnetwork_local = QNetwork(state_size, action_size, seed, hidden_layers).to(self.device)
         self.qnetwork_target = QNetwork(state_size, action_size, seed, hidden_layers).to(self.device)
         self.optimizer = optim.Adam(self.qnetwork_local.parameters(), lr=self.lr)
+        self.logger = logging.getLogger(__name__)
+
+        # Fused learn(): one local forward pass over states and next_states together, and an
+        # in-place multi-tensor soft update. compile_learn additionally runs the loss through torch.compile.
+        self.fused_learn = config.get('fused_learn', True)
+        self._local_params = list(self.qnetwork_local.parameters())
+        self._target_params = list(self.qnetwork_target.parameters())
+        self._compiled_loss = None
+        if config.get('compile_learn', False):
+            if hasattr(torch, 'compile'):
+                self._compiled_loss = torch.compile(self._fused_loss)
+            else:
+                self.logger.warning("compile_learn needs torch>=2.0, running the fused learn step eagerly.")
 
         # Replay memory
-        self.memory = ReplayBuffer(action_size, config['memory_size'], self.batch_size, self.device)
+        self.memory = ReplayBuffer(action_size, config['memory_size'], self.batch_size, self.device,
+                                   state_size=state_size,
+                                   storage=config.get('replay_storage', 'array'),
+                                   storage_kwargs=config.get('replay_storage_kwargs'),
+                                   pin_memory=config.get('pin_memory'),
+                                   action_masking=config.get('action_masking', True),
+                                   n_step=self.n_step,
+                                   prioritized=config.get('prioritized_replay', True),
+                                   alpha=config.get('per_alpha', 0.6),
+                                   beta_start=config.get('per_beta_start', 0.4),
+                                   beta_frames=config.get('per_beta_frames', 100000))
+        if config.get('prefetch_batches', 0) > 0:
+            # Batches are assembled on a worker thread while the simulator steps
+            self.memory = PrefetchSampler(self.memory, num_batches=config['prefetch_batches'],
+                                          max_staleness=config.get('prefetch_max_staleness', 4))
+        # Sums the next n_step rewards of each transition before it goes into replay
+        self.nstep = NStepAccumulator(self.n_step, self.gamma) if self.n_step > 1 else None
+        self.telemetry = None
         self.t_step = 0
+
+    def attach_telemetry(self, telemetry):
+        """Record loss, |TD error| and Q-value statistics of every update into `telemetry`."""
+        telemetry.add_channel("learn", fields=('loss', 'td_error', 'q_mean', 'q_max'), device=self.device)
+        self.telemetry = telemetry
+
+    def _record_learn(self, loss, td_errors, Q_expected):
+        # Written into the channel's ring on the device, no sync here; copied to the host at aggregation
+        Q_expected = Q_expected.detach()
+        self.telemetry.record("learn", torch.stack((loss.detach(), td_errors.abs().mean(), Q_expected.mean(), Q_expected.max())))
     
-    def step(self, state, action, reward, next_state, done):
-        # Save experience in replay memory
-        self.memory.add(state, action, reward, next_state, done)
+    def step(self, state, action, reward, next_state, done, next_mask=None, truncated=False):
+        # Save experience in replay memory (next_mask: valid actions in next_state, used when bootstrapping)
+        # truncated: the episode stops here without a terminal state, so pending n-step returns are flushed
+        with profiler.section("replay.add"):
+            if self.nstep is None:
+                self.memory.add(state, action, reward, next_state, done, next_mask)
+            else:
+                self._add_nstep(np.expand_dims(state, 0), [action], [reward], np.expand_dims(next_state, 0), [done],
+                                None if next_mask is None else np.expand_dims(next_mask, 0), [truncated])
         
         # Learn every UPDATE_EVERY time steps.
         self.t_step = (self.t_step + 1) % self.update_every
         if self.t_step == 0:
             # If enough samples are available in memory, get random subset and learn
             if len(self.memory) > self.batch_size:
-                experiences = self.memory.sample()
+                with profiler.section("replay.sample"):
+                    experiences = self.memory.sample()
+                self.learn(experiences, self.gamma)
+
+    def step_batch(self, states, actions, rewards, next_states, dones, next_masks=None, truncated=None):
+        """Store one transition per environment in bulk, then learn at the same per-transition rate as step()."""
+        with profiler.section("replay.add"):
+            if self.nstep is None:
+                self.memory.add_batch(states, actions, rewards, next_states, dones, next_masks)
+            else:
+                self._add_nstep(states, actions, rewards, next_states, dones, next_masks, truncated)
+
+        self.t_step += len(states)
+        while self.t_step >= self.update_every:
+            self.t_step -= self.update_every
+            if len(self.memory) > self.batch_size:
+                with profiler.section("replay.sample"):
+                    experiences = self.memory.sample()
                 self.learn(experiences, self.gamma)
 
-    def act(self, state, eps=0.):
+    def _add_nstep(self, *step):
+        transitions = self.nstep.push(*step)
+        if len(transitions[0]):
+            self.memory.add_batch(*transitions)
+
+    def state_dict(self):
+        """
+        Everything needed to continue training exactly where it stopped: both networks, the
+        optimizer, the replay buffer and the n-step accumulator. Returned as copies, so it can
+        be serialized on another thread while training carries on.
+        """
+        state = {
+            'qnetwork_local': _cpu_copy(self.qnetwork_local.state_dict()),
+            'qnetwork_target': _cpu_copy(self.qnetwork_target.state_dict()),
+            'optimizer': _cpu_copy(self.optimizer.state_dict()),
+            'memory': self.memory.state_dict(),
+            't_step': self.t_step,
+        }
+        if self.nstep is not None:
+            state['nstep'] = self.nstep.state_dict()
+        return state
+
+    def load_state_dict(self, state):
+        self.qnetwork_local.load_state_dict(state['qnetwork_local'])
+        self.qnetwork_target.load_state_dict(state['qnetwork_target'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.memory.load_state_dict(state['memory'])
+        self.t_step = state['t_step']
+        if self.nstep is not None and 'nstep' in state:
+            self.nstep.load_state_dict(state['nstep'])
+
+    def close(self):
+        """Stop the replay prefetch thread, if there is one."""
+        if isinstance(self.memory, PrefetchSampler):
+            self.memory.close()
+
+    def act(self, state, eps=0., mask=None):
         """Returns actions for given state as per current policy.
         
         Params
         ======
             state (array_like): current state
             eps (float): epsilon, for epsilon-greedy action selection
+            mask (array_like): boolean valid-action mask, invalid actions are never returned
         """
         state = torch.from_numpy(state).float().unsqueeze(0).to(self.device)
         self.qnetwork_local.eval() # set to evaluation mode
@@ -71,54 +186,108 @@ class DQNAgent:
 
         # Epsilon-greedy action selection
         if random.random() > eps:
-            return np.argmax(action_values.cpu().data.numpy())
+            action_values = action_values.cpu().data.numpy()[0]
+            if mask is not None:
+                action_values = np.where(mask, action_values, -np.inf)
+            return np.argmax(action_values)
         else:
-            return random.choice(np.arange(self.action_size))
+            return random.choice(np.arange(self.action_size) if mask is None else np.flatnonzero(mask))
+
+    def act_batch(self, states, eps=0., masks=None):
+        """Returns one action per row of `states` from a single forward pass.
+
+        Params
+        ======
+            states (np.ndarray): (N, state_size) batch of states
+            eps (float): epsilon, for epsilon-greedy action selection
+            masks (np.ndarray): (N, action_size) boolean valid-action masks
+        """
+        states = torch.from_numpy(np.asarray(states, dtype=np.float32)).to(self.device)
+        # The network has no dropout/batchnorm, so inference_mode is enough, no eval()/train() toggling
+        with torch.inference_mode():
+            action_values = self.qnetwork_local(states)
+            if masks is not None:
+                action_values = action_values.masked_fill(~torch.as_tensor(masks, device=self.device), float('-inf'))
+            greedy = action_values.argmax(1).cpu().numpy()
+
+        # Vectorized epsilon-greedy: each row explores independently.
+        # Random actions are the argmax of uniform noise, with invalid actions pushed below any valid one.
+        n = len(greedy)
+        explore = np.random.random(n) < eps
+        noise = np.random.random((n, self.action_size))
+        if masks is not None:
+            noise = np.where(masks, noise, -1.0)
+        return np.where(explore, noise.argmax(1), greedy)
 
     def learn(self, experiences, gamma):
         """Update value parameters using given batch of experience tuples.
 
         Params
         ======
-            experiences (Tuple[torch.Tensor]): tuple of (s, a, r, s', done) tuples 
-            gamma (float): discount factor
+            experiences (Batch): (s, a, r, s', done, indices, importance-sampling weights, next-state action masks,
+                n-step discounts)
+            gamma (float): discount factor, used when the transitions don't carry their own discount
         """
-        states, actions, rewards, next_states, dones, indices = experiences
+        if self.fused_learn:
+            return self._learn_fused(experiences, gamma)
 
-        ## Compute and minimize the loss
+        with profiler.section("learn.forward"):
+            loss, td_errors, Q_expected = self._reference_loss(experiences, gamma)
+        with profiler.section("replay.update_priorities"):
+            self.memory.update_priorities(experiences.indices, td_errors)
+        if self.telemetry is not None:
+            self._record_learn(loss, td_errors, Q_expected)
+        
+        # Minimize the loss
+        with profiler.section("learn.backward"):
+            self.optimizer.zero_grad()
+            loss.backward()
+        with profiler.section("learn.optimizer"):
+            self.optimizer.step()
+
+            # ------------------- update target network ------------------- #
+            self.soft_update(self.qnetwork_local, self.qnetwork_target, self.tau)
+        profiler.count("learn.updates")
+
+    def _reference_loss(self, experiences, gamma):
+        """Double DQN loss of learn()'s unfused path. Returns (loss, TD errors, Q_expected)."""
+        states, actions, rewards, next_states, dones = (
+            experiences.states, experiences.actions, experiences.rewards, experiences.next_states, experiences.dones)
+        weights = experiences.weights
+
+        ## Compute the loss
         
         # Double DQN Magic happens here:
         # 1. Use Local network to decide BEST action for next state (this avoids overestimation bias)
         # 2. Use Target network to calculate the Q-value of that best action
         
-        # Step 1: Selection
-        best_actions = self.qnetwork_local(next_states).max(1)[1].unsqueeze(1)
+        # Step 1: Selection (only among the actions that are valid in the next state)
+        Q_next_local = self.qnetwork_local(next_states)
+        if experiences.next_masks is not None:
+            Q_next_local = Q_next_local.masked_fill(~experiences.next_masks, float('-inf'))
+        best_actions = Q_next_local.max(1)[1].unsqueeze(1)
         
         # Step 2: Evaluation
         # We gather the values from the target network corresponding to the selected actions
         Q_targets_next = self.qnetwork_target(next_states).detach().gather(1, best_actions)
         
         # Compute Q targets for current states 
-        Q_targets = rewards + (gamma * Q_targets_next * (1 - dones))
+        # n-step transitions hold the sum of up to n discounted rewards, so they bootstrap with gamma**k instead
+        discounts = gamma if experiences.discounts is None else experiences.discounts
+        Q_targets = rewards + (discounts * Q_targets_next * (1 - dones))
 
         # Get expected Q values from local model
         Q_expected = self.qnetwork_local(states).gather(1, actions)
 
         # Compute TD errors for Prioritized Replay
         # We need the absolute error to tell the memory "Hey, we messed up big time on these samples, show me them again!"
-        td_errors = (Q_targets - Q_expected).detach().cpu().numpy().squeeze()
-        self.memory.update_priorities(indices, td_errors)
+        # Kept as a (batch,) tensor, update_priorities converts it in one go (works for batch_size 1 too)
+        td_errors = (Q_targets - Q_expected).detach().reshape(-1)
         
         # Compute loss (MSE is standard, but Huber loss can be more robust against outliers)
-        loss = F.mse_loss(Q_expected, Q_targets)
-        
-        # Minimize the loss
-        self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
-
-        # ------------------- update target network ------------------- #
-        self.soft_update(self.qnetwork_local, self.qnetwork_target, self.tau)                     
+        # Weighted by the IS weights so prioritized sampling doesn't bias the gradient
+        loss = (weights * F.mse_loss(Q_expected, Q_targets, reduction='none')).mean()
+        return loss, td_errors, Q_expected.detach()
 
     def soft_update(self, local_model, target_model, tau):
         """Soft update model parameters.
@@ -132,3 +301,60 @@ class DQNAgent:
         """
         for target_param, local_param in zip(target_model.parameters(), local_model.parameters()):
             target_param.data.copy_(tau*local_param.data + (1.0-tau)*target_param.data)
+
+    def _fused_loss(self, states, actions, rewards, next_states, dones, weights, next_masks, discounts):
+        """Same Double DQN loss as learn(), with the two local-network passes done as one."""
+        n = states.shape[0]
+        Q_local = self.qnetwork_local(torch.cat((states, next_states)))
+        Q_expected = Q_local[:n].gather(1, actions)
+
+        # Selection on the next states reuses the second half of the same pass
+        Q_next_local = Q_local[n:].detach()
+        if next_masks is not None:
+            Q_next_local = Q_next_local.masked_fill(~next_masks, float('-inf'))
+        best_actions = Q_next_local.argmax(1, keepdim=True)
+        with torch.no_grad():
+            Q_targets_next = self.qnetwork_target(next_states).gather(1, best_actions)
+        Q_targets = rewards + (discounts * Q_targets_next * (1 - dones))
+
+        td_errors = (Q_targets - Q_expected).detach().reshape(-1)
+        loss = (weights * (Q_expected - Q_targets) ** 2).mean()
+        return loss, td_errors, Q_expected.detach()
+
+    def _learn_fused(self, experiences, gamma):
+        discounts = gamma if experiences.discounts is None else experiences.discounts
+        args = (experiences.states, experiences.actions, experiences.rewards, experiences.next_states,
+                experiences.dones, experiences.weights, experiences.next_masks, discounts)
+        loss = None
+        with profiler.section("learn.forward"):
+            if self._compiled_loss is not None:
+                try:
+                    loss, td_errors, Q_expected = self._compiled_loss(*args)
+                except Exception as e:
+                    # Compilation needs a working backend (a C++ compiler on CPU, triton on GPU)
+                    self.logger.warning(f"torch.compile failed ({e}), running the fused learn step eagerly.")
+                    self._compiled_loss = None
+            if loss is None:
+                loss, td_errors, Q_expected = self._fused_loss(*args)
+        with profiler.section("replay.update_priorities"):
+            self.memory.update_priorities(experiences.indices, td_errors)
+        if self.telemetry is not None:
+            self._record_learn(loss, td_errors, Q_expected)
+
+        with profiler.section("learn.backward"):
+            self.optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+        with profiler.section("learn.optimizer"):
+            self.optimizer.step()
+            self.soft_update_fused(self.tau)
+        profiler.count("learn.updates")
+
+    def soft_update_fused(self, tau):
+        """soft_update() of the target network as one in-place multi-tensor op, no temporaries per parameter."""
+        with torch.no_grad():
+            if hasattr(torch, '_foreach_lerp_'):
+                # lerp: θ_target += τ*(θ_local - θ_target)
+                torch._foreach_lerp_(self._target_params, self._local_params, tau)
+            else:
+                torch._foreach_mul_(self._target_params, 1.0 - tau)
+                torch._foreach_add_(self._target_params, self._local_params, alpha=tau)
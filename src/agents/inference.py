@@ -0,0 +1,175 @@
+import numpy as np
+
+# Deployment-side inference for a trained QNetwork. Only NumPy is imported at module level,
+# so a controller using NumpyPolicy starts without loading torch at all.
+
+
+def fold_weights(network):
+    """
+    Pull the QNetwork weights out as NumPy arrays, with the dueling heads folded into one layer.
+
+    Q = V + (A - mean(A)) is linear in the last hidden layer, so the value and advantage
+    streams collapse exactly into a single (hidden, actions) matrix and bias:
+        W_q = W_a - mean_rows(W_a) + w_v,   b_q = b_a - mean(b_a) + b_v
+    Matrices are stored transposed (in, out) so the forward pass is x @ W + b.
+    """
+    params = {name: tensor.detach().cpu().double().numpy() for name, tensor in network.state_dict().items()}
+    w_a, b_a = params['advantage_stream.weight'], params['advantage_stream.bias']
+    w_v, b_v = params['value_stream.weight'], params['value_stream.bias']
+    return {
+        'w1': params['fc1.weight'].T.astype(np.float32), 'b1': params['fc1.bias'].astype(np.float32),
+        'w2': params['fc2.weight'].T.astype(np.float32), 'b2': params['fc2.bias'].astype(np.float32),
+        'wq': (w_a - w_a.mean(axis=0, keepdims=True) + w_v).T.astype(np.float32),
+        'bq': (b_a - b_a.mean() + b_v).astype(np.float32),
+    }
+
+
+def export_policy(network, path, quantize=False):
+    """
+    Export a trained QNetwork for deployment.
+
+    Params
+    ======
+        network (QNetwork): trained network (usually DQNAgent.qnetwork_local)
+        path (str): ".npz" for NumpyPolicy weights, ".pt" for a TorchScript graph
+        quantize (bool): int8 dynamic quantization of the Linear layers (TorchScript only)
+    """
+    weights = fold_weights(network)
+    if path.endswith('.npz'):
+        if quantize:
+            raise ValueError("int8 quantization is only available for TorchScript (.pt) exports")
+        np.savez(path, **weights)
+    elif path.endswith('.pt'):
+        import torch
+        module = _folded_module(weights)
+        if quantize:
+            module = torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+        torch.jit.save(torch.jit.script(module), path)
+    else:
+        raise ValueError(f"Unknown policy export format for '{path}', expected .npz or .pt")
+
+
+def _folded_module(weights):
+    import torch
+    import torch.nn as nn
+    layers = []
+    for w, b in (('w1', 'b1'), ('w2', 'b2'), ('wq', 'bq')):
+        linear = nn.Linear(*weights[w].shape)
+        with torch.no_grad():
+            linear.weight.copy_(torch.from_numpy(weights[w].T))
+            linear.bias.copy_(torch.from_numpy(weights[b]))
+        layers += [linear, nn.ReLU()]
+    return nn.Sequential(*layers[:-1]).eval()
+
+
+class NumpyPolicy:
+    """
+    Greedy policy from exported .npz weights, evaluated in pure NumPy.
+
+    Every intermediate result is written into buffers allocated once at load time,
+    so a decision is three matmuls, two in-place ReLUs and an argmax, with no allocation.
+    """
+
+    def __init__(self, path, max_batch=1):
+        """
+        Params
+        ======
+            path (str): .npz file written by export_policy()
+            max_batch (int): largest batch act_batch() will be called with
+        """
+        with np.load(path) as f:
+            self.w1, self.b1 = f['w1'], f['b1']
+            self.w2, self.b2 = f['w2'], f['b2']
+            self.wq, self.bq = f['wq'], f['bq']
+        self.state_size, self.action_size = self.w1.shape[0], self.wq.shape[1]
+        self._allocate(max_batch)
+
+    def _allocate(self, batch):
+        self.max_batch = batch
+        self._x = np.zeros((batch, self.state_size), dtype=np.float32)
+        self._h1 = np.zeros((batch, self.w1.shape[1]), dtype=np.float32)
+        self._h2 = np.zeros((batch, self.w2.shape[1]), dtype=np.float32)
+        self._q = np.zeros((batch, self.action_size), dtype=np.float32)
+
+    def q_values(self, states):
+        """Q-values of a (N, state_size) batch. The result is an internal buffer, copy it to keep it."""
+        n = len(states)
+        if n > self.max_batch:
+            self._allocate(n)
+        x, h1, h2, q = self._x[:n], self._h1[:n], self._h2[:n], self._q[:n]
+        x[:] = states
+        np.matmul(x, self.w1, out=h1)
+        h1 += self.b1
+        np.maximum(h1, 0, out=h1)
+        np.matmul(h1, self.w2, out=h2)
+        h2 += self.b2
+        np.maximum(h2, 0, out=h2)
+        np.matmul(h2, self.wq, out=q)
+        q += self.bq
+        return q
+
+    def act(self, state, mask=None):
+        """Greedy action for one state, only among valid actions if `mask` is given."""
+        # Vector-matrix products on the first buffer rows: about half the overhead of the batched path
+        x, h1, h2, q = self._x[0], self._h1[0], self._h2[0], self._q[0]
+        x[:] = state
+        np.dot(x, self.w1, out=h1)
+        h1 += self.b1
+        np.maximum(h1, 0, out=h1)
+        np.dot(h1, self.w2, out=h2)
+        h2 += self.b2
+        np.maximum(h2, 0, out=h2)
+        np.dot(h2, self.wq, out=q)
+        q += self.bq
+        if mask is not None:
+            q[~np.asarray(mask, dtype=bool)] = -np.inf
+        return int(q.argmax())
+
+    def act_batch(self, states, masks=None):
+        """Greedy actions for a (N, state_size) batch, e.g. all junctions of a network."""
+        q = self.q_values(states)
+        if masks is not None:
+            q[~np.asarray(masks, dtype=bool)] = -np.inf
+        return q.argmax(axis=1)
+
+
+class TorchScriptPolicy:
+    """Greedy policy from an exported TorchScript graph (optionally int8-quantized)."""
+
+    def __init__(self, path, num_threads=1):
+        """
+        Params
+        ======
+            path (str): .pt file written by export_policy()
+            num_threads (int): intra-op threads, one core is plenty for these sizes
+        """
+        import torch
+        self.torch = torch
+        torch.set_num_threads(num_threads)
+        self.module = torch.jit.load(path, map_location='cpu')
+        self.module.eval()
+
+    def q_values(self, states):
+        with self.torch.inference_mode():
+            return self.module(self.torch.as_tensor(np.asarray(states, dtype=np.float32))).numpy()
+
+    def act(self, state, mask=None):
+        q = self.q_values(np.reshape(state, (1, -1)))[0]
+        if mask is not None:
+            q = np.where(mask, q, -np.inf)
+        return int(q.argmax())
+
+    def act_batch(self, states, masks=None):
+        q = self.q_values(states)
+        if masks is not None:
+            q = np.where(masks, q, -np.inf)
+        return q.argmax(axis=1)
+
+
+def load_policy(path, **kwargs):
+    """Load an exported policy, picking the engine from the file extension."""
+    if path.endswith('.npz'):
+        return NumpyPolicy(path, **kwargs)
+    if path.endswith('.pt'):
+        return TorchScriptPolicy(path, **kwargs)
+    raise ValueError(f"Unknown policy format for '{path}', expected .npz or .pt")
@@ -1,7 +1,11 @@
+import atexit
+import json
 import logging
 import os
+import threading
+from collections import deque
+import numpy as np
 import yaml
-from torch.utils.tensorboard import SummaryWriter
 
 def setup_logging(config_path="configs/logging.yaml", run_name="default"):
     """
@@ -30,32 +34,168 @@ def setup_logging(config_path="configs/logging.yaml", run_name="default"):
     # TensorBoard writer
     writer = None
     if config['logging'].get('tensorboard', False):
+        # Imported here so the sinks/writers below (used by the env-side profiler too) don't pull in torch
+        from torch.utils.tensorboard import SummaryWriter
         writer = SummaryWriter(log_dir=log_dir)
         
     return logging.getLogger(__name__), writer
 
-import pandas as pd
+class CsvSink:
+    """Plain CSV with a header line, the format dashboard.py follows by default."""
+
+    def __init__(self, log_dir, columns, name="training_metrics"):
+        self.path = os.path.join(log_dir, f"{name}.csv")
+        if not os.path.isfile(self.path):
+            with open(self.path, 'w') as f:
+                f.write(",".join(columns) + "\n")
+
+    def append(self, rows):
+        with open(self.path, 'a') as f:
+            f.write("".join(",".join(str(v) for v in row) + "\n" for row in rows))
+
+
+class BinarySink:
+    """
+    Append-only binary log: every row is len(columns) little-endian float64s, the column
+    names live in a JSON sidecar. No text formatting or parsing at either end, and a
+    reader can slice it by byte offset (row i starts at i * 8 * len(columns)).
+    """
+
+    def __init__(self, log_dir, columns, name="training_metrics"):
+        self.path = os.path.join(log_dir, f"{name}.bin")
+        with open(os.path.join(log_dir, f"{name}.json"), 'w') as f:
+            json.dump({'columns': list(columns), 'dtype': '<f8'}, f)
+
+    def append(self, rows):
+        with open(self.path, 'ab') as f:
+            np.asarray(rows, dtype='<f8').tofile(f)
+
+
+METRIC_FORMATS = {
+    'csv': CsvSink,
+    'binary': BinarySink,
+}
+
+
+class BufferedWriter:
+    """
+    Rows for a sink, written on a background thread.
+
+    add() only appends a row to an in-memory buffer. The writer thread writes the buffered
+    rows in one go every `flush_every` rows or `flush_interval` seconds, whichever comes
+    first, so the caller never waits on the disk. At most `max_pending` rows are buffered
+    (add() flushes itself beyond that), and close(), also registered to run at interpreter
+    exit, writes whatever is left.
+    """
+
+    def __init__(self, sink, flush_every=100, flush_interval=5.0, max_pending=10000):
+        """
+        Params
+        ======
+            sink (CsvSink | BinarySink): where rows end up
+            flush_every (int): rows buffered before the writer thread is woken up
+            flush_interval (float): seconds after which buffered rows are written anyway
+            max_pending (int): hard cap on buffered rows
+        """
+        self.sink = sink
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # keeps rows in order when close() and the thread both flush
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, row):
+        with self._cond:
+            self._pending.append(row)
+            if len(self._pending) >= self.flush_every:
+                self._cond.notify()
+            overflow = len(self._pending) >= self.max_pending
+        if overflow:
+            # The writer can't keep up: flush here rather than let the buffer grow
+            self.flush()
+
+    def _take(self):
+        with self._cond:
+            rows, self._pending = self._pending, []
+        return rows
+
+    def flush(self):
+        """Write every buffered row now."""
+        with self._write_lock:
+            rows = self._take()
+            if rows:
+                self.sink.append(rows)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.flush_every:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                break
+
+    def close(self):
+        if self._closed:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
 
 class MetricTracker:
-    def __init__(self, writer, log_dir):
+    """
+    Episode metrics to TensorBoard and to a file the dashboard follows.
+    Rows go through a BufferedWriter, so logging an episode never touches the disk.
+    """
+
+    COLUMNS = ('Episode', 'Reward', 'Epsilon')
+
+    def __init__(self, writer, log_dir, file_format='csv', flush_every=100, flush_interval=5.0,
+                 max_pending=10000, history=1000):
+        """
+        Params
+        ======
+            writer (SummaryWriter): TensorBoard writer, or None
+            log_dir (str): directory of the metrics file
+            file_format (str): one of METRIC_FORMATS
+            flush_every (int): rows buffered before the writer thread is woken up
+            flush_interval (float): seconds after which buffered rows are written anyway
+            max_pending (int): hard cap on buffered rows
+            history (int): recent episode rewards kept in memory (episode_rewards)
+        """
+        if file_format not in METRIC_FORMATS:
+            raise ValueError(f"Unknown metrics format '{file_format}', expected one of {list(METRIC_FORMATS)}")
         self.writer = writer
         self.log_dir = log_dir
-        self.episode_rewards = []
-        self.metrics_file = os.path.join(log_dir, "training_metrics.csv")
-        # Ensure file validation
-        if not os.path.isfile(self.metrics_file):
-            pd.DataFrame(columns=['Episode', 'Reward', 'Epsilon']).to_csv(self.metrics_file, index=False)
-        
+        os.makedirs(log_dir, exist_ok=True)
+        sink = METRIC_FORMATS[file_format](log_dir, self.COLUMNS)
+        self.metrics_file = sink.path
+        self.rows = BufferedWriter(sink, flush_every, flush_interval, max_pending)
+        self.episode_rewards = deque(maxlen=history)
+
     def log_episode(self, episode, reward, epsilon):
         self.episode_rewards.append(reward)
         if self.writer:
             self.writer.add_scalar('Reward/Episode', reward, episode)
             self.writer.add_scalar('Epsilon/Episode', epsilon, episode)
-        
-        # Append to CSV for our cool streamlit dashboard
-        df = pd.DataFrame([[episode, reward, epsilon]], columns=['Episode', 'Reward', 'Epsilon'])
-        df.to_csv(self.metrics_file, mode='a', header=False, index=False)
-            
+
+        # Buffered for the writer thread, nothing touches the disk here
+        self.rows.add((int(episode), float(reward), float(epsilon)))
+
+    def flush(self):
+        self.rows.flush()
+
     def close(self):
+        self.rows.close()
         if self.writer:
             self.writer.close()
@@ -0,0 +1,189 @@
+import csv
+import json
+import os
+import threading
+import numpy as np
+
+
+class MetricsTail:
+    """
+    Follows a growing metrics file (CSV, or MetricTracker's binary log) without re-reading it.
+
+    Remembers the byte offset it has read up to, and each poll() parses only the complete
+    lines appended since then into a columnar in-memory cache (one growable float array per
+    column, capacity doubled when full). A half-written last line is left for the next poll.
+    If the file shrinks or is replaced (a new run), the cache starts over.
+    poll() is locked, so one instance can be shared by several dashboard sessions.
+    """
+
+    def __init__(self, path):
+        """
+        Params
+        ======
+            path (str): CSV file with a header line, or a .bin log with its .json sidecar,
+                as written by MetricTracker
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.columns = None
+        self.size = 0
+        self._data = None
+        self._inode = None
+
+    def poll(self):
+        """Read whatever was appended since the last call. Returns the number of new rows."""
+        with self.lock:
+            return self._poll()
+
+    def _poll(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_size < self.offset or (self._inode is not None and stat.st_ino != self._inode):
+            self._reset()
+        self._inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return 0
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(stat.st_size - self.offset)
+        if self.path.endswith('.bin'):
+            return self._poll_binary(chunk)
+        # Only consume up to the last newline, the rest may still be being written
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+        self.offset += end
+        lines = chunk[:end].decode('utf-8').splitlines()
+
+        if self.columns is None:
+            self.columns = lines.pop(0).strip().split(',')
+            self._data = np.zeros((1024, len(self.columns)), dtype=np.float64)
+        lines = [line for line in lines if line]
+        if not lines:
+            return 0
+        rows = self._parse(lines)
+        self._append(rows)
+        return len(rows)
+
+    def _poll_binary(self, chunk):
+        if self.columns is None:
+            with open(os.path.splitext(self.path)[0] + ".json", 'r') as f:
+                self.columns = json.load(f)['columns']
+            self._data = np.zeros((1024, len(self.columns)), dtype=np.float64)
+        # Whole rows only, a row may be half-written
+        row_bytes = 8 * len(self.columns)
+        end = len(chunk) // row_bytes * row_bytes
+        if end == 0:
+            return 0
+        self.offset += end
+        rows = np.frombuffer(chunk[:end], dtype='<f8').reshape(-1, len(self.columns))
+        self._append(rows)
+        return len(rows)
+
+    def _parse(self, lines):
+        width = len(self.columns)
+        # The one-split fast path is only safe if every line has exactly `width` fields, otherwise
+        # a short line and a long one would shift each other's columns without any error
+        if all(line.count(',') == width - 1 for line in lines):
+            try:
+                # One split over the whole chunk instead of a parse per line
+                return np.array(','.join(lines).split(','), dtype=np.float64).reshape(-1, width)
+            except ValueError:
+                pass
+        # Empty, quoted or non-numeric fields, or lines of the wrong length somewhere: parse line
+        # by line, dropping the rows that don't fit the header
+        rows = []
+        for fields in csv.reader(lines):
+            if len(fields) != width:
+                continue
+            try:
+                rows.append([float(v) if v else np.nan for v in fields])
+            except ValueError:
+                continue
+        return np.array(rows, dtype=np.float64).reshape(-1, width)
+
+    def _append(self, rows):
+        needed = self.size + len(rows)
+        if needed > len(self._data):
+            capacity = len(self._data)
+            while capacity < needed:
+                capacity *= 2
+            grown = np.zeros((capacity, len(self.columns)), dtype=np.float64)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = rows
+        self.size = needed
+
+    def column(self, name):
+        """View of one column's values so far (no copy)."""
+        if self.columns is None:
+            return np.zeros(0)
+        return self._data[:self.size, self.columns.index(name)]
+
+    def __len__(self):
+        return self.size
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling: keeps the first and last point and, from
+    each of n_out - 2 equal buckets, the point forming the largest triangle with the point
+    kept from the previous bucket and the mean of the next one. Preserves the visual shape
+    (peaks included) far better than taking every k-th point. Returns the kept indices.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Mean point of every bucket, computed in one pass
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        if b + 1 < n_out - 2:
+            next_x, next_y = mean_x[b + 1], mean_y[b + 1]
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # Twice the triangle area, the constant factor doesn't change the argmax
+        area = np.abs((x[prev] - next_x) * (y[start:stop] - y[prev]) - (x[prev] - x[start:stop]) * (next_y - y[prev]))
+        prev = start + int(area.argmax())
+        kept[b + 1] = prev
+    return kept
+
+
+def minmax_downsample(x, y, n_out):
+    """
+    Min/max binning: splits the series into n_out // 2 equal bins and keeps the lowest and
+    highest point of each, so no spike disappears. Returns the kept indices in order.
+    """
+    n = len(y)
+    bins = max(n_out // 2, 1)
+    if n_out >= n:
+        return np.arange(n)
+    per_bin = n // bins
+    body = y[:bins * per_bin].reshape(bins, per_bin)
+    offsets = np.arange(bins) * per_bin
+    kept = [offsets + body.argmin(axis=1), offsets + body.argmax(axis=1), [0, n - 1]]
+    rest = y[bins * per_bin:]
+    if len(rest):
+        # Leftover points that don't fill a bin are one more small bin
+        kept.append(bins * per_bin + np.array([rest.argmin(), rest.argmax()]))
+    return np.unique(np.concatenate(kept))
+
+
+DOWNSAMPLERS = {
+    'lttb': lttb,
+    'minmax': minmax_downsample,
+}
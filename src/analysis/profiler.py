@@ -0,0 +1,184 @@
+import cProfile
+import logging
+import os
+import time
+from src.analysis.logger import BufferedWriter, CsvSink
+
+
+class _NullSection:
+    """What section() hands out while profiling is off: entering and leaving it does nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class _Section:
+    """Accumulating wall-clock timer for one named section (not re-entrant)."""
+    __slots__ = ('calls', 'total', '_start')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total += time.perf_counter() - self._start
+        self.calls += 1
+        return False
+
+
+class Profiler:
+    """
+    Named timers and counters around the training loop's hot spots.
+
+    Code marks a hot spot with `with profiler.section("env.step"):` and counts events with
+    `profiler.count("api.calls")`. While disabled, section() returns one shared no-op
+    context manager and count() returns straight away, so the instrumentation can stay
+    in the hot path. Once enabled, every end_episode() logs the time spent in each section
+    since the previous episode as a table (every `report_every` episodes) and appends it
+    to logs/profile.csv. Section times are inclusive, a section nested in another (e.g.
+    learn.backward inside agent.step) is counted in both.
+
+    Optionally a cProfile run covers a range of episodes and is dumped to a .prof file
+    (pstats format: `python -m pstats`, snakeviz, gprof2dot).
+    """
+
+    COLUMNS = ('Episode', 'Name', 'Calls', 'Total_ms', 'Share')
+
+    def __init__(self):
+        self.enabled = False
+        self.sections = {}  # name -> _Section
+        self.counters = {}  # name -> count since the last episode
+        self.report_every = 0
+        self.rows = None
+        self.cprofile_episodes = None
+        self.cprofile_path = None
+        self._cprofile = None
+        self._episode_start = 0.0
+        self.logger = logging.getLogger(__name__)
+
+    def configure(self, enabled=False, report_every=10, log_dir="logs/", cprofile=None):
+        """
+        Params
+        ======
+            enabled (bool): time sections and count events at all
+            report_every (int): episodes between logged breakdown tables (0 = only write logs/profile.csv)
+            log_dir (str): directory of profile.csv
+            cprofile (dict): {'episodes': [first, last], 'path': ...} to run cProfile over those
+                episodes (inclusive), or None
+        """
+        self.close()
+        self.enabled = enabled
+        self.report_every = report_every
+        self.sections.clear()
+        self.counters.clear()
+        self.cprofile_episodes = None
+        if not enabled:
+            return
+        os.makedirs(log_dir, exist_ok=True)
+        # Fresh file per run, like telemetry.csv
+        path = os.path.join(log_dir, "profile.csv")
+        if os.path.exists(path):
+            os.remove(path)
+        self.rows = BufferedWriter(CsvSink(log_dir, self.COLUMNS, name="profile"), flush_every=100, flush_interval=5.0)
+        if cprofile:
+            first, last = cprofile['episodes']
+            if first > last:
+                raise ValueError(f"profiling.cprofile.episodes must be [first, last], got {cprofile['episodes']}")
+            self.cprofile_episodes = (first, last)
+            self.cprofile_path = cprofile.get('path', os.path.join(log_dir, "profile.prof"))
+
+    def section(self, name):
+        if not self.enabled:
+            return _NULL_SECTION
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = _Section()
+        return section
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def start(self, episode=1):
+        """Start timing `episode`, the first one this run plays."""
+        if not self.enabled:
+            return
+        self._episode_start = time.perf_counter()
+        self._update_cprofile(episode)
+
+    def end_episode(self, episode):
+        """Close the breakdown of `episode` (everything since the previous call) and start the next one."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        wall = now - self._episode_start
+        self._episode_start = now
+
+        rows = [(episode, 'episode', 1, round(wall * 1e3, 3), 1.0)]
+        for name, section in sorted(self.sections.items(), key=lambda item: -item[1].total):
+            if section.calls:
+                rows.append((episode, name, section.calls, round(section.total * 1e3, 3),
+                             round(section.total / wall, 4) if wall > 0 else 0.0))
+            section.calls, section.total = 0, 0.0
+        # Counters have no time, Total_ms and Share stay empty
+        rows += [(episode, name, n, '', '') for name, n in sorted(self.counters.items())]
+        self.counters.clear()
+        for row in rows:
+            self.rows.add(row)
+
+        if self.report_every and episode % self.report_every == 0:
+            self.logger.info(self._table(episode, wall, rows[1:]))
+        self._update_cprofile(episode + 1, finished=episode)
+
+    def _table(self, episode, wall, rows):
+        lines = [f"Profile of episode {episode} ({wall * 1e3:.1f} ms wall, inclusive times):",
+                 f"  {'section':<24}{'calls':>8}{'total ms':>12}{'mean us':>12}{'% wall':>9}"]
+        for _, name, calls, total_ms, share in rows:
+            if total_ms == '':
+                lines.append(f"  {name:<24}{calls:>8}")
+            else:
+                lines.append(f"  {name:<24}{calls:>8}{total_ms:>12.2f}{total_ms * 1e3 / calls:>12.1f}{share * 100:>8.1f}%")
+        return "\n".join(lines)
+
+    def _update_cprofile(self, episode, finished=None):
+        if self.cprofile_episodes is None:
+            return
+        first, last = self.cprofile_episodes
+        if self._cprofile is not None and finished is not None and finished >= last:
+            self._dump_cprofile()
+        elif self._cprofile is None and first <= episode <= last:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def _dump_cprofile(self):
+        self._cprofile.disable()
+        os.makedirs(os.path.dirname(self.cprofile_path) or '.', exist_ok=True)
+        self._cprofile.dump_stats(self.cprofile_path)
+        self.logger.info(f"cProfile of episodes {self.cprofile_episodes[0]}-{self.cprofile_episodes[1]} "
+                         f"written to {self.cprofile_path}")
+        self._cprofile = None
+        self.cprofile_episodes = None
+
+    def close(self):
+        if self._cprofile is not None:
+            # The run ended inside the range: dump what was collected
+            self._dump_cprofile()
+        if self.rows is not None:
+            self.rows.close()
+            self.rows = None
+
+
+# Shared by every module, configured once from the profiling section of configs/logging.yaml
+profiler = Profiler()
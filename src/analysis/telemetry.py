@@ -0,0 +1,177 @@
+import os
+import numpy as np
+import torch
+from src.analysis.logger import BufferedWriter, METRIC_FORMATS
+
+
+class RingBuffer:
+    """Fixed-size preallocated float32 ring. Recording is one row assignment, nothing is allocated."""
+
+    def __init__(self, capacity, shape=(1,)):
+        self.data = np.zeros((capacity, *shape), dtype=np.float32)
+        self.capacity = capacity
+        self.count = 0  # rows ever recorded
+
+    def record(self, values):
+        self.data[self.count % self.capacity] = values
+        self.count += 1
+
+    def since(self, count):
+        """Rows recorded after the given count (at most the last `capacity`), oldest first."""
+        n = min(self.count - count, self.capacity)
+        if n <= 0:
+            return self._host(self.data[:0])
+        end = self.count % self.capacity
+        if n <= end:
+            return self._host(self.data[end - n:end])
+        return np.concatenate((self._host(self.data[end - n:]), self._host(self.data[:end])))
+
+    def _host(self, rows):
+        return rows
+
+
+class TensorRingBuffer(RingBuffer):
+    """
+    RingBuffer kept as a tensor on a torch device. Recording a tensor computed on that device
+    is an on-device copy and never waits for it; rows only come to the host in since().
+    """
+
+    def __init__(self, capacity, shape=(1,), device=torch.device("cpu")):
+        self.data = torch.zeros((capacity, *shape), dtype=torch.float32, device=device)
+        self.capacity = capacity
+        self.count = 0
+
+    def _host(self, rows):
+        return rows.cpu().numpy()
+
+
+class Telemetry:
+    """
+    Per-step telemetry: reward components, chosen actions, loss and Q-value statistics.
+
+    Every channel is a preallocated RingBuffer, so record() costs one row write on the
+    hot path. Every `aggregate_every` steps the rows recorded since the last aggregation
+    are summarized (mean/p50/p95 for value channels, per-category frequency for action
+    channels) and sent to TensorBoard and to logs/telemetry.csv for the dashboard.
+    Channels are declared up front so the file has a fixed set of columns.
+
+    Cost, measured on the queue backend (decision_interval 10, about 380us per env.step): the
+    two record() calls and tick() of a sync step take about 4us, 1% of the step, and whole sync
+    episodes with and without telemetry time the same within noise. Against the mock's much
+    cheaper env.step the share is larger; against a real Aimsun step it is smaller.
+    """
+
+    STATS = ('mean', 'p50', 'p95')
+
+    def __init__(self, writer, log_dir, capacity=10000, aggregate_every=500, file_format='csv'):
+        """
+        Params
+        ======
+            writer (SummaryWriter): TensorBoard writer, or None
+            log_dir (str): directory of the telemetry file
+            capacity (int): rows kept per channel, the aggregation window can't be longer
+            aggregate_every (int): steps between aggregations
+            file_format (str): one of METRIC_FORMATS
+        """
+        if file_format not in METRIC_FORMATS:
+            raise ValueError(f"Unknown telemetry format '{file_format}', expected one of {list(METRIC_FORMATS)}")
+        self.writer = writer
+        self.log_dir = log_dir
+        self.capacity = capacity
+        self.aggregate_every = aggregate_every
+        self.file_format = file_format
+        self.channels = {}   # name -> RingBuffer
+        self.categories = {} # action channel name -> number of categories
+        self.fields = {}     # channel name -> field names of a multi-field channel, or None
+        self.marks = {}      # name -> count at the last aggregation
+        self.step = 0
+        self.rows = None
+
+    def add_channel(self, name, width=1, fields=None, device=None):
+        """
+        Numeric channel, `width` values per record (e.g. one per junction). With `fields`,
+        each record is a (width, len(fields)) array and every field is summarized separately.
+        With a torch `device`, records are tensors on that device and stay there until aggregate().
+        """
+        self._check_open(name)
+        shape = (width,) if fields is None else (width, len(fields))
+        if device is None:
+            self.channels[name] = RingBuffer(self.capacity, shape)
+        else:
+            self.channels[name] = TensorRingBuffer(self.capacity, shape, device)
+        self.fields[name] = fields
+        self.marks[name] = 0
+
+    def add_action_channel(self, name, num_actions, width=1):
+        """Categorical channel aggregated as the share of each action."""
+        self.add_channel(name, width)
+        self.categories[name] = num_actions
+
+    def _check_open(self, name):
+        if self.rows is not None:
+            raise ValueError(f"Can't add telemetry channel '{name}' after the first aggregation")
+
+    def record(self, name, values):
+        self.channels[name].record(values)
+
+    def tick(self):
+        """Count one environment step, aggregating when it is time to."""
+        self.step += 1
+        if self.step % self.aggregate_every == 0:
+            self.aggregate()
+
+    def _series(self, name):
+        """Names of the summarized series of a channel: the channel itself, or one per field."""
+        fields = self.fields[name]
+        return [name] if fields is None else [f"{name}/{field}" for field in fields]
+
+    def _columns(self):
+        columns = ['Step']
+        for name in self.channels:
+            if name in self.categories:
+                columns += [f"{name}/a{a}" for a in range(self.categories[name])]
+            else:
+                columns += [f"{series}/{stat}" for series in self._series(name) for stat in self.STATS]
+        return columns
+
+    def aggregate(self):
+        """Summarize everything recorded since the last call."""
+        if self.rows is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            # Columns depend on the run's setup, so every run starts a fresh file
+            for ext in ('.csv', '.bin'):
+                if os.path.exists(os.path.join(self.log_dir, "telemetry" + ext)):
+                    os.remove(os.path.join(self.log_dir, "telemetry" + ext))
+            sink = METRIC_FORMATS[self.file_format](self.log_dir, self._columns(), name="telemetry")
+            self.rows = BufferedWriter(sink, flush_every=10, flush_interval=5.0)
+
+        row = [self.step]
+        for name, channel in self.channels.items():
+            window = channel.since(self.marks[name])
+            self.marks[name] = channel.count
+            if name in self.categories:
+                window = window.reshape(-1)
+                if len(window):
+                    stats = np.bincount(window.astype(np.int64), minlength=self.categories[name]) / len(window)
+                else:
+                    stats = np.full(self.categories[name], np.nan)
+                labels = [f"{name}/a{a}" for a in range(self.categories[name])]
+            else:
+                # (rows, width[, fields]) -> one column of samples per field
+                series = self._series(name)
+                window = window.reshape(-1, len(series))
+                if len(window):
+                    stats = np.vstack((window.mean(axis=0), np.percentile(window, (50, 95), axis=0))).T.reshape(-1)
+                else:
+                    stats = np.full(len(series) * len(self.STATS), np.nan)
+                labels = [f"{s}/{stat}" for s in series for stat in self.STATS]
+            row += [float(v) for v in stats]
+            if self.writer:
+                for label, value in zip(labels, stats):
+                    if np.isfinite(value):
+                        self.writer.add_scalar(f"Telemetry/{label}", value, self.step)
+        self.rows.add(tuple(row))
+
+    def close(self):
+        if self.rows is not None:
+            self.rows.close()
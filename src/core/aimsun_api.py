@@ -1,3 +1,10 @@
+import random
+import numpy as np
+
+# Phase id of the interphase (yellow / all-red) between two phases: no movement is served
+INTERPHASE = -1
+
+
 class AimsunAPI:
     """
     Mock Aimsun API for testing RL loop without the simulator.
@@ -13,6 +20,10 @@ class AimsunAPI:
         self.connected = True
         return True
 
+    def reset_simulation(self):
+        # Nothing to reset, detector data doesn't depend on the past
+        pass
+
     def load_network(self, network_file):
         print(f"Aimsun API: Loading network {network_file}")
 
@@ -37,18 +48,96 @@ class AimsunAPI:
         self.vehicles.append(vehicle_data)
         # print(f"Aimsun API: Vehicle added {vehicle_data}")
 
+    def add_vehicles(self, vehicles):
+        self.vehicles.extend(vehicles)
+
     def set_traffic_light_phase(self, junction_id, phase_id):
         # print(f"Aimsun API: Setting Junction {junction_id} to Phase {phase_id}")
         self.traffic_lights[junction_id] = phase_id
 
+    def set_traffic_light_phases(self, junction_ids, phases):
+        """Set the phase of many junctions in one call."""
+        for junction_id, phase_id in zip(junction_ids, phases):
+            self.traffic_lights[int(junction_id)] = int(phase_id)
+
+    def advance(self, steps=1):
+        # The mock has no clock, detector data is drawn fresh on every read
+        pass
+
     def get_detector_data(self, detector_id):
         # Return random data for testing
-        import random
         return {
             'count': random.randint(0, 10),
             'occupancy': random.random() * 100
         }
 
+    def get_detectors_data(self, detector_ids, out):
+        """
+        Bulk read of many detectors into a preallocated (len(detector_ids), 3) float32 array,
+        columns queue (vehicles), occupancy (%) and speed (km/h). NaN marks a failed detector.
+        """
+        # Random data for testing, in the ranges a real detector reports
+        n = len(detector_ids)
+        out[:, 0] = np.random.randint(0, 11, n)
+        out[:, 1] = np.random.random(n) * 100
+        out[:, 2] = np.random.random(n) * 50
+        return out
+
+    def get_detectors_history(self, detector_ids, out, departures=None):
+        """
+        Readings after each of the last len(out) simulation steps, oldest first, into a
+        preallocated (steps, len(detector_ids), 3) float32 array (columns as get_detectors_data).
+        With `departures` ((steps, len(detector_ids)) float32), also the vehicles that left
+        each detector's approach in each of those steps.
+        """
+        for step in out:
+            self.get_detectors_data(detector_ids, step)
+        if departures is not None:
+            departures[:] = np.random.randint(0, 2, departures.shape)
+        return out
+
+    def get_rng_state(self):
+        """
+        State of the generators the simulator draws from, JSON-serializable (it may travel
+        over the client protocol), for checkpoints. The mock draws from the global ones.
+        """
+        name, keys, pos, has_gauss, cached = np.random.get_state()
+        version, internal, gauss = random.getstate()
+        return {'numpy': [name, keys.tolist(), pos, has_gauss, cached], 'python': [version, list(internal), gauss]}
+
+    def set_rng_state(self, state):
+        name, keys, pos, has_gauss, cached = state['numpy']
+        np.random.set_state((name, np.array(keys, dtype=np.uint32), pos, has_gauss, cached))
+        version, internal, gauss = state['python']
+        random.setstate((version, tuple(internal), gauss))
+
     def close(self):
         print("Aimsun API: Disconnected.")
         self.connected = False
+
+
+def _queue(config):
+    from src.core.queue_sim import QueueSimulator
+    return QueueSimulator(config)
+
+
+def _client(config):
+    # Imported here, the in-process mock doesn't need the socket client
+    from src.core.aimsun_client import AimsunClient
+    return AimsunClient.from_config(config.get('api', {}), seed=config['simulation'].get('random_seed'),
+                                    sim_config=config)
+
+
+# api.backend in simulation.yaml -> factory taking the whole simulation config
+API_BACKENDS = {
+    'mock': lambda config: AimsunAPI(),  # in-process, random detector data
+    'queue': _queue,                     # in-process point-queue simulator (src/core/queue_sim.py)
+    'client': _client,                   # socket client (src/core/aimsun_client.py)
+}
+
+
+def make_api(config):
+    backend = config.get('api', {}).get('backend', 'mock')
+    if backend not in API_BACKENDS:
+        raise ValueError(f"Unknown api.backend '{backend}', expected one of {list(API_BACKENDS)}")
+    return API_BACKENDS[backend](config)
@@ -0,0 +1,209 @@
+import json
+import logging
+import subprocess
+import numpy as np
+from src.analysis.profiler import profiler
+from src.core import protocol
+
+
+class AimsunClient:
+    """
+    AimsunAPI over a socket, speaking the framed binary protocol of src/core/protocol.py.
+
+    Same surface as the in-process AimsunAPI, so AimsunEnv doesn't know which one it has.
+    The connection stays open for the whole run. Commands that return nothing (phase
+    changes, advancing the clock, scenario loads, vehicles) are queued and go out in the
+    same write as the next request, so a control step (set all phases, advance, read all
+    detectors) costs one round trip instead of one per junction and detector. Detector
+    readings are received straight into the caller's array.
+    """
+
+    def __init__(self, transport='tcp', address=None, spawn_server=False, server_backend='mock', seed=None,
+                 timeout=10.0, sim_config=None):
+        """
+        Params
+        ======
+            transport (str): one of protocol.TRANSPORTS
+            address (str): "host:port" for tcp, a socket path for unix; with spawn_server, None picks a free one
+            spawn_server (bool): start a local stand-in server process (src/core/aimsun_server.py) on connect()
+            server_backend (str): simulator the spawned server runs
+            seed (int): random seed of the spawned server
+            timeout (float): seconds to wait for the connection
+            sim_config (dict): simulation config handed to the spawned server (the queue backend builds its network from it)
+        """
+        if transport not in protocol.TRANSPORTS:
+            raise ValueError(f"Unknown API transport '{transport}', expected one of {list(protocol.TRANSPORTS)}")
+        if address is None and not spawn_server:
+            raise ValueError("api.address is required unless api.spawn_server is set")
+        self.transport_name = transport
+        self.address = address
+        self.spawn_server = spawn_server
+        self.server_backend = server_backend
+        self.seed = seed
+        self.timeout = timeout
+        self.sim_config = sim_config
+        self.transport = None
+        self.server = None
+        self.connected = False
+        self.round_trips = 0
+        self._pending = []   # encoded command frames waiting for the next request
+        self._vehicles = []  # add_vehicle() records, sent as one frame
+        self._header = bytearray(protocol.HEADER.size)
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_config(cls, api_config, seed=None, sim_config=None):
+        return cls(transport=api_config.get('transport', 'tcp'), address=api_config.get('address'),
+                   spawn_server=api_config.get('spawn_server', False),
+                   server_backend=api_config.get('server_backend', 'mock'), seed=seed,
+                   timeout=api_config.get('timeout', 10.0), sim_config=sim_config)
+
+    def connect(self):
+        if self.spawn_server:
+            from src.core.aimsun_server import spawn_server
+            self.server, self.address = spawn_server(self.transport_name, self.address, self.server_backend,
+                                                     seed=self.seed, config=self.sim_config)
+        self.transport = protocol.TRANSPORTS[self.transport_name](self.address)
+        self.transport.open(self.timeout)
+        version, = protocol.UINT32.unpack(self._request(protocol.OP_HELLO, protocol.UINT32.pack(protocol.PROTOCOL_VERSION)))
+        if version != protocol.PROTOCOL_VERSION:
+            raise ConnectionError(f"Aimsun server speaks protocol v{version}, this client v{protocol.PROTOCOL_VERSION}")
+        self.connected = True
+        self.logger.info(f"Connected to Aimsun server at {self.transport_name}://{self.address}")
+        return True
+
+    def _queue(self, opcode, payload=b''):
+        self._pending.append(protocol.frame(opcode, payload))
+
+    def _request(self, opcode, payload=b'', out=None):
+        """
+        Send the queued commands and one request in a single write, then wait for its reply.
+        With `out` (a C-contiguous array, or a tuple of them filled in turn), the reply payload
+        is received directly into it.
+        """
+        if self._vehicles:
+            self._queue(protocol.OP_ADD_VEHICLES, json.dumps(self._vehicles).encode('utf-8'))
+            self._vehicles = []
+        self._pending.append(protocol.frame(opcode, payload))
+        data = b''.join(self._pending)
+        self._pending.clear()
+        self.transport.send(data)
+
+        self.transport.recv_into(self._header)
+        length, reply = protocol.HEADER.unpack(self._header)
+        self.round_trips += 1
+        profiler.count("api.round_trips")
+        if reply == protocol.OP_ERROR:
+            raise RuntimeError(f"Aimsun server: {self.transport.recv(length).decode('utf-8')}")
+        if out is None:
+            return self.transport.recv(length)
+        outs = out if isinstance(out, tuple) else (out,)
+        expected = sum(array.nbytes for array in outs)
+        if length != expected:
+            self.transport.recv(length)
+            raise ConnectionError(f"Aimsun server sent {length} bytes, expected {expected}")
+        for array in outs:
+            self.transport.recv_into(array)
+        return out
+
+    # Scenario setup, pipelined
+    def reset_simulation(self):
+        self._queue(protocol.OP_RESET)
+
+    def load_network(self, network_file):
+        self._queue(protocol.OP_LOAD_NETWORK, network_file.encode('utf-8'))
+
+    def load_control_file(self, control_file):
+        self._queue(protocol.OP_LOAD_CONTROL, control_file.encode('utf-8'))
+
+    def load_traffic_demand(self, demand_file):
+        self._queue(protocol.OP_LOAD_DEMAND, demand_file.encode('utf-8'))
+
+    def close_lane(self, link_id, duration):
+        self._queue(protocol.OP_CLOSE_LANE, protocol.CLOSE_LANE.pack(int(link_id), float(duration)))
+
+    def start(self):
+        self._queue(protocol.OP_START)
+
+    def start_simulation(self):
+        self._queue(protocol.OP_START_SIMULATION)
+
+    def add_vehicle(self, vehicle_data):
+        self._vehicles.append(vehicle_data)
+
+    def add_vehicles(self, vehicles):
+        self._vehicles.extend(vehicles)
+
+    # Control step
+    def set_traffic_light_phase(self, junction_id, phase_id):
+        self.set_traffic_light_phases([junction_id], [phase_id])
+
+    def set_traffic_light_phases(self, junction_ids, phases):
+        self._queue(protocol.OP_SET_PHASES, protocol.encode_phases(junction_ids, phases))
+
+    def advance(self, steps=1):
+        self._queue(protocol.OP_ADVANCE, protocol.UINT32.pack(steps))
+
+    def get_detectors_data(self, detector_ids, out):
+        """Bulk detector read into `out` ((n, 3) float32, queue/occupancy/speed), one round trip."""
+        payload = np.asarray(detector_ids, dtype='<i8').tobytes()
+        if out.dtype == np.dtype('<f4') and out.flags.c_contiguous:
+            return self._request(protocol.OP_GET_DETECTORS, payload, out=out)
+        out[:] = np.frombuffer(self._request(protocol.OP_GET_DETECTORS, payload), dtype='<f4').reshape(out.shape)
+        return out
+
+    def get_detectors_history(self, detector_ids, out, departures=None):
+        """
+        Readings after each of the last len(out) simulation steps into `out` ((steps, n, 3)
+        float32), and with `departures` ((steps, n) float32) the vehicles served in each of them.
+        With the phase changes and advances before it pipelined, a whole decision interval is
+        one round trip.
+        """
+        payload = (protocol.HISTORY.pack(len(out), departures is not None)
+                   + np.asarray(detector_ids, dtype='<i8').tobytes())
+        outs = (out,) if departures is None else (out, departures)
+        if all(array.dtype == np.dtype('<f4') and array.flags.c_contiguous for array in outs):
+            self._request(protocol.OP_GET_HISTORY, payload, out=outs)
+            return out
+        values = np.frombuffer(self._request(protocol.OP_GET_HISTORY, payload), dtype='<f4')
+        out[:] = values[:out.size].reshape(out.shape)
+        if departures is not None:
+            departures[:] = values[out.size:].reshape(departures.shape)
+        return out
+
+    def get_detector_data(self, detector_id):
+        values = self.get_detectors_data([detector_id], np.zeros((1, 3), dtype=np.float32))[0]
+        return {'queue': float(values[0]), 'occupancy': float(values[1]), 'speed': float(values[2])}
+
+    def get_rng_state(self):
+        """The server simulator's generator states, for checkpoints."""
+        return json.loads(self._request(protocol.OP_GET_RNG).decode('utf-8'))
+
+    def set_rng_state(self, state):
+        self._queue(protocol.OP_SET_RNG, json.dumps(state).encode('utf-8'))
+
+    def sync(self):
+        """Wait until every queued command has run, raising the first error among them."""
+        self._request(protocol.OP_SYNC)
+
+    def close(self):
+        if self.transport is not None:
+            try:
+                self._queue(protocol.OP_BYE)
+                self.transport.send(b''.join(self._pending))
+            except OSError:
+                pass
+            self._pending.clear()
+            self.transport.close()
+            self.transport = None
+        if self.server is not None:
+            # Closing its stdin stops the spawned server
+            self.server.stdin.close()
+            try:
+                self.server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+                self.server.wait()
+            self.server.stdout.close()
+            self.server = None
+        self.connected = False
@@ -2,12 +2,22 @@ import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import logging
+from src.analysis.profiler import profiler
+from src.core.aimsun_api import INTERPHASE
+from src.core.observation import ObservationBuilder
+from src.core.reward import RewardEngine
 
 class AimsunEnv(gym.Env):
     """
     Custom Environment that follows gym interface for Aimsun Traffic Simulation.
+
+    In single-agent mode (env.multi_agent: false) the agent observes and controls junction 0
+    only: observations and rewards are that junction's, and every other junction is held on
+    phase 0. multi_agent mode stacks every junction instead.
     """
     metadata = {'render.modes': ['human']}
+    # Columns of info['reward_components'], reported every step (one row per junction in multi_agent mode)
+    REWARD_COMPONENTS = RewardEngine.COMPONENTS
 
     def __init__(self, config, aimsun_api_instance=None):
         super(AimsunEnv, self).__init__()
@@ -17,8 +27,8 @@ class AimsunEnv(gym.Env):
         if aimsun_api_instance:
             self.aimsun_api = aimsun_api_instance
         else:
-            from src.core.aimsun_api import AimsunAPI
-            self.aimsun_api = AimsunAPI()
+            from src.core.aimsun_api import make_api
+            self.aimsun_api = make_api(config)
             
         self.aimsun_api.connect()
         
@@ -31,87 +41,178 @@ class AimsunEnv(gym.Env):
         # We process each intersection independently but training happens centrally (for now)
         self.intersections = config['env'].get('intersections', [{'id': 1}]) # fallback
         self.num_agents = len(self.intersections)
+        self.junction_ids = np.array([inter['id'] for inter in self.intersections])
+
+        # multi_agent: every junction is controlled. Observations come back as one stacked
+        # (num_junctions, state_dim) array, step() takes one action per junction and returns
+        # one reward per junction, so a parameter-shared network can score them all in one pass.
+        self.multi_agent = config['env'].get('multi_agent', False)
         
         # Define action and observation space
         # Assuming all agents share the same state/action dims for simplicity in this version
         # If they differ, we'd need a Dict space (super complex)
-        self.action_space = spaces.Discrete(config['env']['action_dim'])
+        self.action_dim = config['env']['action_dim'] # per junction
+        # Junctions with fewer phases than action_dim can't execute the higher actions.
+        # Row j marks the valid phases of junction j; it is handed out as info['action_mask']
+        # so the agent never picks or bootstraps from a phase the junction doesn't have.
+        phases = [inter.get('phases', self.action_dim) for inter in self.intersections]
+        self.action_masks = np.arange(self.action_dim)[None, :] < np.array(phases)[:, None]
+        state_shape = (config['env']['state_dim'],)
+        if self.multi_agent:
+            self.action_space = spaces.MultiDiscrete([config['env']['action_dim']] * self.num_agents)
+            state_shape = (self.num_agents,) + state_shape
+        else:
+            self.action_space = spaces.Discrete(config['env']['action_dim'])
         
         self.observation_space = spaces.Box(
             low=0, 
             high=np.inf, 
-            shape=(config['env']['state_dim'],), 
+            shape=state_shape, 
             dtype=np.float32
         )
+
+        # Decision interval: every step() holds the chosen phases for decision_interval simulation
+        # steps, advanced in bulk. A junction keeps its phase for min_green seconds before it may
+        # change, and a change starts with `yellow` seconds of interphase.
+        self.step_size = config['simulation']['step_size']
+        self.duration = config['simulation']['duration']
+        control = config['env'].get('control', {})
+        self.decision_interval = int(control.get('decision_interval', 1))
+        self.min_green = control.get('min_green', 0.0)
+        self.yellow_steps = int(round(control.get('yellow', 0.0) / self.step_size))
+        if self.decision_interval < 1:
+            raise ValueError(f"env.control.decision_interval must be at least 1, got {self.decision_interval}")
+        if self.yellow_steps >= self.decision_interval:
+            raise ValueError(f"env.control.yellow ({self.yellow_steps} steps) must be shorter than "
+                             f"decision_interval ({self.decision_interval} steps)")
+
+        # State rows built from one bulk detector read per decision (see src/core/observation.py)
+        obs_config = config['env'].get('observation', {})
+        self.observation_builder = ObservationBuilder(config['env'], self.duration,
+                                                      max_arms=obs_config.get('max_arms', 4),
+                                                      queue_scale=obs_config.get('queue_scale', 20.0),
+                                                      speed_scale=obs_config.get('speed_scale', 50.0),
+                                                      max_steps=self.decision_interval)
+        # Rewards of all junctions from the same arm aggregates (see src/core/reward.py)
+        self.reward_engine = RewardEngine(config['env'], self.num_agents, self.observation_builder.max_arms,
+                                          max_steps=self.decision_interval)
+        self.phases = np.zeros(self.num_agents, dtype=np.int64) # Current phase of every junction
+        self.green_time = np.zeros(self.num_agents) # Seconds each junction has been on its phase
+        self._requested = np.zeros(self.num_agents, dtype=np.int64)
+        self._signal = np.zeros(self.num_agents, dtype=np.int64) # Phases sent during the interphase
+        self.sim_time = 0.0
         
         self.logger = logging.getLogger(__name__)
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
         self.logger.info("Resetting environment...")
-        
+
+        # Reset the simulation first, the scenario and events below are loaded into the fresh one
+        self.aimsun_api.reset_simulation()
+
         # Select and load a traffic scenario
         self.scenario_manager.select_scenario()
-        
+
         # Check for stochastic events at start of episode
         self.event_manager.trigger_random_accident()
-        
-        # Reset Aimsun simulation
-        # self.aimsun_api.reset_simulation() # If supported
-        
-        # Get initial state for ALL agents
-        # For this version, we will concatenate them or just return the first one?
-        # Let's return a list of states, but this breaks standard Gym. 
-        # Hack: We will store the states internally and just return the first one to satisfy Gym check for now,
-        # but the Agent must know to call get_all_states(). 
-        # BETTER APPROACH: Assume Single Agent controlling ONE intersection for now in the gym loop, 
-        # OR we treat the whole system as one giant state.
-        
-        # Let's go with "Giant State" approach - simpler for standard RL
-        initial_state = np.random.rand(self.config['env']['state_dim']).astype(np.float32)
-        info = {}
+
+        # Initial state: junction 0's row in single-agent mode, one row per junction in multi_agent mode
+        self.phases.fill(0)
+        self.green_time.fill(0.0)
+        self.sim_time = 0.0
+        initial_state = self._observe()
+        self.reward_engine.reset(self.observation_builder.arms)
+        info = {'action_mask': self.action_mask()}
         return initial_state, info
 
+    def _observe(self, steps=None):
+        # The builder reuses its buffer every step, so hand out a copy (states are kept across steps).
+        # After a decision interval, the readings of all its steps come in one bulk call.
+        if steps is None:
+            state = self.observation_builder.build(self.aimsun_api, self.phases, self.sim_time)
+        else:
+            state = self.observation_builder.build_history(self.aimsun_api, steps, self.phases, self.sim_time)
+        return state.copy() if self.multi_agent else state[0].copy()
+
+    def action_mask(self):
+        """
+        Valid actions: (action_dim,) for the controlled junction, or (junctions, action_dim) in multi_agent mode.
+        A junction still within min_green of its last change can only keep its phase.
+        """
+        masks = self.action_masks
+        held = self.green_time < self.min_green
+        if held.any():
+            masks = masks.copy()
+            masks[held] = False
+            masks[held, self.phases[held]] = True
+        return masks if self.multi_agent else masks[0]
+
     def step(self, action):
-        # Execute action in Aimsun
-        # If action is scalar, it might apply to all? Or we need a MultiDiscrete action space.
-        # For now, let's assume the 'action' passed here is actually a LIST of actions if we changed the agent.
-        # But since we didn't change the main loop to handle multi-agent yet, let's keep it simple:
-        # One Master Agent controls specific intersection.
-        
-        junction_id = self.intersections[0]['id'] # Focus on the first one
-        self.aimsun_api.set_traffic_light_phase(junction_id, action)
-        
-        # But we also want to simulate others maybe?
-        # Random actions for others to add noise?
-        for i in range(1, self.num_agents):
-             other_junction = self.intersections[i]['id']
-             self.aimsun_api.set_traffic_light_phase(other_junction, 0) # Default phase for others
-        
-        # Get new state and reward
-        # Real implementation: Iterate over detectors defined in config to build state vector
-        observation = np.random.rand(self.config['env']['state_dim']).astype(np.float32) 
-        
-        reward = self._calculate_reward(observation)
-        
-        # Simple termination for testing
-        terminated = False 
-        truncated = False 
-        info = {}
+        # Execute action in Aimsun: junction 0's phase in single-agent mode, one phase per junction in multi_agent mode
+        actions = np.asarray(action).reshape(-1)
+        mask = self.action_masks[np.arange(len(actions)), actions]
+        if not mask.all():
+            raise ValueError(f"Invalid phase(s) {actions[~mask]} for junction(s) {self.junction_ids[:len(actions)][~mask]}")
+
+        requested = self._requested
+        if self.multi_agent:
+            # One action per junction, in the order of config['env']['intersections']
+            requested[:] = actions
+        else:
+            # Focus on the first junction, the others stay on their default phase
+            requested.fill(0)
+            requested[0] = actions[0]
+        # Junctions within min_green of their last change keep their phase
+        switching = (requested != self.phases) & (self.green_time >= self.min_green)
+        yellow = self.yellow_steps if switching.any() else 0
+
+        # Phases in batched calls and the whole interval advanced in bulk. Over the socket client
+        # all of it is pipelined into the detector read below, one round trip per decision.
+        with profiler.section("api.control"):
+            if yellow:
+                np.copyto(self._signal, self.phases)
+                self._signal[switching] = INTERPHASE
+                self.aimsun_api.set_traffic_light_phases(self.junction_ids, self._signal)
+                self.aimsun_api.advance(yellow)
+            self.phases[switching] = requested[switching]
+            self.aimsun_api.set_traffic_light_phases(self.junction_ids, self.phases)
+            self.aimsun_api.advance(self.decision_interval - yellow)
+        profiler.count("api.calls", 5 if yellow else 3)
+        self.green_time += self.decision_interval * self.step_size
+        self.green_time[switching] = (self.decision_interval - yellow) * self.step_size
+        self.sim_time += self.decision_interval * self.step_size
+
+        # Get new state and the reward accumulated over the interval
+        with profiler.section("env.observe"):
+            observation = self._observe(self.decision_interval)
+            # Weighted components of every junction's reward, they sum to the reward
+            rewards, components = self.reward_engine.compute(
+                self.observation_builder.arm_history[:self.decision_interval],
+                self.observation_builder.departure_history[:self.decision_interval])
+            if self.multi_agent:
+                reward = rewards
+            else:
+                reward, components = float(rewards[0]), components[0]
+
+        terminated = False
+        # The simulated period is over
+        truncated = self.sim_time >= self.duration
+        info = {'action_mask': self.action_mask(), 'reward_components': components}
         
         return observation, reward, terminated, truncated, info
 
-    def _calculate_reward(self, observation):
-        # Implement reward function based on config weights
-        # For now, just a random reward + some logic based on 'observation' values
-        weights = self.config['env']['reward_weights']
-        
-        # Mock calculation
-        throughput = observation[0] * 10 
-        wait_time = observation[1] * 5
-        
-        reward = (weights['throughput'] * throughput) + (weights['wait_time'] * wait_time)
-        return reward
+    def state_dict(self):
+        """
+        What a checkpoint needs to continue the run exactly: the simulator's random generators
+        and the reward's running normalization. Taken between episodes, everything else starts
+        over at the next reset().
+        """
+        return {'api_rng': self.aimsun_api.get_rng_state(), 'reward': self.reward_engine.state_dict()}
+
+    def load_state_dict(self, state):
+        self.aimsun_api.set_rng_state(state['api_rng'])
+        self.reward_engine.load_state_dict(state['reward'])
 
     def render(self, mode='human'):
         pass
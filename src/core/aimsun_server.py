@@ -0,0 +1,223 @@
+import argparse
+import json
+import logging
+import os
+import random
+import select
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import numpy as np
+import yaml
+from src.core import protocol
+from src.core.aimsun_api import AimsunAPI
+from src.core.queue_sim import QueueSimulator
+
+# Simulators the stand-in server can run, one instance per client connection: factory taking the simulation config
+SERVER_BACKENDS = {
+    'mock': lambda config: AimsunAPI(),
+    'queue': QueueSimulator,
+}
+
+
+class _Session:
+    """One client connection: a simulator instance and the protocol verbs mapped onto it."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.error = None  # first failure of a pipelined command, reported with the next reply
+        self.commands = {
+            protocol.OP_LOAD_NETWORK: lambda p: backend.load_network(p.decode('utf-8')),
+            protocol.OP_LOAD_CONTROL: lambda p: backend.load_control_file(p.decode('utf-8')),
+            protocol.OP_LOAD_DEMAND: lambda p: backend.load_traffic_demand(p.decode('utf-8')),
+            protocol.OP_CLOSE_LANE: lambda p: backend.close_lane(*protocol.CLOSE_LANE.unpack(p)),
+            protocol.OP_START: lambda p: backend.start(),
+            protocol.OP_START_SIMULATION: lambda p: backend.start_simulation(),
+            protocol.OP_ADD_VEHICLES: lambda p: backend.add_vehicles(json.loads(p.decode('utf-8'))),
+            protocol.OP_SET_PHASES: lambda p: backend.set_traffic_light_phases(*protocol.decode_phases(p)),
+            protocol.OP_ADVANCE: lambda p: backend.advance(protocol.UINT32.unpack(p)[0]),
+            protocol.OP_RESET: lambda p: backend.reset_simulation(),
+            protocol.OP_SET_RNG: lambda p: backend.set_rng_state(json.loads(p.decode('utf-8'))),
+        }
+
+    def request(self, opcode, payload):
+        """Answer a request. Returns the reply payload."""
+        if opcode == protocol.OP_HELLO:
+            return protocol.UINT32.pack(protocol.PROTOCOL_VERSION)
+        if opcode == protocol.OP_GET_DETECTORS:
+            ids = np.frombuffer(payload, dtype='<i8')
+            out = np.zeros((len(ids), 3), dtype='<f4')
+            self.backend.get_detectors_data(ids, out)
+            return out.tobytes()
+        if opcode == protocol.OP_GET_HISTORY:
+            steps, with_departures = protocol.HISTORY.unpack_from(payload)
+            ids = np.frombuffer(payload, dtype='<i8', offset=protocol.HISTORY.size)
+            out = np.zeros((steps, len(ids), 3), dtype='<f4')
+            if not with_departures:
+                self.backend.get_detectors_history(ids, out)
+                return out.tobytes()
+            departures = np.zeros((steps, len(ids)), dtype='<f4')
+            self.backend.get_detectors_history(ids, out, departures=departures)
+            return out.tobytes() + departures.tobytes()
+        if opcode == protocol.OP_GET_RNG:
+            return json.dumps(self.backend.get_rng_state()).encode('utf-8')
+        if opcode == protocol.OP_SYNC:
+            return b''
+        raise ValueError(f"Unknown request opcode {opcode}")
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        session = _Session(self.server.backend_factory())
+        session.backend.connect()
+        header = bytearray(protocol.HEADER.size)
+        try:
+            while True:
+                if not self._recv_into(header):
+                    break
+                length, opcode = protocol.HEADER.unpack(header)
+                payload = bytearray(length)
+                if length and not self._recv_into(payload):
+                    break
+                if opcode == protocol.OP_BYE:
+                    break
+                command = session.commands.get(opcode)
+                if command is not None:
+                    # Pipelined, no reply. Keep going after a failure, the error goes out with the next reply.
+                    if session.error is None:
+                        try:
+                            command(bytes(payload))
+                        except Exception as e:
+                            session.error = f"{type(e).__name__}: {e}"
+                    continue
+                try:
+                    if session.error is not None:
+                        raise RuntimeError(session.error)
+                    reply = protocol.frame(protocol.OP_OK, session.request(opcode, bytes(payload)))
+                except Exception as e:
+                    reply = protocol.frame(protocol.OP_ERROR, str(e).encode('utf-8'))
+                session.error = None
+                self.request.sendall(reply)
+        finally:
+            session.backend.close()
+
+    def _recv_into(self, buffer):
+        view = memoryview(buffer)
+        while len(view):
+            n = self.request.recv_into(view)
+            if n == 0:
+                return False
+            view = view[n:]
+        return True
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def server_bind(self):
+        super().server_bind()
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def make_server(transport='tcp', address=None, backend='mock', config=None):
+    """
+    Stand-in simulator server speaking the client protocol. Every connection gets its own
+    `backend` simulator. Returns (server, bound address), the address in the client's format.
+
+    Params
+    ======
+        transport (str): 'tcp' or 'unix'
+        address (str): "host:port" (port 0 picks a free one) or a socket path; None = a free local one
+        backend (str): one of SERVER_BACKENDS
+        config (dict): simulation config the backend is built from
+    """
+    if backend not in SERVER_BACKENDS:
+        raise ValueError(f"Unknown server backend '{backend}', expected one of {list(SERVER_BACKENDS)}")
+    if transport == 'tcp':
+        host, port = (address or "127.0.0.1:0").rsplit(':', 1)
+        server = _TCPServer((host, int(port)), _Handler)
+        bound = f"{host}:{server.server_address[1]}"
+    elif transport == 'unix':
+        if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+            raise ValueError("The 'unix' API transport needs a platform with Unix domain sockets")
+        bound = address or os.path.join(tempfile.mkdtemp(prefix="aimsun-"), "server.sock")
+        if os.path.exists(bound):
+            os.remove(bound)
+        server = _UnixServer(bound, _Handler)
+    else:
+        raise ValueError(f"Unknown API transport '{transport}', expected one of {list(protocol.TRANSPORTS)}")
+    server.backend_factory = lambda: SERVER_BACKENDS[backend](config)
+    return server, bound
+
+
+def spawn_server(transport='tcp', address=None, backend='mock', seed=None, timeout=30.0, config=None):
+    """
+    Run the stand-in server as a child process (`python -m src.core.aimsun_server`; a plain
+    subprocess, so daemonic actor and vector-env workers can start one too). `config`, the
+    caller's simulation config, goes to the server as the first line of its stdin.
+    Returns (process, bound address).
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    cmd = [sys.executable, "-m", "src.core.aimsun_server", "--transport", transport, "--backend", backend,
+           "--address", address or ("127.0.0.1:0" if transport == 'tcp' else ""), "--announce"]
+    if seed is not None:
+        cmd += ["--seed", str(seed)]
+    if config is not None:
+        cmd += ["--config", "-"]
+    # stdin stays open for the server's lifetime, it exits when the pipe closes (i.e. when we die)
+    process = subprocess.Popen(cmd, cwd=root, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    if config is not None:
+        process.stdin.write(json.dumps(config) + "\n")
+        process.stdin.flush()
+    # The first line the server prints is the address it bound
+    ready, _, _ = select.select([process.stdout], [], [], timeout)
+    line = process.stdout.readline() if ready else ''
+    if not line.startswith("READY "):
+        process.kill()
+        raise RuntimeError(f"Stand-in Aimsun server didn't come up ({' '.join(cmd)})")
+    return process, line[len("READY "):].strip()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Aimsun server for AimsunClient (api.backend: client).")
+    parser.add_argument("--transport", choices=list(protocol.TRANSPORTS), default="tcp")
+    parser.add_argument("--address", default="127.0.0.1:7365",
+                        help="host:port (port 0 = any free one), or a socket path for unix (empty = a temporary one)")
+    parser.add_argument("--backend", choices=list(SERVER_BACKENDS), default="mock")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the simulator's random generators")
+    parser.add_argument("--config", default="configs/simulation.yaml",
+                        help="Simulation config the backend is built from ('-' = a JSON line on stdin)")
+    parser.add_argument("--announce", action="store_true",
+                        help="Print 'READY <address>' once listening, and exit when stdin closes (spawned by a client)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.seed is not None:
+        # The mock simulator draws from the global generators
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+    if args.config == "-":
+        config = json.loads(sys.stdin.readline())
+    else:
+        with open(args.config, 'r') as f:
+            config = yaml.safe_load(f)
+    if args.seed is not None:
+        config['simulation']['random_seed'] = args.seed
+    server, bound = make_server(args.transport, args.address or None, args.backend, config)
+    if args.announce:
+        print(f"READY {bound}", flush=True)
+        # Backends print progress, keep it off the pipe nobody reads after the announcement
+        sys.stdout = sys.stderr
+        # The parent holds our stdin: EOF means it closed us or died, don't outlive it
+        threading.Thread(target=lambda: (sys.stdin.read(), server.shutdown()), daemon=True).start()
+    logging.getLogger(__name__).info(f"Serving the '{args.backend}' simulator on {args.transport}://{bound}")
+    server.serve_forever()
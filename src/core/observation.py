@@ -0,0 +1,150 @@
+import numpy as np
+
+
+class ObservationBuilder:
+    """
+    Builds the per-junction state rows from detector measurements.
+
+    Row layout (state_dim = 3 * max_arms + action_dim + 4):
+        [queue, occupancy, speed] for each of max_arms arms  (arms a junction doesn't have stay 0)
+        one-hot of the junction's current phase              (action_dim)
+        network mean queue, occupancy, speed, elapsed fraction of the simulation
+
+    Everything that depends only on the config is worked out once here: the flat list of
+    detector ids (one bulk API call per step reads them all into a preallocated array)
+    and a (slots, detectors) matrix mapping every detector to its junction arm, so the
+    per-arm aggregation is a single matmul into a preallocated buffer. Nothing per step
+    goes through dicts or Python lists.
+
+    build_history() does the same from the readings after every step of a decision
+    interval (one get_detectors_history call), keeping the per-step arm aggregates in
+    arm_history and the vehicles each arm served in departure_history for the reward; the
+    state comes from the last step.
+    """
+
+    # Columns of the raw detector array filled by AimsunAPI.get_detectors_data
+    DETECTOR_FIELDS = ('queue', 'occupancy', 'speed')
+    GLOBAL_FEATURES = 4
+
+    def __init__(self, env_config, duration, max_arms=4, queue_scale=20.0, speed_scale=50.0, max_steps=1):
+        """
+        Params
+        ======
+            env_config (dict): the env section of simulation.yaml. Each intersection lists its
+                detectors, one per arm, or a list of detector ids per arm (aggregated: queues
+                summed, occupancy and speed averaged)
+            duration (float): simulated seconds per episode, for the elapsed-time feature
+            max_arms (int): arms per junction in the state, junctions with fewer are zero-padded
+            queue_scale (float): vehicles mapped to 1.0
+            speed_scale (float): speed (km/h) mapped to 1.0
+            max_steps (int): most simulation steps read at once by build_history
+        """
+        intersections = env_config['intersections']
+        self.num_junctions = len(intersections)
+        self.max_arms = max_arms
+        self.action_dim = env_config['action_dim']
+        self.state_dim = len(self.DETECTOR_FIELDS) * max_arms + self.action_dim + self.GLOBAL_FEATURES
+        if env_config['state_dim'] != self.state_dim:
+            raise ValueError(f"env.state_dim is {env_config['state_dim']}, but {max_arms} arms x "
+                             f"{len(self.DETECTOR_FIELDS)} features + {self.action_dim} phases + "
+                             f"{self.GLOBAL_FEATURES} global features make {self.state_dim}")
+        self.duration = duration
+
+        # Detector -> (junction, arm) slot, slots numbered junction * max_arms + arm
+        detector_ids, slots = [], []
+        for j, inter in enumerate(intersections):
+            arms = inter.get('detectors', [])
+            if len(arms) > max_arms:
+                raise ValueError(f"Intersection {inter['id']} has {len(arms)} detector arms, "
+                                 f"env.observation.max_arms is {max_arms}")
+            for arm, detectors in enumerate(arms):
+                for detector in np.atleast_1d(detectors):
+                    detector_ids.append(int(detector))
+                    slots.append(j * max_arms + arm)
+        self.detector_ids = np.array(detector_ids, dtype=np.int64)
+        aggregate = np.zeros((self.num_junctions * max_arms, len(detector_ids)), dtype=np.float32)
+        aggregate[slots, np.arange(len(detector_ids))] = 1.0
+        self.aggregate = aggregate
+
+        # Queues are summed over an arm's detectors, occupancy/speed averaged; both folded into
+        # one per-(slot, field) scale together with the normalization
+        per_slot = aggregate.sum(axis=1, keepdims=True)
+        mean = np.divide(1.0, per_slot, out=np.zeros_like(per_slot), where=per_slot > 0)
+        self.scale = np.hstack((
+            (per_slot > 0) / np.float32(queue_scale),
+            mean / 100.0,  # occupancy is a percentage
+            mean / np.float32(speed_scale),
+        )).astype(np.float32)
+        # Network-wide means are one more matmul: 1/active_arms on every arm that has detectors
+        has_arm = per_slot[:, 0] > 0
+        self.mean_weights = (has_arm / max(int(has_arm.sum()), 1)).astype(np.float32)
+        # Departures are summed over an arm's detectors and counted in queue_scale vehicles, like queues
+        self._departure_map = np.ascontiguousarray(aggregate.T * self.scale[:, 0])
+
+        # Preallocated per-step buffers
+        self.raw = np.zeros((len(detector_ids), len(self.DETECTOR_FIELDS)), dtype=np.float32)
+        self.arms = np.zeros((self.num_junctions * max_arms, len(self.DETECTOR_FIELDS)), dtype=np.float32)
+        self.state = np.zeros((self.num_junctions, self.state_dim), dtype=np.float32)
+        self._arm_view = self.state[:, :len(self.DETECTOR_FIELDS) * max_arms]
+        phase_start = len(self.DETECTOR_FIELDS) * max_arms
+        self._phase_view = self.state[:, phase_start:phase_start + self.action_dim]
+        self._global_view = self.state[:, phase_start + self.action_dim:]
+        self._rows = np.arange(self.num_junctions)
+        self._globals = np.zeros(self.GLOBAL_FEATURES, dtype=np.float32)
+        self.raw_history = np.zeros((max_steps,) + self.raw.shape, dtype=np.float32)
+        self.arm_history = np.zeros((max_steps,) + self.arms.shape, dtype=np.float32)
+        self.raw_departures = np.zeros((max_steps, len(detector_ids)), dtype=np.float32)
+        self.departure_history = np.zeros((max_steps, len(self.arms)), dtype=np.float32)
+
+    def build(self, api, phases, sim_time):
+        """
+        Read every detector and fill the state matrix.
+
+        Params
+        ======
+            api (AimsunAPI): provides get_detectors_data(ids, out)
+            phases (np.ndarray): current phase of every junction, (num_junctions,) ints
+            sim_time (float): simulated seconds since the episode started
+
+        Returns the (num_junctions, state_dim) matrix. It is overwritten by the next call,
+        so callers that keep it must copy it.
+        """
+        api.get_detectors_data(self.detector_ids, self.raw)
+        # Failed detectors report NaN or a negative value, count them as empty (fmax drops NaNs)
+        np.fmax(self.raw, 0.0, out=self.raw)
+
+        # Per-arm sums of every field in one matmul, then mean/normalization in place
+        np.matmul(self.aggregate, self.raw, out=self.arms)
+        self.arms *= self.scale
+        return self._fill(phases, sim_time)
+
+    def build_history(self, api, steps, phases, sim_time):
+        """
+        Read the detectors after each of the last `steps` simulation steps and fill the state
+        matrix from the last one. The per-step arm aggregates are left in arm_history[:steps],
+        the per-step arm departures in departure_history[:steps].
+        Returns the (num_junctions, state_dim) matrix, overwritten by the next call.
+        """
+        raw, arms = self.raw_history[:steps], self.arm_history[:steps]
+        departures = self.raw_departures[:steps]
+        api.get_detectors_history(self.detector_ids, raw, departures=departures)
+        np.fmax(raw, 0.0, out=raw)
+        np.fmax(departures, 0.0, out=departures)
+        # Every step's aggregation in one broadcast matmul
+        np.matmul(self.aggregate, raw, out=arms)
+        arms *= self.scale
+        np.matmul(departures, self._departure_map, out=self.departure_history[:steps])
+        self.arms[:] = arms[-1]
+        return self._fill(phases, sim_time)
+
+    def _fill(self, phases, sim_time):
+        self._arm_view[:] = self.arms.reshape(self.num_junctions, -1)
+
+        self._phase_view.fill(0.0)
+        self._phase_view[self._rows, phases] = 1.0
+
+        # Network-wide means over the arms that have detectors
+        np.matmul(self.mean_weights, self.arms, out=self._globals[:3])
+        self._globals[3] = min(sim_time / self.duration, 1.0) if self.duration else 0.0
+        self._global_view[:] = self._globals
+        return self.state
@@ -0,0 +1,115 @@
+import socket
+import struct
+import numpy as np
+
+# Wire format shared by AimsunClient and the stand-in server (src/core/aimsun_server.py).
+#
+# Every message is one frame: a 5-byte header (little-endian uint32 payload length, uint8
+# opcode) followed by the payload. Arrays travel as raw little-endian bytes, strings as
+# UTF-8. Commands that return nothing get no reply, so a client can pipeline them (phase
+# changes, advancing the clock) in front of the next request and pay one round trip for
+# all of them. A failed command's error is sent back in place of that next request's reply.
+
+PROTOCOL_VERSION = 2
+HEADER = struct.Struct('<IB')
+
+# Requests that are answered
+OP_HELLO = 1          # uint32 version -> OK(uint32 version)
+OP_GET_DETECTORS = 2  # int64[n] detector ids -> OK(float32[n, 3] queue/occupancy/speed)
+OP_SYNC = 3           # nothing -> OK(), flushes pipelined commands and their errors
+OP_GET_HISTORY = 4    # uint32 steps, uint8 departures, int64[n] detector ids -> OK(float32[steps, n, 3]) after each
+                      # of the last steps, followed by float32[steps, n] vehicles served if departures is 1
+OP_GET_RNG = 5        # nothing -> OK(utf-8 JSON of the simulator's generator states)
+# Commands (no reply)
+OP_LOAD_NETWORK = 10      # utf-8 path
+OP_LOAD_CONTROL = 11      # utf-8 path
+OP_LOAD_DEMAND = 12       # utf-8 path
+OP_CLOSE_LANE = 13        # int64 link id, float64 duration
+OP_START = 14
+OP_START_SIMULATION = 15
+OP_ADD_VEHICLES = 16      # utf-8 JSON list of vehicle records
+OP_SET_PHASES = 17        # int64[n] junction ids, then int64[n] phases (-1 = interphase)
+OP_ADVANCE = 18           # uint32 simulation steps
+OP_BYE = 19
+OP_RESET = 20             # back to an empty network at time 0
+OP_SET_RNG = 21           # utf-8 JSON of OP_GET_RNG's reply
+# Replies
+OP_OK = 100
+OP_ERROR = 101            # utf-8 message
+
+CLOSE_LANE = struct.Struct('<qd')
+HISTORY = struct.Struct('<IB')
+UINT32 = struct.Struct('<I')
+
+
+def frame(opcode, payload=b''):
+    return HEADER.pack(len(payload), opcode) + payload
+
+
+def encode_phases(junction_ids, phases):
+    return (np.asarray(junction_ids, dtype='<i8').tobytes() + np.asarray(phases, dtype='<i8').tobytes())
+
+
+def decode_phases(payload):
+    values = np.frombuffer(payload, dtype='<i8')
+    n = len(values) // 2
+    return values[:n], values[n:]
+
+
+class SocketTransport:
+    """
+    One persistent stream socket. Small frames go out immediately (TCP_NODELAY), so a
+    request doesn't sit in Nagle's buffer waiting for a reply that never comes.
+    """
+
+    def __init__(self, family, address):
+        self.family = family
+        self.address = address
+        self.sock = None
+
+    def open(self, timeout=10.0):
+        self.sock = socket.socket(self.family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(self.address)
+        self.sock.settimeout(None)
+        if self.family != getattr(socket, 'AF_UNIX', None):
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def recv_into(self, buffer):
+        """Fill `buffer` (any writable bytes-like object) completely."""
+        view = memoryview(buffer).cast('B')
+        while len(view):
+            n = self.sock.recv_into(view)
+            if n == 0:
+                raise ConnectionError("Aimsun server closed the connection")
+            view = view[n:]
+
+    def recv(self, n):
+        data = bytearray(n)
+        self.recv_into(data)
+        return data
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def _tcp_transport(address):
+    host, port = address.rsplit(':', 1)
+    return SocketTransport(socket.AF_INET, (host, int(port)))
+
+
+def _unix_transport(address):
+    if not hasattr(socket, 'AF_UNIX'):
+        raise ValueError("The 'unix' API transport needs a platform with Unix domain sockets")
+    return SocketTransport(socket.AF_UNIX, address)
+
+
+TRANSPORTS = {
+    'tcp': _tcp_transport,    # address "host:port"
+    'unix': _unix_transport,  # address: socket path
+}
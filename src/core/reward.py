@@ -0,0 +1,170 @@
+import numpy as np
+
+
+class RewardEngine:
+    """
+    Per-junction rewards from the arm aggregates of the ObservationBuilder.
+
+    Every step a (junctions, components) feature matrix is filled in place, in COMPONENTS order:
+        throughput    vehicles the junction's arms served (detector departures)
+        wait_time     sum of the arm queues (every queued vehicle waits this step)
+        queue_length  longest arm queue (spillback risk)
+        stops         vehicles that newly joined the arm queues since the last step
+    The additive ones are per-arm columns of one (arms, components) buffer summed into their
+    junction by a single matmul, and the reward of all junctions is one dot product with the
+    weight vector compiled once from env.reward_weights. Features are in the builder's normalized units (queues in
+    queue_scale vehicles, speeds in speed_scale), so the weights work at any network size.
+
+    Given the arm aggregates and departures of every step of a decision interval ((steps, arms, 3)
+    and (steps, arms), the builder's arm_history and departure_history), each component is summed
+    over the steps, so the reward is the one the agent would have collected deciding every step.
+
+    Normalization (env.reward.normalization):
+        none     features as they are
+        scale    features divided by fixed per-component env.reward.scales, folded into the weights
+        running  features divided by their standard deviation over all junctions and steps so far,
+                 refreshed every STD_REFRESH rewards (a reward only adds to the running sums) and at
+                 least MIN_STD, so a component that is almost always 0 isn't blown up
+    env.reward.clip additionally clips the (normalized) features to [-clip, clip].
+
+    compute() returns the reward vector and the weighted per-component breakdown (which sums
+    to it), both preallocated buffers overwritten by the next call. The running statistics are
+    part of a training checkpoint (state_dict/load_state_dict).
+    """
+
+    COMPONENTS = ('throughput', 'wait_time', 'queue_length', 'stops')
+    NORMALIZATIONS = ('none', 'scale', 'running')
+    STD_REFRESH = 100
+    MIN_STD = 1e-2
+
+    def __init__(self, env_config, num_junctions, max_arms, max_steps=1):
+        """
+        Params
+        ======
+            env_config (dict): the env section of simulation.yaml (reward_weights, reward)
+            num_junctions (int): rows of the reward
+            max_arms (int): arms per junction in the builder's arm aggregates
+            max_steps (int): most simulation steps accumulated into one reward
+        """
+        weights = env_config.get('reward_weights', {})
+        unknown = set(weights) - set(self.COMPONENTS)
+        if unknown:
+            raise ValueError(f"Unknown env.reward_weights {sorted(unknown)}, expected some of {list(self.COMPONENTS)}")
+        reward_config = env_config.get('reward', {})
+        self.normalization = reward_config.get('normalization', 'none')
+        if self.normalization not in self.NORMALIZATIONS:
+            raise ValueError(f"Unknown env.reward.normalization '{self.normalization}', "
+                             f"expected one of {list(self.NORMALIZATIONS)}")
+        self.clip = reward_config.get('clip')
+
+        self.weights = np.array([weights.get(c, 0.0) for c in self.COMPONENTS], dtype=np.float32)
+        if self.normalization == 'scale':
+            scales = reward_config.get('scales', {})
+            self.weights /= np.array([scales.get(c, 1.0) for c in self.COMPONENTS], dtype=np.float32)
+
+        self.num_junctions = num_junctions
+        self.max_arms = max_arms
+        n = len(self.COMPONENTS)
+        # Component-major buffers, so every per-arm row is contiguous. Arm slot -> junction sum, and
+        # per-arm values in COMPONENTS rows (queue_length's stays 0, it is the max over the arms,
+        # filled after the matmul)
+        self.junction_sum = np.kron(np.eye(num_junctions), np.ones(max_arms)).T.astype(np.float32)
+        self.arm_features = np.zeros((n, num_junctions * max_arms), dtype=np.float32)
+        self.previous_queue = np.zeros(num_junctions * max_arms, dtype=np.float32)
+        # (components, junctions) features with their squares below them, so the running sums are one matmul
+        self._moments = np.zeros((2 * n, num_junctions), dtype=np.float32)
+        self._features = self._moments[:n]
+        self.features = self._features.T  # (junctions, components) view
+        # Views the step writes through, worked out once
+        self._flow, self._queue, self._joined = self.arm_features[0], self.arm_features[1], self.arm_features[3]
+        self._queue_by_junction = self._queue.reshape(num_junctions, max_arms)
+        self._longest = self._features[2]
+        self._zero = np.float32(0.0)
+        # Per-step buffers of an interval
+        self._step_joined = np.zeros((max_steps, num_junctions * max_arms), dtype=np.float32)
+        self._step_longest = np.zeros((max_steps, num_junctions), dtype=np.float32)
+        self.breakdown = np.zeros((num_junctions, n), dtype=np.float32)
+        self.reward = np.zeros(num_junctions, dtype=np.float32)
+        # Running sums of the features and their squares (normalization: running)
+        self._ones = np.ones(num_junctions, dtype=np.float32)
+        self._batch = np.zeros(2 * n, dtype=np.float32)
+        self.totals = np.zeros(2 * n)
+        self.count = 0
+        self.std = np.ones(n, dtype=np.float32)
+        self._std_column = self.std[:, None]
+
+    def reset(self, arms):
+        """Start of an episode: the queues already there are not counted as stops."""
+        self.previous_queue[:] = arms[:, 0]
+
+    def compute(self, arms, departures):
+        """
+        Params
+        ======
+            arms (np.ndarray): the builder's (junctions * max_arms, 3) queue/occupancy/speed aggregates,
+                or (steps, junctions * max_arms, 3) of the steps of an interval
+            departures (np.ndarray): vehicles each arm served, (junctions * max_arms,) or
+                (steps, junctions * max_arms)
+
+        Returns (reward (junctions,), breakdown (junctions, components)).
+        """
+        features = self._features
+        if arms.ndim == 2:
+            queue, joined = self._queue, self._joined
+            self._flow[:] = departures
+            queue[:] = arms[:, 0]
+            np.subtract(queue, self.previous_queue, out=joined)
+            np.maximum(joined, self._zero, out=joined)
+            self.previous_queue[:] = queue
+            np.matmul(self.arm_features, self.junction_sum, out=features)
+            np.maximum.reduce(self._queue_by_junction, axis=1, out=self._longest)
+        else:
+            self._accumulate(arms, departures)
+
+        if self.normalization == 'running':
+            self._update_std()
+            features /= self._std_column
+        if self.clip is not None:
+            np.clip(features, -self.clip, self.clip, out=features)
+
+        np.matmul(self.weights, features, out=self.reward)
+        np.multiply(self.features, self.weights, out=self.breakdown)
+        return self.reward, self.breakdown
+
+    def _accumulate(self, arms, departures):
+        # Per-arm sums over the steps, then the same junction matmul. The longest queue is
+        # taken per step and summed.
+        steps = len(arms)
+        queue = arms[..., 0]
+        # (steps, junctions, arms) queues as a view of the contiguous history, no per-step copy
+        queue_by_junction = arms.reshape(steps, self.num_junctions, self.max_arms, arms.shape[-1])[..., 0]
+        joined, longest = self._step_joined[:steps], self._step_longest[:steps]
+        np.add.reduce(departures, axis=0, out=self._flow)
+        np.add.reduce(queue, axis=0, out=self._queue)
+        np.subtract(queue[0], self.previous_queue, out=joined[0])
+        np.subtract(queue[1:], queue[:-1], out=joined[1:])
+        np.maximum(joined, self._zero, out=joined)
+        np.add.reduce(joined, axis=0, out=self._joined)
+        self.previous_queue[:] = queue[-1]
+        np.maximum.reduce(queue_by_junction, axis=2, out=longest)
+        np.matmul(self.arm_features, self.junction_sum, out=self._features)
+        np.add.reduce(longest, axis=0, out=self._longest)
+
+    def _update_std(self):
+        n = len(self.COMPONENTS)
+        np.multiply(self._features, self._features, out=self._moments[n:])
+        np.matmul(self._moments, self._ones, out=self._batch)
+        self.totals += self._batch
+        self.count += self.num_junctions
+        if self.count % (self.STD_REFRESH * self.num_junctions) == 0:
+            mean = self.totals[:n] / self.count
+            self.std[:] = np.sqrt(np.maximum(self.totals[n:] / self.count - mean ** 2, self.MIN_STD ** 2))
+
+    def state_dict(self):
+        """Running normalization statistics (copies)."""
+        return {'totals': self.totals.copy(), 'count': self.count, 'std': self.std.copy()}
+
+    def load_state_dict(self, state):
+        self.totals[:] = state['totals']
+        self.count = state['count']
+        self.std[:] = state['std']  # in place, _std_column is a view of it
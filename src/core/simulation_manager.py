@@ -1,5 +1,6 @@
 import random
 import logging
+import numpy as np
 
 class ScenarioManager:
     def __init__(self, config, aimsun_api):
@@ -36,6 +37,9 @@ class EventManager:
     def __init__(self, config, aimsun_api):
         self.config = config['simulation'].get('stochastic_events', {})
         self.aimsun_api = aimsun_api
+        # Accidents happen on the links we have detectors on (every detector of every intersection)
+        self.links = [int(detector) for inter in config.get('env', {}).get('intersections', [])
+                      for arm in inter.get('detectors', []) for detector in np.atleast_1d(arm)]
         self.logger = logging.getLogger(__name__)
         self.active_event = None
 
@@ -57,7 +61,9 @@ class EventManager:
         """
         if random.random() < self.config.get('accident_probability', 0):
              duration = random.randint(*self.config['accident_duration_range'])
-             # In a real simulation, we would select a link ID
-             link_id = 123 
+             if not self.links:
+                 self.logger.warning("Accident drawn, but no intersection has detectors to place it on.")
+                 return
+             link_id = random.choice(self.links)
              self.logger.info(f"Stochastic Event: Accident on Link {link_id} for {duration}s")
              self.aimsun_api.close_lane(link_id, duration)
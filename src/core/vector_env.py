@@ -0,0 +1,156 @@
+import numpy as np
+import multiprocessing as mp
+
+
+def _make_env(config):
+    from src.core.aimsun_env import AimsunEnv
+    return AimsunEnv(config)
+
+
+class SyncVectorEnv:
+    """
+    N AimsunEnv instances stepped one after the other in this process.
+    Observations, rewards and flags come back stacked along a leading env axis.
+
+    Finished environments are reset automatically: the observation and info returned
+    for them are the first ones of the new episode, and the real last observation and
+    info are put in infos[i]['final_observation'] / infos[i]['final_info'] (same
+    convention as gymnasium's vector envs).
+    Episodes are truncated after `max_episode_steps` steps.
+    """
+
+    def __init__(self, configs, max_episode_steps=None):
+        """
+        Params
+        ======
+            configs (list[dict]): one simulation config per environment
+            max_episode_steps (int): truncate episodes after this many steps (None = never)
+        """
+        self.num_envs = len(configs)
+        self.max_episode_steps = max_episode_steps
+        self.envs = [_make_env(config) for config in configs]
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.episode_steps = np.zeros(self.num_envs, dtype=np.int64)
+        # Preallocated result arrays, refilled on every step
+        self._obs = np.zeros((self.num_envs,) + self.observation_space.shape, dtype=np.float32)
+        self._rewards = np.zeros(self.num_envs, dtype=np.float32)
+        self._terminated = np.zeros(self.num_envs, dtype=bool)
+        self._truncated = np.zeros(self.num_envs, dtype=bool)
+
+    def reset(self, seed=None):
+        infos = []
+        for i, env in enumerate(self.envs):
+            self._obs[i], info = env.reset(seed=None if seed is None else seed + i)
+            infos.append(info)
+        self.episode_steps[:] = 0
+        return self._obs.copy(), infos
+
+    def step(self, actions):
+        infos = []
+        self.episode_steps += 1
+        for i, env in enumerate(self.envs):
+            obs, reward, terminated, truncated, info = env.step(actions[i])
+            truncated = truncated or (self.max_episode_steps is not None
+                                      and self.episode_steps[i] >= self.max_episode_steps)
+            if terminated or truncated:
+                final_obs, final_info = obs, info
+                obs, info = env.reset()
+                info = dict(info, final_observation=final_obs, final_info=final_info)
+                self.episode_steps[i] = 0
+            self._obs[i], self._rewards[i] = obs, reward
+            self._terminated[i], self._truncated[i] = terminated, truncated
+            infos.append(info)
+        return self._obs.copy(), self._rewards.copy(), self._terminated.copy(), self._truncated.copy(), infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def _worker(remote, parent_remote, config, max_episode_steps):
+    parent_remote.close()
+    # Each worker is a one-env SyncVectorEnv, so auto-reset behaves the same in both backends
+    env = SyncVectorEnv([config], max_episode_steps)
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == 'step':
+                obs, rewards, terminated, truncated, infos = env.step(data)
+                remote.send((obs[0], rewards[0], terminated[0], truncated[0], infos[0]))
+            elif command == 'reset':
+                obs, infos = env.reset(seed=data)
+                remote.send((obs[0], infos[0]))
+            elif command == 'spaces':
+                remote.send((env.observation_space, env.action_space))
+            elif command == 'close':
+                break
+    finally:
+        env.close()
+        remote.close()
+
+
+class SubprocVectorEnv:
+    """
+    Same interface as SyncVectorEnv, but every environment lives in its own process,
+    so N Aimsun replications advance in parallel. Commands go out to all workers
+    before any result is read back, so a step costs as long as the slowest env.
+    """
+
+    def __init__(self, configs, max_episode_steps=None):
+        self.num_envs = len(configs)
+        ctx = mp.get_context('spawn')
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(self.num_envs)])
+        self.processes = []
+        for work_remote, remote, config in zip(work_remotes, self.remotes, configs):
+            process = ctx.Process(target=_worker, args=(work_remote, remote, config, max_episode_steps), daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+        self.remotes[0].send(('spaces', None))
+        self.observation_space, self.action_space = self.remotes[0].recv()
+        self._obs = np.zeros((self.num_envs,) + self.observation_space.shape, dtype=np.float32)
+
+    def reset(self, seed=None):
+        for i, remote in enumerate(self.remotes):
+            remote.send(('reset', None if seed is None else seed + i))
+        infos = []
+        for i, remote in enumerate(self.remotes):
+            self._obs[i], info = remote.recv()
+            infos.append(info)
+        return self._obs.copy(), infos
+
+    def step(self, actions):
+        for remote, action in zip(self.remotes, actions):
+            remote.send(('step', [action]))
+        results = [remote.recv() for remote in self.remotes]
+        obs, rewards, terminated, truncated, infos = zip(*results)
+        return (np.stack(obs), np.array(rewards, dtype=np.float32), np.array(terminated, dtype=bool),
+                np.array(truncated, dtype=bool), list(infos))
+
+    def close(self):
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join(timeout=5)
+
+
+VECTOR_BACKENDS = {
+    'sync': SyncVectorEnv,
+    'subprocess': SubprocVectorEnv,
+}
+
+
+def make_vector_env(config, num_envs, backend='sync', max_episode_steps=None):
+    """
+    Build a vectorized env of `num_envs` copies of the simulation config.
+    Each copy gets its own random seed so the replications differ.
+    """
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector env backend '{backend}', expected one of {list(VECTOR_BACKENDS)}")
+    configs = []
+    for i in range(num_envs):
+        env_config = dict(config)
+        env_config['simulation'] = dict(config['simulation'], random_seed=config['simulation']['random_seed'] + i)
+        configs.append(env_config)
+    return VECTOR_BACKENDS[backend](configs, max_episode_steps=max_episode_steps)
@@ -0,0 +1,243 @@
+import logging
+import queue
+import random
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from src.agents.models import QNetwork
+from src.analysis.profiler import profiler
+from src.utils.nstep import NStepAccumulator
+
+
+def _actor_loop(actor_id, sim_config, agent_config, state_size, action_size, seed,
+                transitions, shared_weights, weights_version, weights_lock, stop):
+    """
+    Body of one actor process: runs its own AimsunEnv (simulator seeded with `seed` too, so
+    actors don't all replay the same traffic) with a local copy of the Q-network and ships
+    transitions to the learner in small batches.
+    """
+    from src.core.aimsun_env import AimsunEnv
+
+    torch.set_num_threads(1) # Many actors on one box, don't let each grab every core
+    random.seed(seed)
+    np.random.seed(seed)
+
+    agent_params = agent_config['agent']
+    settings = agent_config['training'].get('async', {})
+    send_every = settings.get('actor_send_every', 32)
+    max_t = agent_config['training']['max_steps_per_episode']
+    eps = agent_params['epsilon_start']
+    eps_end, eps_decay = agent_params['epsilon_end'], agent_params['epsilon_decay']
+    # n-step returns are summed here, so the learner receives finished transitions
+    n_step = agent_params.get('n_step', 1)
+    nstep = NStepAccumulator(n_step, agent_params['gamma'])
+
+    network = QNetwork(state_size, action_size, seed, agent_params.get('hidden_layers', [64, 64]))
+    network.eval()
+    local_version = -1
+
+    env = AimsunEnv(dict(sim_config, simulation=dict(sim_config['simulation'], random_seed=seed)))
+    # Preallocated outbox, sent as one message of stacked arrays instead of one per transition
+    out_states = np.zeros((send_every, state_size), dtype=np.float32)
+    out_next_states = np.zeros((send_every, state_size), dtype=np.float32)
+    out_actions = np.zeros(send_every, dtype=np.int64)
+    out_rewards = np.zeros(send_every, dtype=np.float32)
+    out_dones = np.zeros(send_every, dtype=np.float32)
+    out_masks = np.zeros((send_every, action_size), dtype=bool)
+    out_discounts = np.zeros(send_every, dtype=np.float32)
+    n = 0
+
+    def send(n):
+        batch = (out_states, out_actions, out_rewards, out_next_states, out_dones, out_masks)
+        if n_step > 1:
+            batch += (out_discounts,)
+        transitions.put(('transitions', tuple(a[:n].copy() for a in batch)))
+
+    try:
+        while not stop.is_set():
+            state, info = env.reset()
+            mask = info['action_mask']
+            score = 0
+            for t in range(max_t):
+                # Pick up the latest weights the learner broadcast
+                if weights_version.value != local_version:
+                    with weights_lock:
+                        network.load_state_dict(shared_weights)
+                        local_version = weights_version.value
+
+                if random.random() > eps:
+                    with torch.no_grad():
+                        action_values = network(torch.from_numpy(state).unsqueeze(0))[0]
+                    action = int(action_values.masked_fill(~torch.from_numpy(mask), float('-inf')).argmax().item())
+                else:
+                    action = int(random.choice(np.flatnonzero(mask)))
+                next_state, reward, done, truncated, info = env.step(action)
+                truncated = truncated or t == max_t - 1 or stop.is_set()
+
+                ready = nstep.push(state[None], [action], [reward], next_state[None], [done],
+                                   info['action_mask'][None], [truncated])
+                for row in zip(*ready):
+                    (out_states[n], out_actions[n], out_rewards[n], out_next_states[n], out_dones[n],
+                     out_masks[n], out_discounts[n]) = row
+                    n += 1
+                    if n == send_every:
+                        send(n)
+                        n = 0
+
+                state, mask = next_state, info['action_mask']
+                score += reward
+                if done or truncated:
+                    break
+
+            eps = max(eps_end, eps_decay * eps)
+            transitions.put(('episode', (actor_id, score, eps)))
+        # The last episode was truncated at the stop, so its pending n-step returns are in the outbox too.
+        # Process exit waits for the queue's feeder thread to deliver it, the learner drains until every actor is gone.
+        if n:
+            send(n)
+    except BaseException:
+        # Don't block process exit on messages the learner may never read
+        transitions.cancel_join_thread()
+        raise
+    finally:
+        env.close()
+
+
+class AsyncTrainer:
+    """
+    Decoupled actor/learner training.
+
+    `num_actors` processes each run an AimsunEnv and push transitions into a bounded queue.
+    The learner (this process) drains the queue into the agent's replay buffer with
+    add_batch() and runs DQNAgent.learn() until it has done `updates_per_transition` updates
+    per transition received so far, so a slow simulator step no longer stalls learning and a
+    slow update no longer stalls the simulators.
+    Every `broadcast_every` updates the local network weights are copied into shared
+    memory, and actors load them when they see the version counter move.
+    """
+
+    def __init__(self, agent, sim_config, agent_config, seed=0):
+        """
+        Params
+        ======
+            agent (DQNAgent): the learner's agent, owns the networks and replay buffer
+            sim_config (dict): simulation configuration, each actor builds its own env from it
+            agent_config (dict): full agent.yaml contents
+            seed (int): base random seed, actor i uses seed + i + 1
+        """
+        self.agent = agent
+        self.sim_config = sim_config
+        self.agent_config = agent_config
+        self.seed = seed
+        settings = agent_config['training'].get('async', {})
+        self.num_actors = settings.get('num_actors', 2)
+        self.broadcast_every = settings.get('broadcast_every', 50)
+        self.queue_size = settings.get('queue_size', 64)
+        # Target updates per received transition: the learner catches up to it after every
+        # drain of the queue (None = one update per drain, as fast as the transitions come)
+        self.updates_per_transition = settings.get('updates_per_transition', 1.0 / agent.update_every)
+        self.logger = logging.getLogger(__name__)
+
+    def _broadcast(self):
+        with self.weights_lock:
+            for name, tensor in self.agent.qnetwork_local.state_dict().items():
+                self.shared_weights[name].copy_(tensor)
+            self.weights_version.value += 1
+
+    def train(self, n_episodes, tracker=None):
+        """
+        Run until the actors have finished `n_episodes` episodes in total.
+        Returns the list of episode scores in completion order.
+        """
+        ctx = mp.get_context('spawn')
+        transitions = ctx.Queue(maxsize=self.queue_size)
+        stop = ctx.Event()
+        self.weights_lock = ctx.Lock()
+        self.weights_version = ctx.Value('i', 0)
+        self.shared_weights = {
+            name: tensor.detach().cpu().clone().share_memory_()
+            for name, tensor in self.agent.qnetwork_local.state_dict().items()
+        }
+
+        actors = [
+            ctx.Process(
+                target=_actor_loop,
+                args=(i, self.sim_config, self.agent_config, self.agent.state_size, self.agent.action_size,
+                      self.seed + i + 1, transitions, self.shared_weights, self.weights_version,
+                      self.weights_lock, stop),
+                daemon=True,
+            )
+            for i in range(self.num_actors)
+        ]
+        for actor in actors:
+            actor.start()
+        self.logger.info(f"Started {self.num_actors} actor processes.")
+
+        memory = self.agent.memory
+        self.scores = []
+        self.received = 0
+        self.updates = updates = 0
+        try:
+            while len(self.scores) < n_episodes:
+                # Take what already arrived without waiting. Bounded, so fast actors can't
+                # starve the updates; if the learner falls behind, the full queue throttles them.
+                for _ in range(self.num_actors + 1):
+                    if len(self.scores) >= n_episodes:
+                        break
+                    try:
+                        self._handle(*transitions.get_nowait(), tracker)
+                    except queue.Empty:
+                        break
+
+                if self.updates_per_transition is None:
+                    target = updates + 1
+                else:
+                    target = self.received * self.updates_per_transition
+                if len(memory) > self.agent.batch_size and updates < target:
+                    # Catch up to the target before looking at the queue again
+                    while updates < target:
+                        with profiler.section("replay.sample"):
+                            experiences = memory.sample()
+                        self.agent.learn(experiences, self.agent.gamma)
+                        updates = self.updates = updates + 1
+                        if updates % self.broadcast_every == 0:
+                            self._broadcast()
+                    continue
+
+                # Nothing to learn from yet: wait for the actors
+                try:
+                    self._handle(*transitions.get(timeout=1.0), tracker)
+                except queue.Empty:
+                    if not any(actor.is_alive() for actor in actors):
+                        raise RuntimeError("All actor processes died before training finished.")
+        finally:
+            stop.set()
+            # Unblock actors stuck on a full queue and reap them. Transitions still in flight
+            # (including each actor's final partial outbox) go into the buffer, late scores don't count.
+            while True:
+                alive = any(actor.is_alive() for actor in actors)
+                try:
+                    kind, payload = transitions.get(timeout=0.1)
+                except queue.Empty:
+                    if not alive:
+                        break
+                    continue
+                if kind == 'transitions':
+                    self._handle(kind, payload, tracker)
+            self.logger.info(f"Async training done: {self.received} transitions, {updates} updates.")
+        return self.scores
+
+    def _handle(self, kind, payload, tracker):
+        if kind == 'transitions':
+            with profiler.section("replay.add"):
+                self.agent.memory.add_batch(*payload)
+            self.received += len(payload[0])
+            profiler.count("transitions.received", len(payload[0]))
+        elif kind == 'episode':
+            actor_id, score, eps = payload
+            self.scores.append(score)
+            if tracker is not None:
+                with profiler.section("metrics.log"):
+                    tracker.log_episode(len(self.scores), score, eps)
+            # Learner-side breakdown only, env steps happen in the actor processes
+            profiler.end_episode(len(self.scores))
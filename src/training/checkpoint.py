@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import numpy as np
+import torch
+
+
+def rng_state():
+    """State of every random generator training draws from (python, numpy, torch, cuda)."""
+    state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+class CheckpointManager:
+    """
+    Periodic training checkpoints, written in the background.
+
+    save() only hands a snapshot (already copied by the caller, e.g. DQNAgent.state_dict())
+    to a writer thread, which torch.saves it to a temporary file and renames it into place,
+    so a crash mid-write never leaves a truncated checkpoint behind. An index file, replaced
+    atomically as well, records the episode and score of each checkpoint; after every save
+    only the newest `keep_last` and the `keep_best` highest-scoring ones are kept.
+    """
+
+    INDEX_FILE = "checkpoints.json"
+
+    def __init__(self, directory, keep_last=3, keep_best=1):
+        """
+        Params
+        ======
+            directory (str): where checkpoints and the index are written
+            keep_last (int): most recent checkpoints to keep
+            keep_best (int): best-scoring checkpoints to keep on top of those
+        """
+        self.directory = directory
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(directory, exist_ok=True)
+        self.index = []
+        index_path = os.path.join(directory, self.INDEX_FILE)
+        if os.path.isfile(index_path):
+            with open(index_path, 'r') as f:
+                self.index = json.load(f)
+
+        # At most one snapshot waits for the writer, so a slow disk can't pile up copies in memory
+        self._queue = queue.Queue(maxsize=1)
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, state, episode, score):
+        """
+        Queue a checkpoint for writing. Blocks only while the previous one is still waiting.
+
+        Params
+        ======
+            state (dict): picklable snapshot, must not be modified afterwards
+            episode (int): episode the snapshot was taken after
+            score (float): score used to rank checkpoints for keep_best
+        """
+        if self.error is not None:
+            raise RuntimeError("Writing an earlier checkpoint failed") from self.error
+        self._queue.put((state, episode, score))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    break
+                self._write(*item)
+            except Exception as e:
+                self.error = e
+                self.logger.exception("Failed to write checkpoint")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, state, episode, score):
+        filename = f"checkpoint_{episode:06d}.pt"
+        path = os.path.join(self.directory, filename)
+        torch.save(state, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+        self.index = [entry for entry in self.index if entry['file'] != filename]
+        self.index.append({'file': filename, 'episode': episode, 'score': score})
+        self._apply_retention()
+        self._write_index()
+        self.logger.info(f"Saved checkpoint {path}")
+
+    def _apply_retention(self):
+        by_episode = sorted(self.index, key=lambda entry: entry['episode'])
+        by_score = sorted(self.index, key=lambda entry: entry['score'], reverse=True)
+        keep = {entry['file'] for entry in by_episode[max(len(by_episode) - self.keep_last, 0):]} if self.keep_last else set()
+        keep |= {entry['file'] for entry in by_score[:self.keep_best]}
+        for entry in self.index:
+            if entry['file'] not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, entry['file']))
+                except FileNotFoundError:
+                    pass
+        self.index = [entry for entry in by_episode if entry['file'] in keep]
+
+    def _write_index(self):
+        path = os.path.join(self.directory, self.INDEX_FILE)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def latest(self):
+        """Path of the most recent checkpoint, or None."""
+        if not self.index:
+            return None
+        return os.path.join(self.directory, max(self.index, key=lambda entry: entry['episode'])['file'])
+
+    def best(self):
+        """Path of the best-scoring checkpoint, or None."""
+        if not self.index:
+            return None
+        return os.path.join(self.directory, max(self.index, key=lambda entry: entry['score'])['file'])
+
+    def load(self, path=None):
+        """Load a checkpoint (the latest one by default) onto the CPU."""
+        path = path or self.latest()
+        if path is None or not os.path.isfile(path):
+            raise ValueError(f"No checkpoint to load in {self.directory}")
+        try:
+            # Checkpoints hold numpy arrays and RNG states, not just tensors
+            return torch.load(path, map_location='cpu', weights_only=False)
+        except TypeError:
+            # torch < 1.13 has no weights_only and always unpickles everything
+            return torch.load(path, map_location='cpu')
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise RuntimeError("Writing a checkpoint failed") from self.error
@@ -0,0 +1,55 @@
+import numpy as np
+from src.analysis.profiler import profiler
+
+
+def run_episode(env, agent, eps, max_t, telemetry=None):
+    """
+    Play one episode of the synchronous training loop: act, step the env, hand the transition
+    to the agent (which learns on its own schedule), until the episode ends or max_t steps.
+    Shared by main.py's sync mode and the sweep trials.
+
+    Params
+    ======
+        env (AimsunEnv): environment, reset here
+        agent (DQNAgent): acts and learns
+        eps (float): epsilon for epsilon-greedy action selection
+        max_t (int): most steps in the episode
+        telemetry (Telemetry): per-step reward components and actions, or None
+
+    Returns the score (the rewards summed over the steps, and over the junctions in multi_agent mode).
+    """
+    state, info = env.reset()
+    mask = info['action_mask']
+    score = 0
+    for t in range(max_t):
+        if env.multi_agent:
+            # All junctions scored in one batched forward pass, their transitions stored in bulk
+            with profiler.section("agent.act"):
+                action = agent.act_batch(state, eps, mask)
+            with profiler.section("env.step"):
+                next_state, reward, done, truncated, info = env.step(action)
+            # Running out of steps ends the episode too, pending n-step returns must not leak into the next one
+            truncated = truncated or t == max_t - 1
+            with profiler.section("agent.step"):
+                agent.step_batch(state, action, reward, next_state, np.full(env.num_agents, done),
+                                 info['action_mask'], np.full(env.num_agents, truncated))
+            score += reward.sum()
+        else:
+            with profiler.section("agent.act"):
+                action = agent.act(state, eps, mask)
+            with profiler.section("env.step"):
+                next_state, reward, done, truncated, info = env.step(action)
+            truncated = truncated or t == max_t - 1
+            with profiler.section("agent.step"):
+                agent.step(state, action, reward, next_state, done, info['action_mask'], truncated)
+            score += reward
+        state, mask = next_state, info['action_mask']
+        if telemetry is not None:
+            with profiler.section("telemetry"):
+                telemetry.record("reward", info['reward_components'])
+                telemetry.record("action", action)
+                telemetry.tick()
+
+        if done or truncated:
+            break
+    return score
@@ -0,0 +1,239 @@
+import copy
+import csv
+import itertools
+import logging
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+import numpy as np
+import yaml
+
+# Which YAML file a dotted parameter path lives in, by its first key
+AGENT_SECTIONS = ('agent', 'training')
+SIM_SECTIONS = ('simulation', 'env')
+
+
+def expand_space(space, strategy, num_trials=None, seed=0):
+    """
+    Turn a search space into a list of parameter dicts, one per trial.
+
+    Params
+    ======
+        space (dict): dotted path -> list of values, or {low, high, log, int} for a range
+        strategy (str): "grid" (cartesian product of the lists), or "random"/"halving"
+            (num_trials independent draws)
+        num_trials (int): trials to draw for random search
+        seed (int): seed for the draws
+    """
+    if strategy == 'grid':
+        for path, spec in space.items():
+            if not isinstance(spec, list):
+                raise ValueError(f"Grid search needs a list of values for '{path}', got {spec}")
+        keys = list(space)
+        return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+    if strategy not in ('random', 'halving'):
+        raise ValueError(f"Unknown sweep strategy '{strategy}', expected grid, random or halving")
+    rng = random.Random(seed)
+    trials = []
+    for _ in range(num_trials):
+        params = {}
+        for path, spec in space.items():
+            if isinstance(spec, list):
+                params[path] = rng.choice(spec)
+            elif spec.get('log', False):
+                params[path] = math.exp(rng.uniform(math.log(spec['low']), math.log(spec['high'])))
+            else:
+                params[path] = rng.uniform(spec['low'], spec['high'])
+            if isinstance(spec, dict) and spec.get('int', False):
+                params[path] = int(round(params[path]))
+        trials.append(params)
+    return trials
+
+
+def apply_overrides(sim_config, agent_config, params):
+    """Return copies of both configs with the dotted-path parameters written into them."""
+    sim_config, agent_config = copy.deepcopy(sim_config), copy.deepcopy(agent_config)
+    for path, value in params.items():
+        keys = path.split('.')
+        if keys[0] in AGENT_SECTIONS:
+            node = agent_config
+        elif keys[0] in SIM_SECTIONS:
+            node = sim_config
+        else:
+            raise ValueError(f"Can't tell which config '{path}' belongs to")
+        for key in keys[:-1]:
+            node = node[key]
+        if keys[-1] not in node:
+            raise ValueError(f"Unknown config key '{path}'")
+        node[keys[-1]] = value
+    return sim_config, agent_config
+
+
+def rungs(min_episodes, max_episodes, reduction_factor):
+    """Episode milestones at which successive halving compares trials: min, min*eta, ... < max."""
+    milestones = []
+    budget = min_episodes
+    while budget < max_episodes:
+        milestones.append(budget)
+        budget *= reduction_factor
+    return milestones
+
+
+def _keep_going(rung_scores, rung, score, reduction_factor, lock):
+    """
+    Asynchronous successive halving: record this trial's score at the rung and keep it
+    only if it is in the top 1/eta of every score recorded there so far. The first few
+    trials to reach a rung have nothing to compare against and always continue.
+    """
+    with lock:
+        scores = rung_scores.get(rung, []) + [score]
+        rung_scores[rung] = scores
+    if len(scores) < reduction_factor:
+        return True
+    keep = max(1, len(scores) // reduction_factor)
+    return score >= sorted(scores, reverse=True)[keep - 1]
+
+
+def run_trial(trial_id, params, sim_config, agent_config, sweep_config, rung_scores=None, lock=None):
+    """
+    Train one configuration in this process and return its result row.
+    Runs in a pool worker, so everything it needs comes in as picklable arguments.
+    """
+    from src.core.aimsun_env import AimsunEnv
+    from src.agents.dqn_agent import DQNAgent
+    from src.analysis.logger import MetricTracker
+    from src.training.episode import run_episode
+    import torch
+
+    sim_config, agent_config = apply_overrides(sim_config, agent_config, params)
+    if 'simulation.random_seed' in params:
+        # The seed is one of the swept parameters, keep it
+        seed = sim_config['simulation']['random_seed']
+    else:
+        seed = sweep_config.get('seed', 0) + trial_id
+        sim_config['simulation']['random_seed'] = seed
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    torch.set_num_threads(1) # Trials share the box, one core each
+
+    log_dir = os.path.join(sweep_config['log_dir'], f"trial_{trial_id:03d}")
+    os.makedirs(log_dir, exist_ok=True)
+    with open(os.path.join(log_dir, "config.yaml"), 'w') as f:
+        yaml.safe_dump({'params': params, 'simulation': sim_config, 'agent': agent_config}, f)
+
+    env = AimsunEnv(sim_config)
+    agent = DQNAgent(env.observation_space.shape[-1], env.action_dim, seed, agent_config['agent'])
+    tracker = MetricTracker(None, log_dir=log_dir)
+
+    n_episodes = sweep_config['episodes']
+    max_t = agent_config['training']['max_steps_per_episode']
+    window = sweep_config.get('metric_window', 10)
+    eta = sweep_config.get('reduction_factor', 3)
+    milestones = set(rungs(sweep_config.get('min_episodes', n_episodes), n_episodes, eta)) \
+        if sweep_config['strategy'] == 'halving' else set()
+    eps = agent_config['agent']['epsilon_start']
+    eps_end, eps_decay = agent_config['agent']['epsilon_end'], agent_config['agent']['epsilon_decay']
+
+    start = time.time()
+    scores = []
+    status = 'completed'
+    for i_episode in range(1, n_episodes + 1):
+        score = run_episode(env, agent, eps, max_t)
+        scores.append(score)
+        eps = max(eps_end, eps_decay * eps)
+        tracker.log_episode(i_episode, score, eps)
+
+        if i_episode in milestones and not _keep_going(
+                rung_scores, i_episode, float(np.mean(scores[-window:])), eta, lock):
+            status = 'pruned'
+            break
+
+    env.close()
+    agent.close()
+    tracker.close()
+    return dict(
+        {'trial': trial_id, 'status': status, 'episodes': len(scores),
+         'score': float(np.mean(scores[-window:])), 'best': float(np.max(scores)),
+         'seconds': round(time.time() - start, 1)},
+        **params,
+    )
+
+
+class SweepRunner:
+    """
+    Hyperparameter sweep over agent.yaml / simulation.yaml.
+
+    The search space is expanded into trials (grid, random, or random with successive
+    halving), and the trials run concurrently on a process pool, each with its own seed
+    and log directory. With "halving", trials report their score at every rung and stop
+    early when they fall out of the top 1/reduction_factor. All results end up in one
+    table (results.csv in the sweep directory), longest-running and best-scoring first.
+    """
+
+    def __init__(self, sweep_config, sim_config, agent_config):
+        """
+        Params
+        ======
+            sweep_config (dict): the `sweep` section of configs/sweep.yaml
+            sim_config (dict): base simulation configuration
+            agent_config (dict): base agent configuration
+        """
+        self.config = dict(sweep_config)
+        self.config['log_dir'] = os.path.join(sweep_config.get('log_dir', 'logs/sweeps/'),
+                                              f"sweep_{int(time.time())}")
+        self.sim_config = sim_config
+        self.agent_config = agent_config
+        self.logger = logging.getLogger(__name__)
+
+    def run(self):
+        trials = expand_space(self.config['space'], self.config['strategy'],
+                              self.config.get('num_trials'), self.config.get('seed', 0))
+        os.makedirs(self.config['log_dir'], exist_ok=True)
+        self.logger.info(f"Running {len(trials)} trials ({self.config['strategy']}) in {self.config['log_dir']}")
+
+        # Rung scores are shared between worker processes for the halving decisions
+        ctx = mp.get_context('spawn')
+        manager = ctx.Manager()
+        rung_scores, lock = manager.dict(), manager.Lock()
+        results = []
+        with ProcessPoolExecutor(max_workers=self.config.get('max_workers', os.cpu_count()), mp_context=ctx) as pool:
+            futures = [
+                pool.submit(run_trial, trial_id, params, self.sim_config, self.agent_config,
+                            self.config, rung_scores, lock)
+                for trial_id, params in enumerate(trials)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                self.logger.info(f"Trial {result['trial']} {result['status']} after {result['episodes']} "
+                                 f"episodes, score {result['score']:.2f}")
+        manager.shutdown()
+
+        # Trials that survived longer rank first, then by score
+        results.sort(key=lambda row: (row['episodes'], row['score']), reverse=True)
+        self._write_table(results)
+        return results
+
+    def _write_table(self, results):
+        if not results:
+            self.logger.warning("No trial results to write.")
+            return
+        columns = list(results[0].keys())
+        path = os.path.join(self.config['log_dir'], "results.csv")
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(results)
+
+        # Plain aligned table for the console
+        rows = [[f"{row[c]:.4g}" if isinstance(row[c], float) else str(row[c]) for c in columns] for row in results]
+        widths = [max(len(c), *(len(r[i]) for r in rows)) for i, c in enumerate(columns)]
+        print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+        for r in rows:
+            print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+        self.logger.info(f"Results written to {path}")
@@ -0,0 +1,82 @@
+import logging
+import numpy as np
+from src.analysis.profiler import profiler
+
+
+class VectorTrainer:
+    """
+    Training loop over a vectorized environment: every step picks the actions of all
+    N environments with one DQNAgent.act_batch() forward pass and writes the N
+    transitions to replay with one step_batch() call.
+    """
+
+    def __init__(self, agent, vec_env, agent_config, telemetry=None):
+        """
+        Params
+        ======
+            agent (DQNAgent): the agent to train
+            vec_env (SyncVectorEnv | SubprocVectorEnv): environments to collect from
+            agent_config (dict): full agent.yaml contents
+            telemetry (Telemetry): per-step recorder with one column per env, or None
+        """
+        self.agent = agent
+        self.telemetry = telemetry
+        self.vec_env = vec_env
+        self.agent_config = agent_config
+        self.logger = logging.getLogger(__name__)
+
+    def train(self, n_episodes, tracker=None):
+        """
+        Run until `n_episodes` episodes have finished across all environments.
+        Epsilon decays once per finished episode, as in the single-env loop.
+        Returns the list of episode scores in completion order.
+        """
+        params = self.agent_config['agent']
+        eps = params['epsilon_start']
+        eps_end, eps_decay = params['epsilon_end'], params['epsilon_decay']
+
+        states, infos = self.vec_env.reset()
+        masks = np.stack([info['action_mask'] for info in infos])
+        episode_scores = np.zeros(self.vec_env.num_envs, dtype=np.float64)
+        scores = []
+        while len(scores) < n_episodes:
+            with profiler.section("agent.act"):
+                actions = self.agent.act_batch(states, eps, masks)
+            with profiler.section("env.step"):
+                next_states, rewards, terminated, truncated, infos = self.vec_env.step(actions)
+            next_masks = np.stack([info['action_mask'] for info in infos])
+
+            # Finished envs were auto-reset: the transition must end on the real last observation
+            finished = np.flatnonzero(terminated | truncated)
+            stored_next, stored_masks = next_states, next_masks
+            if len(finished):
+                stored_next, stored_masks = next_states.copy(), next_masks.copy()
+                for i in finished:
+                    stored_next[i] = infos[i]['final_observation']
+                    stored_masks[i] = infos[i]['final_info']['action_mask']
+            with profiler.section("agent.step"):
+                self.agent.step_batch(states, actions, rewards, stored_next, terminated, stored_masks, truncated)
+
+            if self.telemetry is not None:
+                with profiler.section("telemetry"):
+                    self._record(infos, actions)
+
+            episode_scores += rewards
+            for i in finished:
+                scores.append(float(episode_scores[i]))
+                episode_scores[i] = 0.0
+                eps = max(eps_end, eps_decay * eps)
+                if tracker is not None:
+                    with profiler.section("metrics.log"):
+                        tracker.log_episode(len(scores), scores[-1], eps)
+                # Breakdown since the previous finished episode, whichever env it came from
+                profiler.end_episode(len(scores))
+            states, masks = next_states, next_masks
+
+        return scores
+
+    def _record(self, infos, actions):
+        # Auto-reset envs carry the step's components in their final_info
+        self.telemetry.record("reward", [info.get('final_info', info)['reward_components'] for info in infos])
+        self.telemetry.record("action", actions)
+        self.telemetry.tick()
@@ -1,14 +1,77 @@
-import random
-from collections import namedtuple, deque
+import logging
+from collections import namedtuple
 import numpy as np
 import torch
+from src.utils.segment_tree import SumSegmentTree, MinSegmentTree
+from src.utils.storage import (ArrayStorage, FrameStorage, MemmapStorage, TensorStorage,
+                               torch_dtype, transition_fields)
+
+STORAGE_MODES = {
+    'array': ArrayStorage,
+    'frame': FrameStorage,  # next_state shared with the following state, ~half the memory
+    'memmap': MemmapStorage,  # on-disk .npy files, survives restarts and can exceed RAM
+    'device': TensorStorage,  # whole buffer as tensors on the training device
+}
+
+# next_masks / discounts are None unless the buffer stores action masks / n-step discounts
+Batch = namedtuple('Batch', ('states', 'actions', 'rewards', 'next_states', 'dones', 'indices', 'weights',
+                             'next_masks', 'discounts'),
+                   defaults=(None, None))
+
+
+class BatchSlot:
+    """
+    Preallocated tensors that one sampled batch is written into.
+
+    Host storages gather straight into NumPy views of the staging tensors. On CPU the
+    staging tensors *are* the batch, so sampling allocates and copies nothing beyond the
+    gather itself. On GPU the staging tensors are pinned and uploaded with a single
+    non_blocking copy per field. Device-resident storages gather on the device directly.
+    The returned Batch is a view of the slot, so it is only valid until the slot is reused.
+    """
+
+    def __init__(self, fields, batch_size, device, pin_memory=False, device_storage=False):
+        self.device = device
+        self.tensors = tuple(
+            torch.empty((batch_size,) + tuple(shape), dtype=torch_dtype(dtype), device=device)
+            for shape, dtype in fields.values()
+        )
+        self.weights = torch.empty((batch_size, 1), dtype=torch.float32, device=device)
+        self.indices = torch.empty(batch_size, dtype=torch.int64, device=device)
+
+        def staging(tensor):
+            if device.type == 'cpu':
+                return tensor
+            return torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=pin_memory)
+
+        # Device-resident storage only needs the indices and weights on the host side
+        self.staged = () if device_storage else self.tensors
+        self.staging = tuple(staging(t) for t in self.staged + (self.weights, self.indices))
+        self.host = tuple(t.numpy() for t in self.staging)
+        self.copy_done = None
+
+    def wait(self):
+        """Block until the previous upload out of the staging buffers has finished."""
+        if self.copy_done is not None:
+            self.copy_done.synchronize()
+            self.copy_done = None
+
+    def upload(self):
+        if self.device.type == 'cpu':
+            return
+        for dst, src in zip(self.staged + (self.weights, self.indices), self.staging):
+            dst.copy_(src, non_blocking=True)
+        if self.device.type == 'cuda':
+            self.copy_done = torch.cuda.Event()
+            self.copy_done.record()
 
-Experience = namedtuple('Experience', ('state', 'action', 'reward', 'next_state', 'done'))
 
 class ReplayBuffer:
-    """Fixed-size buffer to store experience tuples."""
+    """Fixed-size buffer to store experience tuples, with optional prioritized sampling."""
 
-    def __init__(self, action_size, buffer_size, batch_size, device):
+    def __init__(self, action_size, buffer_size, batch_size, device, state_size=None, storage='array',
+                 storage_kwargs=None, pin_memory=None, action_masking=False, n_step=1, prioritized=True,
+                 alpha=0.6, beta_start=0.4, beta_frames=100000, priority_eps=1e-5):
         """Initialize a ReplayBuffer object.
         Params
         ======
@@ -16,45 +79,282 @@ class ReplayBuffer:
             buffer_size (int): maximum size of buffer
             batch_size (int): size of each training batch
             device (torch.device): device to run on (cpu/gpu)
+            state_size (int): dimension of each state, inferred from the first add() if None
+            storage (str): storage backend, one of STORAGE_MODES
+            storage_kwargs (dict): extra arguments for the storage backend (e.g. memmap path)
+            pin_memory (bool): stage batches in pinned host memory, defaults to True on CUDA
+            action_masking (bool): also store the valid-action mask of each next state
+            n_step (int): transitions are n-step returns, so each one also stores its own
+                bootstrap discount (see NStepAccumulator)
+            prioritized (bool): sample proportionally to TD error instead of uniformly
+            alpha (float): how much prioritization is used (0 = uniform)
+            beta_start (float): initial importance-sampling exponent, annealed linearly to 1
+            beta_frames (int): number of sample() calls over which beta reaches 1
+            priority_eps (float): small constant to avoid zero probability
         """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown replay storage '{storage}', expected one of {list(STORAGE_MODES)}")
         self.action_size = action_size
-        self.memory = deque(maxlen=buffer_size)  
-        self.priorities = deque(maxlen=buffer_size) # Importance of each experience
+        self.buffer_size = buffer_size
         self.batch_size = batch_size
-        self.experience = Experience
         self.device = device
-    
-    def add(self, state, action, reward, next_state, done):
+        self.storage_mode = storage
+        self.storage_kwargs = dict(storage_kwargs or {})
+        self.pin_memory = (device.type == 'cuda') if pin_memory is None else pin_memory
+        self.action_masking = action_masking
+        self.n_step = n_step
+        self.memory = None
+        self._slot = None
+        self.logger = logging.getLogger(__name__)
+
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_frames = beta_frames
+        self.priority_eps = priority_eps
+        self.frame = 0
+        # Monotonic write counter stamped on every slot write/eviction, so a priority update
+        # computed from an older sample can tell whether its slot has been reused since
+        self.write_count = 0
+        self.write_stamps = np.zeros(buffer_size, dtype=np.int64)
+        if prioritized:
+            self.sum_tree = SumSegmentTree(buffer_size)
+            self.min_tree = MinSegmentTree(buffer_size)
+            # Cached running max (raw |TD| + eps), so add() doesn't have to scan every priority
+            self.max_priority = 1.0
+
+        if state_size is not None:
+            self._build_storage(state_size)
+
+    def _build_storage(self, state_size):
+        self.state_size = state_size
+        fields = transition_fields(state_size, self.action_size if self.action_masking else None,
+                                   discounts=self.n_step > 1)
+        if self.storage_mode == 'device':
+            self.storage_kwargs.setdefault('device', self.device)
+            if not self._fits_on_device(TensorStorage.nbytes(self.buffer_size, fields)):
+                self.logger.warning("Replay buffer does not fit in device memory, falling back to 'array' storage.")
+                self.storage_mode = 'array'
+                self.storage_kwargs.pop('device')
+        self.memory = STORAGE_MODES[self.storage_mode](self.buffer_size, fields, **self.storage_kwargs)
+        self.memory.on_evict = self._evict
+        meta = getattr(self.memory, 'meta', None)
+        if meta is not None:
+            self._restore(meta.get('extra', {}))
+
+    def _restore(self, extra):
+        # Reopened a persisted buffer: rebuild the trees from the saved per-slot priorities in O(N)
+        self.frame = extra.get('frame', 0)
+        if self.prioritized:
+            leaves = np.asarray(self.memory.priorities)
+            self.sum_tree.build(leaves)
+            self.min_tree.build(np.where(leaves > 0, leaves, np.inf))
+            self.max_priority = extra.get('max_priority', 1.0)
+
+    def flush(self):
+        """Persist the buffer, for storage backends that live on disk. No-op otherwise."""
+        if self.memory is None or not hasattr(self.memory, 'flush'):
+            return
+        extra = {'frame': self.frame}
+        if self.prioritized:
+            self.memory.priorities[:] = self.sum_tree[np.arange(self.buffer_size)]
+            extra['max_priority'] = float(self.max_priority)
+        self.memory.flush(extra)
+
+    def state_dict(self):
+        """Copy of the contents and sampling state, for checkpoints (unlike flush(), works for every storage)."""
+        state = {'frame': self.frame, 'write_count': self.write_count, 'write_stamps': self.write_stamps.copy()}
+        if self.memory is not None:
+            state.update(state_size=self.state_size, storage_mode=self.storage_mode, memory=self.memory.state_dict())
+        if self.prioritized:
+            state.update(sum_tree=self.sum_tree.tree.copy(), min_tree=self.min_tree.tree.copy(),
+                         max_priority=self.max_priority)
+        return state
+
+    def load_state_dict(self, state):
+        self.frame, self.write_count = state['frame'], state['write_count']
+        self.write_stamps[:] = state['write_stamps']
+        if 'memory' in state:
+            if self.memory is None:
+                self._build_storage(state['state_size'])
+            if self.storage_mode != state['storage_mode']:
+                raise ValueError(f"Checkpoint holds a '{state['storage_mode']}' replay buffer, "
+                                 f"this one uses '{self.storage_mode}'")
+            self.memory.load_state_dict(state['memory'])
+        if self.prioritized:
+            self.sum_tree.tree[:] = state['sum_tree']
+            self.min_tree.tree[:] = state['min_tree']
+            self.max_priority = state['max_priority']
+
+    def _fits_on_device(self, nbytes):
+        if self.device.type != 'cuda':
+            return True
+        free, _ = torch.cuda.mem_get_info(self.device)
+        # Leave at least half of the free memory for the networks and activations
+        return nbytes < free // 2
+
+    def allocate_batch(self):
+        """Preallocate a BatchSlot matching this buffer's layout, for use with sample(out=...)."""
+        return BatchSlot(self.memory.fields, self.batch_size, self.device,
+                         pin_memory=self.pin_memory, device_storage=self.storage_mode == 'device')
+
+    def _evict(self, idx):
+        # Storage dropped a transition early (e.g. its frame was overwritten): make it unsampleable
+        self.write_count += 1
+        self.write_stamps[idx] = self.write_count
+        if self.prioritized:
+            self.sum_tree[idx] = 0.0
+            self.min_tree[idx] = float('inf')
+
+    @property
+    def beta(self):
+        fraction = min(self.frame / max(self.beta_frames, 1), 1.0)
+        return self.beta_start + fraction * (1.0 - self.beta_start)
+
+    def _mask_values(self, next_mask, n=None):
+        if not self.action_masking:
+            return ()
+        if next_mask is None:
+            # No mask given: every action is valid
+            shape = (self.action_size,) if n is None else (n, self.action_size)
+            next_mask = np.ones(shape, dtype=bool)
+        return (next_mask,)
+
+    def _discount_values(self, discount):
+        if self.n_step == 1:
+            return ()
+        if discount is None:
+            raise ValueError("An n-step replay buffer needs the discount of every transition")
+        return (discount,)
+
+    def add(self, state, action, reward, next_state, done, next_mask=None, discount=None):
         """Add a new experience to memory."""
-        e = self.experience(state, action, reward, next_state, done)
-        self.memory.append(e)
-        # New experiences get max priority so they are definitely seen at least once!
-        self.priorities.append(max(self.priorities, default=1.0))
-    
-    def sample(self):
+        if self.memory is None:
+            self._build_storage(np.asarray(state).shape[0])
+        idx = self.memory.add(state, action, reward, next_state, done, *self._mask_values(next_mask),
+                              *self._discount_values(discount))
+        self.write_count += 1
+        self.write_stamps[idx] = self.write_count
+        if self.prioritized:
+            # New experiences get max priority so they are definitely seen at least once!
+            priority = self.max_priority ** self.alpha
+            self.sum_tree[idx] = priority
+            self.min_tree[idx] = priority
+
+    def add_batch(self, states, actions, rewards, next_states, dones, next_masks=None, discounts=None):
+        """Add many experiences at once, each argument has a leading batch dimension."""
+        values = ((states, actions, rewards, next_states, dones) + self._mask_values(next_masks, len(states))
+                  + self._discount_values(discounts))
+        if len(states) > self.buffer_size:
+            # Only the newest buffer_size transitions would survive anyway
+            values = tuple(np.asarray(v)[-self.buffer_size:] for v in values)
+        if self.memory is None:
+            self._build_storage(np.asarray(states).shape[1])
+        slots = self.memory.add_batch(*values)
+        self.write_count += 1
+        self.write_stamps[slots] = self.write_count
+        if self.prioritized:
+            priority = np.full(len(slots), self.max_priority ** self.alpha)
+            self.sum_tree.update(slots, priority)
+            self.min_tree.update(slots, priority)
+        return slots
+
+    def _sample_indices(self):
+        n = len(self.memory)
+        if not self.prioritized:
+            return self.memory.sample_indices(self.batch_size), np.ones(self.batch_size, dtype=np.float32)
+
+        # Stratified sampling: split the total priority mass into batch_size equal segments
+        # and draw one sample from each, which keeps the batch spread over the distribution.
+        total = self.sum_tree.sum()
+        segment = total / self.batch_size
+        mass = (np.arange(self.batch_size) + np.random.random(self.batch_size)) * segment
+        indices = self.sum_tree.find_prefixsum_idx(mass)
+
+        # Importance-sampling weights w_i = (N * P(i))^-beta, normalized by the largest weight
+        beta = self.beta
+        self.frame += 1
+        p_min = self.min_tree.min() / total
+        max_weight = (p_min * n) ** (-beta)
+        probs = self.sum_tree[indices] / total
+        weights = ((probs * n) ** (-beta) / max_weight).astype(np.float32)
+        return indices, weights
+
+    def sample(self, out=None):
         """
-        Sample a batch, but smarter! 
+        Sample a batch, but smarter!
         Experiences with high priority (= high error) are more likely to be picked.
+
+        The batch is written in place into `out` (a BatchSlot from allocate_batch()), or into
+        an internal slot that is reused by the next call, so nothing is allocated per batch.
+        """
+        if out is None:
+            if self._slot is None:
+                self._slot = self.allocate_batch()
+            out = self._slot
+        indices, weights = self._sample_indices()
+
+        out.wait()
+        *host, host_weights, host_indices = out.host
+        host_weights[:, 0] = weights
+        host_indices[:] = indices
+        if self.storage_mode == 'device':
+            out.upload()
+            self.memory.gather(out.indices, out=out.tensors)
+        else:
+            # Storage dtypes already match the tensors, so this is a plain gather
+            self.memory.gather(indices, out=host)
+            out.upload()
+
+        return Batch(indices=indices, weights=out.weights, **dict(zip(self.memory.fields, out.tensors)))
+
+    def update_priorities(self, indices, errors, written_before=None):
+        """Update priorities based on TD error
+
+        Params
+        ======
+            indices (np.ndarray): slots the errors were computed for
+            errors (np.ndarray): TD errors
+            written_before (int): write_count when the batch was sampled. Slots written
+                since then hold different transitions, so their updates are dropped.
+        """
+        if not self.prioritized:
+            return
+        if isinstance(errors, torch.Tensor):
+            errors = errors.detach().cpu().numpy()
+        indices = np.asarray(indices).reshape(-1)
+        errors = np.asarray(errors, dtype=np.float64).reshape(-1)
+        if written_before is not None:
+            fresh = self.write_stamps[indices] <= written_before
+            indices, errors = indices[fresh], errors[fresh]
+        if len(indices) == 0:
+            return
+        priorities = np.abs(errors) + self.priority_eps # small constant to avoid zero probability
+        scaled = priorities ** self.alpha
+        self.sum_tree.update(indices, scaled)
+        self.min_tree.update(indices, scaled)
+        self.max_priority = max(self.max_priority, priorities.max())
+
+    def priority_stats(self, bins=10):
+        """
+        Summary of the sampling priorities (p^alpha) for monitoring.
+        min/sum come straight from the trees and max is the cached running max given to new
+        transitions, so those are O(1); the histogram is one O(N) numpy pass.
+        Returns None for uniform replay.
         """
-        probs = np.array(self.priorities)
-        probs = probs / probs.sum()
-        
-        indices = np.random.choice(len(self.memory), self.batch_size, p=probs)
-        experiences = [self.memory[i] for i in indices]
-
-        states = torch.from_numpy(np.vstack([e.state for e in experiences if e is not None])).float().to(self.device)
-        actions = torch.from_numpy(np.vstack([e.action for e in experiences if e is not None])).long().to(self.device)
-        rewards = torch.from_numpy(np.vstack([e.reward for e in experiences if e is not None])).float().to(self.device)
-        next_states = torch.from_numpy(np.vstack([e.next_state for e in experiences if e is not None])).float().to(self.device)
-        dones = torch.from_numpy(np.vstack([e.done for e in experiences if e is not None]).astype(np.uint8)).float().to(self.device)
-  
-        return (states, actions, rewards, next_states, dones, indices)
-    
-    def update_priorities(self, indices, errors):
-        """Update priorities based on TD error"""
-        for i, error in zip(indices, errors):
-            self.priorities[i] = abs(error) + 1e-5 # small constant to avoid zero probability
+        if not self.prioritized or len(self) == 0:
+            return None
+        total = self.sum_tree.sum()
+        leaves = self.sum_tree[np.arange(self.buffer_size)]
+        counts, edges = np.histogram(leaves[leaves > 0], bins=bins)
+        return {
+            'max': self.max_priority ** self.alpha,
+            'min': self.min_tree.min(),
+            'sum': total,
+            'mean': total / len(self),
+            'histogram': (counts, edges),
+        }
 
     def __len__(self):
         """Return the current size of internal memory."""
-        return len(self.memory)
+        return 0 if self.memory is None else len(self.memory)
@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class NStepAccumulator:
+    """
+    Turns 1-step transitions into n-step ones on their way into the replay buffer.
+
+    Every stream (one env, or one junction / vector env when they are stepped together)
+    keeps a ring of its last n (state, action) pairs with their partial discounted
+    returns. A new reward is added to all pending returns in one vectorized op over the
+    (streams, n) ring, so a push is O(streams * n) array work with no per-transition
+    Python loop. A transition leaves once it has collected n rewards, bootstrapping from
+    the state n steps later with gamma**n.
+
+    When an episode ends, every pending transition of that stream leaves at once with
+    the k < n rewards it got and discount gamma**k: terminal ones are not bootstrapped
+    from (done=1), truncated ones bootstrap from the last observation.
+    """
+
+    def __init__(self, n_step, gamma):
+        """
+        Params
+        ======
+            n_step (int): number of rewards summed before bootstrapping
+            gamma (float): discount factor
+        """
+        if n_step < 1:
+            raise ValueError(f"n_step must be at least 1, got {n_step}")
+        self.n_step = n_step
+        self.gamma = gamma
+        self.powers = gamma ** np.arange(n_step + 1)
+        self.num_streams = None  # fixed by the first push()
+        self.t = 0  # pushes so far, the ring slot written is t % n_step
+
+    def _allocate(self, states):
+        self.num_streams = len(states)
+        shape = (self.num_streams, self.n_step)
+        self.states = np.zeros(shape + states.shape[1:], dtype=np.float32)
+        self.actions = np.zeros(shape, dtype=np.int64)
+        self.returns = np.zeros(shape, dtype=np.float64)
+        self.age = np.zeros(shape, dtype=np.int64)  # rewards collected by each pending transition
+        self.pending = np.zeros(shape, dtype=bool)
+
+    def push(self, states, actions, rewards, next_states, dones, next_masks=None, truncated=None):
+        """
+        Add one step of every stream. Arguments have a leading stream dimension.
+
+        Returns the transitions that are complete, as (states, actions, returns,
+        next_states, dones, next_masks, discounts) arrays ready for ReplayBuffer.add_batch()
+        (next_masks is None if none were given). There can be none, or several per stream
+        when an episode ends.
+        """
+        states = np.asarray(states, dtype=np.float32)
+        if self.num_streams is None:
+            self._allocate(states)
+        elif len(states) != self.num_streams:
+            raise ValueError(f"NStepAccumulator was set up for {self.num_streams} streams, got {len(states)}")
+        rewards = np.asarray(rewards, dtype=np.float64).reshape(-1)
+        dones = np.asarray(dones, dtype=np.float32).reshape(-1)
+        ended = dones > 0
+        if truncated is not None:
+            ended |= np.asarray(truncated, dtype=bool).reshape(-1)
+
+        slot = self.t % self.n_step
+        self.t += 1
+        self.states[:, slot] = states
+        self.actions[:, slot] = np.asarray(actions).reshape(-1)
+        self.returns[:, slot] = 0.0
+        self.age[:, slot] = 0
+        self.pending[:, slot] = True
+
+        # r_t reaches a transition that is k steps old discounted by gamma**k
+        self.returns += np.where(self.pending, self.powers[self.age] * rewards[:, None], 0.0)
+        self.age += self.pending
+
+        ready = self.pending & ((self.age == self.n_step) | ended[:, None])
+        streams, slots = np.nonzero(ready)
+        # Oldest first within each stream
+        order = np.lexsort((-self.age[streams, slots], streams))
+        streams, slots = streams[order], slots[order]
+        self.pending[streams, slots] = False
+
+        next_states = np.asarray(next_states, dtype=np.float32)
+        return (
+            self.states[streams, slots],
+            self.actions[streams, slots],
+            self.returns[streams, slots].astype(np.float32),
+            next_states[streams],
+            dones[streams],
+            None if next_masks is None else np.asarray(next_masks)[streams],
+            self.powers[self.age[streams, slots]].astype(np.float32),
+        )
+
+    def state_dict(self):
+        state = {'t': self.t, 'num_streams': self.num_streams}
+        if self.num_streams is not None:
+            state.update({name: getattr(self, name).copy() for name in ('states', 'actions', 'returns', 'age', 'pending')})
+        return state
+
+    def load_state_dict(self, state):
+        self.t, self.num_streams = state['t'], state['num_streams']
+        for name in ('states', 'actions', 'returns', 'age', 'pending'):
+            if name in state:
+                setattr(self, name, state[name].copy())
+
+    def reset(self):
+        """Drop every pending transition (e.g. when the caller abandons an episode)."""
+        if self.num_streams is not None:
+            self.pending[:] = False
@@ -0,0 +1,121 @@
+import queue
+import threading
+
+
+class PrefetchSampler:
+    """
+    Wraps a ReplayBuffer and assembles the next batches on a background thread,
+    so sampling overlaps with the simulator step and the model update.
+
+    It exposes the same add/sample/update_priorities/__len__ interface as the buffer,
+    and every call into the buffer goes through one lock. Batches live in a small pool
+    of preallocated BatchSlots: up to `num_batches` wait in a bounded queue, one is
+    being filled by the worker and one is held by the consumer until its next sample().
+
+    Prefetched batches were drawn with the priorities of their sampling time. A batch
+    that has seen more than `max_staleness` priority updates since then is re-sampled
+    on the spot, and priority updates for slots overwritten since sampling are dropped.
+    """
+
+    def __init__(self, buffer, num_batches=2, max_staleness=4):
+        """
+        Params
+        ======
+            buffer (ReplayBuffer): the buffer to sample from
+            num_batches (int): how many batches to keep ready
+            max_staleness (int): priority updates a queued batch may miss before it is re-sampled
+        """
+        self.buffer = buffer
+        self.num_batches = num_batches
+        self.max_staleness = max_staleness
+        self.lock = threading.Lock()
+        self.version = 0           # number of priority updates applied so far
+        self.stale_batches = 0     # batches thrown away for being too stale
+        self._ready = queue.Queue(maxsize=num_batches)
+        self._free = queue.Queue()
+        self._current = None       # (slot, batch, write_count) handed out by the last sample()
+        self._worker = None
+        self._stop = threading.Event()
+
+    def _start(self):
+        # Slots are allocated lazily, the buffer only knows its layout after the first add()
+        for _ in range(self.num_batches + 2):
+            self._free.put(self.buffer.allocate_batch())
+        self._worker = threading.Thread(target=self._run, name="replay-prefetch", daemon=True)
+        self._worker.start()
+
+    def _sample_into(self, slot):
+        with self.lock:
+            batch = self.buffer.sample(out=slot)
+            return batch, self.buffer.write_count, self.version
+
+    def _run(self):
+        while not self._stop.is_set():
+            slot = self._free.get()
+            if slot is None:
+                break
+            item = (slot,) + self._sample_into(slot)
+            # Bounded queue: blocks while num_batches are already waiting
+            while not self._stop.is_set():
+                try:
+                    self._ready.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def add(self, *args, **kwargs):
+        with self.lock:
+            return self.buffer.add(*args, **kwargs)
+
+    def add_batch(self, *args, **kwargs):
+        with self.lock:
+            return self.buffer.add_batch(*args, **kwargs)
+
+    def sample(self):
+        """Return the next prefetched batch. It stays valid until the following sample() call."""
+        if self._worker is None:
+            self._start()
+        if self._current is not None:
+            self._free.put(self._current[0])
+
+        slot, batch, write_count, version = self._ready.get()
+        if self.version - version > self.max_staleness:
+            self.stale_batches += 1
+            batch, write_count, version = self._sample_into(slot)
+        self._current = (slot, batch, write_count)
+        return batch
+
+    def update_priorities(self, indices, errors):
+        written_before = None
+        if self._current is not None and indices is self._current[1].indices:
+            written_before = self._current[2]
+        with self.lock:
+            self.buffer.update_priorities(indices, errors, written_before=written_before)
+            self.version += 1
+
+    def flush(self):
+        with self.lock:
+            self.buffer.flush()
+
+    def state_dict(self):
+        with self.lock:
+            return self.buffer.state_dict()
+
+    def load_state_dict(self, state):
+        with self.lock:
+            self.buffer.load_state_dict(state)
+            self.version += 1
+
+    def close(self):
+        """Stop the worker thread."""
+        self._stop.set()
+        self._free.put(None)
+        if self._worker is not None:
+            self._worker.join(timeout=1.0)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __getattr__(self, name):
+        # Everything else (batch_size, device, trees, ...) comes from the wrapped buffer
+        return getattr(self.buffer, name)
@@ -0,0 +1,115 @@
+import operator
+import numpy as np
+
+
+class SegmentTree:
+    """
+    Array-backed binary segment tree over a fixed number of leaves.
+    Node 1 is the root, node i has children 2i and 2i+1, and leaf j lives at capacity + j.
+    Updating a leaf and querying the whole range are both O(log N).
+    """
+
+    def __init__(self, capacity, operation, ufunc, neutral_element):
+        """
+        Params
+        ======
+            capacity (int): number of leaves (rounded up to a power of two internally)
+            operation (callable): associative reduce op, e.g. operator.add or min
+            ufunc (np.ufunc): the same op vectorized, used for bulk builds
+            neutral_element (float): identity of the op (0 for sum, inf for min)
+        """
+        self.size = capacity
+        self.capacity = 1
+        while self.capacity < capacity:
+            self.capacity *= 2
+        self.operation = operation
+        self.ufunc = ufunc
+        self.neutral_element = neutral_element
+        self.tree = np.full(2 * self.capacity, neutral_element, dtype=np.float64)
+
+    def __setitem__(self, idx, value):
+        node = idx + self.capacity
+        self.tree[node] = value
+        node //= 2
+        # Walk up to the root, recomputing each parent from its two children
+        while node >= 1:
+            self.tree[node] = self.operation(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+    def update(self, indices, values):
+        """
+        Set many leaves at once. Each tree level is recomputed with one vectorized op,
+        so a batch of B updates costs O(log N) numpy calls instead of B * log N Python steps.
+        If an index repeats, its last value wins.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        if len(indices) == 1:
+            # A single leaf (one-env n-step adds): the scalar walk beats a np.unique per level
+            self[int(indices[0])] = float(values[0])
+            return
+        # np.unique keeps the first occurrence, so look at the reversed arrays to keep the last
+        indices, first = np.unique(indices[::-1], return_index=True)
+        nodes = indices + self.capacity
+        self.tree[nodes] = values[::-1][first]
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.ufunc(self.tree[2 * nodes], self.tree[2 * nodes + 1])
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def __getitem__(self, idx):
+        # Works for scalars and index arrays alike, leaves are contiguous
+        return self.tree[np.asarray(idx) + self.capacity]
+
+    def build(self, values):
+        """Replace all leaves at once and rebuild every level bottom-up in O(N)."""
+        self.tree[self.capacity:] = self.neutral_element
+        self.tree[self.capacity:self.capacity + len(values)] = values
+        lo = self.capacity // 2
+        while lo >= 1:
+            hi = 2 * lo
+            self.tree[lo:hi] = self.ufunc(self.tree[2 * lo:2 * hi:2], self.tree[2 * lo + 1:2 * hi:2])
+            lo //= 2
+
+    def reduce(self):
+        """Reduce over all leaves (the root)."""
+        return self.tree[1]
+
+
+class SumSegmentTree(SegmentTree):
+    def __init__(self, capacity):
+        super(SumSegmentTree, self).__init__(capacity, operator.add, np.add, 0.0)
+
+    def sum(self):
+        return self.reduce()
+
+    def find_prefixsum_idx(self, prefixsums):
+        """
+        Find the leaves whose cumulative sums contain each given prefix sum.
+        All queries descend the tree together, so a whole batch costs O(log N) numpy ops.
+
+        Params
+        ======
+            prefixsums (np.ndarray): values in [0, sum())
+        """
+        prefixsums = np.array(prefixsums, dtype=np.float64)
+        idx = np.ones(len(prefixsums), dtype=np.int64)
+        while idx[0] < self.capacity:
+            left = 2 * idx
+            left_sum = self.tree[left]
+            # Never step into an empty subtree: floating point drift could otherwise
+            # land us on a padding leaf or a slot with zero priority
+            go_right = (prefixsums >= left_sum) & (self.tree[left + 1] > 0)
+            prefixsums -= np.where(go_right, left_sum, 0.0)
+            idx = left + go_right
+        return idx - self.capacity
+
+
+class MinSegmentTree(SegmentTree):
+    def __init__(self, capacity):
+        super(MinSegmentTree, self).__init__(capacity, min, np.minimum, float('inf'))
+
+    def min(self):
+        return self.reduce()
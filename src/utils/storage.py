@@ -0,0 +1,423 @@
+import json
+import os
+from collections import OrderedDict
+import numpy as np
+import torch
+
+
+def transition_fields(state_size, mask_size=None, discounts=False):
+    """
+    Layout of one stored transition: name -> (per-item shape, dtype).
+    Scalars are kept as shape (1,) so a gathered batch is already (batch, 1),
+    and dtypes match what learn() consumes, so a batch never needs converting.
+    With `mask_size`, the valid-action mask of the next state is stored too, and with
+    `discounts` the per-transition bootstrap discount (gamma**k of n-step returns).
+    """
+    fields = OrderedDict([
+        ('states', ((state_size,), np.float32)),
+        ('actions', ((1,), np.int64)),
+        ('rewards', ((1,), np.float32)),
+        ('next_states', ((state_size,), np.float32)),
+        ('dones', ((1,), np.float32)),
+    ])
+    if mask_size is not None:
+        fields['next_masks'] = ((mask_size,), np.bool_)
+    if discounts:
+        fields['discounts'] = ((1,), np.float32)
+    return fields
+
+
+class ArrayStorage:
+    """
+    Ring buffer of preallocated NumPy arrays, one array per transition field (structure-of-arrays).
+    add() writes one row per field, gather() is one fancy-index take per field,
+    so no Python object is created per stored or sampled transition.
+    """
+
+    def __init__(self, capacity, fields):
+        """
+        Params
+        ======
+            capacity (int): maximum number of transitions
+            fields (OrderedDict): name -> (shape, dtype), see transition_fields()
+        """
+        self.capacity = capacity
+        self.fields = fields
+        self.pos = 0   # next slot to write
+        self.tail = 0  # oldest valid slot
+        self.size = 0  # valid slots are [tail, tail + size) modulo capacity
+        # Called with a slot index whenever a transition is dropped before being overwritten
+        self.on_evict = None
+        self.arrays = OrderedDict(
+            (name, self._allocate(name, shape, dtype))
+            for name, (shape, dtype) in fields.items() if name not in self._derived_fields()
+        )
+
+    def _derived_fields(self):
+        """Fields that are not stored as their own array."""
+        return ()
+
+    def _allocate(self, name, shape, dtype):
+        return np.zeros((self.capacity,) + tuple(shape), dtype=dtype)
+
+    def _advance(self):
+        idx = self.pos
+        if self.size == self.capacity:
+            self.tail = (self.tail + 1) % self.capacity
+        else:
+            self.size += 1
+        self.pos = (self.pos + 1) % self.capacity
+        return idx
+
+    def add(self, *values):
+        """Write one transition (values in field order) and return its slot index."""
+        idx = self._advance()
+        for array, value in zip(self.arrays.values(), values):
+            array[idx] = value
+        return idx
+
+    def _advance_many(self, n):
+        slots = (self.pos + np.arange(n)) % self.capacity
+        overflow = max(self.size + n - self.capacity, 0)
+        self.tail = (self.tail + overflow) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.pos = (self.pos + n) % self.capacity
+        return slots
+
+    def add_batch(self, *values):
+        """
+        Write n transitions at once (each value has a leading batch dimension, n <= capacity)
+        with one vectorized write per field. Returns the slot indices.
+        """
+        n = len(values[0])
+        slots = self._advance_many(n)
+        for (name, array), value in zip(self.arrays.items(), values):
+            array[slots] = np.asarray(value).reshape((n,) + tuple(self.fields[name][0]))
+        return slots
+
+    def sample_indices(self, batch_size):
+        """Uniformly random valid slots."""
+        return (self.tail + np.random.randint(0, self.size, size=batch_size)) % self.capacity
+
+    def _gather_field(self, name, indices, out):
+        if out is None:
+            return self.arrays[name][indices]
+        return np.take(self.arrays[name], indices, axis=0, out=out)
+
+    def gather(self, indices, out=None):
+        """
+        Gather the given slots for every field, in field order.
+        If `out` (a tuple of arrays in field order) is given, rows are written into it in place.
+        """
+        if out is None:
+            out = (None,) * len(self.fields)
+        return tuple(self._gather_field(name, indices, dest) for name, dest in zip(self.fields, out))
+
+    def __len__(self):
+        return self.size
+
+    def state_dict(self):
+        """Copy of the ring pointers and contents, for checkpoints."""
+        return {
+            'pos': self.pos, 'tail': self.tail, 'size': self.size,
+            'arrays': {name: self._copy_array(array) for name, array in self.arrays.items()},
+        }
+
+    def load_state_dict(self, state):
+        self.pos, self.tail, self.size = state['pos'], state['tail'], state['size']
+        for name, value in state['arrays'].items():
+            self._load_array(self.arrays[name], value)
+
+    def _copy_array(self, array):
+        return np.array(array)
+
+    def _load_array(self, array, value):
+        array[...] = value
+
+
+class FrameStorage(ArrayStorage):
+    """
+    Memory-efficient storage that keeps every observation only once.
+
+    In a rollout the next_state of step t is the state of step t+1, so storing both
+    doubles the memory for nothing. Observations go into their own ring, and each
+    transition only keeps the serial number of its state; its next_state is always
+    the observation written right after it. A new observation is only written for
+    the state when it does not continue from the last stored one (episode start,
+    interleaved writers), which is how episode boundaries are handled.
+
+    Because observations and transitions are overwritten at different rates, the
+    oldest transitions are evicted as soon as one of their observations is gone.
+    With n-step transitions the next_state is n steps ahead, so consecutive
+    transitions rarely share an observation and this saves little over 'array'.
+    """
+
+    def __init__(self, capacity, fields, obs_capacity=None):
+        """
+        Params
+        ======
+            capacity (int): maximum number of transitions
+            fields (OrderedDict): name -> (shape, dtype), see transition_fields()
+            obs_capacity (int): size of the observation ring. Each episode boundary costs
+                one extra observation, so the default leaves ~1% slack for them.
+        """
+        super(FrameStorage, self).__init__(capacity, fields)
+        self.obs_capacity = obs_capacity or capacity + capacity // 100 + 1
+        shape, dtype = fields['states']
+        self.obs = np.zeros((self.obs_capacity,) + tuple(shape), dtype=dtype)
+        self.obs_count = 0  # serial number of the next observation to write
+        # Serial of each transition's state observation, next_state is serial + 1
+        self.state_serial = np.zeros(capacity, dtype=np.int64)
+        self._value_names = [name for name in fields if name not in self._derived_fields()]
+
+    def _derived_fields(self):
+        return ('states', 'next_states')
+
+    def _write_obs(self, observation):
+        serial = self.obs_count
+        self.obs[serial % self.obs_capacity] = observation
+        self.obs_count += 1
+        # Drop the oldest transitions whose state just got overwritten
+        oldest_alive = self.obs_count - self.obs_capacity
+        while self.size and self.state_serial[self.tail] < oldest_alive:
+            if self.on_evict is not None:
+                self.on_evict(self.tail)
+            self.tail = (self.tail + 1) % self.capacity
+            self.size -= 1
+        return serial
+
+    def add(self, *values):
+        values = dict(zip(self.fields, values))
+        state = values.pop('states')
+        next_state = values.pop('next_states')
+
+        # Share the observation with the previous transition when it continues from it
+        last = self.obs_count - 1
+        if self.obs_count and np.array_equal(self.obs[last % self.obs_capacity], state):
+            serial = last
+        else:
+            serial = self._write_obs(state)
+        self._write_obs(next_state)
+
+        idx = self._advance()
+        self.state_serial[idx] = serial
+        for name in self._value_names:
+            self.arrays[name][idx] = values[name]
+        return idx
+
+    def add_batch(self, *values):
+        # Frame sharing depends on the order transitions arrive in, so go one by one
+        return np.array([self.add(*row) for row in zip(*values)], dtype=np.int64)
+
+    def state_dict(self):
+        state = super(FrameStorage, self).state_dict()
+        state.update(obs=self.obs.copy(), obs_count=self.obs_count, state_serial=self.state_serial.copy())
+        return state
+
+    def load_state_dict(self, state):
+        super(FrameStorage, self).load_state_dict(state)
+        self.obs[...] = state['obs']
+        self.obs_count = state['obs_count']
+        self.state_serial[...] = state['state_serial']
+
+    def _gather_field(self, name, indices, out):
+        if name == 'states':
+            rows = self.state_serial[indices] % self.obs_capacity
+        elif name == 'next_states':
+            rows = (self.state_serial[indices] + 1) % self.obs_capacity
+        else:
+            return super(FrameStorage, self)._gather_field(name, indices, out)
+        if out is None:
+            return self.obs[rows]
+        return np.take(self.obs, rows, axis=0, out=out)
+
+
+def torch_dtype(dtype):
+    """The torch dtype matching a NumPy dtype."""
+    return torch.from_numpy(np.zeros(0, dtype=dtype)).dtype
+
+
+class TensorStorage(ArrayStorage):
+    """
+    Device-resident storage: every field is a torch tensor on the training device.
+    Sampling then never leaves the GPU, only the batch indices are uploaded.
+    Use it when the whole buffer fits in device memory.
+    """
+
+    def __init__(self, capacity, fields, device=torch.device("cpu")):
+        self.device = torch.device(device)
+        super(TensorStorage, self).__init__(capacity, fields)
+
+    @staticmethod
+    def nbytes(capacity, fields):
+        """Bytes needed to hold `capacity` transitions with the given layout."""
+        return sum(capacity * int(np.prod(shape)) * np.dtype(dtype).itemsize for shape, dtype in fields.values())
+
+    def _allocate(self, name, shape, dtype):
+        return torch.zeros((self.capacity,) + tuple(shape), dtype=torch_dtype(dtype), device=self.device)
+
+    def add(self, *values):
+        idx = self._advance()
+        for array, value in zip(self.arrays.values(), values):
+            array[idx] = torch.as_tensor(value, dtype=array.dtype)
+        return idx
+
+    def _copy_array(self, array):
+        return array.detach().cpu().numpy().copy()
+
+    def _load_array(self, array, value):
+        array.copy_(torch.from_numpy(value))
+
+    def add_batch(self, *values):
+        n = len(values[0])
+        slots = torch.from_numpy(self._advance_many(n)).to(self.device)
+        for (name, array), value in zip(self.arrays.items(), values):
+            value = torch.as_tensor(np.asarray(value), dtype=array.dtype).reshape((n,) + array.shape[1:])
+            array[slots] = value.to(self.device)
+        return slots.cpu().numpy()
+
+    def _gather_field(self, name, indices, out):
+        # indices may be a NumPy array or a tensor already on the device
+        indices = torch.as_tensor(indices, device=self.device)
+        if out is None:
+            return self.arrays[name].index_select(0, indices)
+        return torch.index_select(self.arrays[name], 0, indices, out=out)
+
+
+class MemmapStorage(ArrayStorage):
+    """
+    Disk-backed storage: every field is an .npy file opened with np.memmap, so the
+    buffer can grow far beyond RAM and the OS page cache decides what stays resident.
+    Pointing it at an existing directory reopens the buffer, which lets training resume
+    with the experience collected by earlier runs (call flush() to persist the ring state).
+    state_dict() doesn't copy the data into the checkpoint either: it flushes the files and
+    records where they are, and load_state_dict() reopens them. The files keep changing as
+    training goes on, so a persistent write counter (writes.npy, bumped by every write) is
+    recorded too, and a checkpoint whose files have been written since is refused instead of
+    being paired with newer transitions. Use an in-memory storage to resume from older checkpoints.
+    """
+
+    META_FILE = "meta.json"
+    COUNTER_FILE = "writes.npy"
+
+    def __init__(self, capacity, fields, path="replay/"):
+        """
+        Params
+        ======
+            capacity (int): maximum number of transitions
+            fields (OrderedDict): name -> (shape, dtype), see transition_fields()
+            path (str): directory holding the .npy files and ring metadata
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, self.META_FILE)
+        self.meta = None
+        if os.path.isfile(meta_path):
+            with open(meta_path, 'r') as f:
+                self.meta = json.load(f)
+            layout = {name: [list(shape), np.dtype(dtype).str] for name, (shape, dtype) in fields.items()}
+            if self.meta['capacity'] != capacity or self.meta['fields'] != layout:
+                raise ValueError(f"Replay buffer in {path} has a different capacity or layout, refusing to reopen it")
+
+        super(MemmapStorage, self).__init__(capacity, fields)
+        # Per-slot priorities persisted alongside the data, so prioritized replay survives a restart
+        self.priorities = self._allocate('priorities', (), np.float64)
+        self.write_counter = self._open_counter(path)
+        if self.meta is not None:
+            self.pos, self.tail, self.size = self.meta['pos'], self.meta['tail'], self.meta['size']
+
+    def _allocate(self, name, shape, dtype):
+        filename = os.path.join(self.path, f"{name}.npy")
+        if self.meta is not None:
+            return np.lib.format.open_memmap(filename, mode='r+')
+        return np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=(self.capacity,) + tuple(shape))
+
+    def _open_counter(self, path):
+        filename = os.path.join(path, self.COUNTER_FILE)
+        if os.path.isfile(filename):
+            return np.lib.format.open_memmap(filename, mode='r+')
+        # Buffers written before the counter existed start from 0
+        return np.lib.format.open_memmap(filename, mode='w+', dtype=np.int64, shape=(1,))
+
+    def _advance(self):
+        self.write_counter[0] += 1
+        return super(MemmapStorage, self)._advance()
+
+    def _advance_many(self, n):
+        self.write_counter[0] += n
+        return super(MemmapStorage, self)._advance_many(n)
+
+    def sample_indices(self, batch_size):
+        # Sorted indices turn a batch into a forward sweep over the files, which is
+        # much kinder to the page cache and readahead than random order
+        return np.sort(super(MemmapStorage, self).sample_indices(batch_size))
+
+    def flush(self, extra=None):
+        """
+        Write dirty pages and the ring metadata to disk.
+
+        Params
+        ======
+            extra (dict): additional JSON-serializable state to keep with the buffer
+        """
+        for array in self.arrays.values():
+            array.flush()
+        self.priorities.flush()
+        self.write_counter.flush()
+        meta = {
+            'capacity': self.capacity,
+            'fields': {name: [list(shape), np.dtype(dtype).str] for name, (shape, dtype) in self.fields.items()},
+            'pos': self.pos,
+            'tail': self.tail,
+            'size': self.size,
+            'extra': extra or {},
+        }
+        # Write-then-rename so a crash mid-flush never leaves a truncated meta file behind
+        meta_path = os.path.join(self.path, self.META_FILE)
+        with open(meta_path + ".tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def state_dict(self):
+        """Ring pointers, write counter and the location of the (flushed) files, for checkpoints."""
+        for array in self.arrays.values():
+            array.flush()
+        self.priorities.flush()
+        self.write_counter.flush()
+        return {'pos': self.pos, 'tail': self.tail, 'size': self.size, 'writes': int(self.write_counter[0]),
+                'path': os.path.abspath(self.path), 'capacity': self.capacity}
+
+    def load_state_dict(self, state):
+        if 'arrays' in state:
+            # A copy of the contents (e.g. taken from an in-memory storage): write it into the files.
+            # The contents changed, so checkpoints pointing at the old ones must not match anymore.
+            super(MemmapStorage, self).load_state_dict(state)
+            self.write_counter[0] += 1
+            return
+        if state['capacity'] != self.capacity:
+            raise ValueError(f"Checkpoint refers to a replay buffer of {state['capacity']} transitions, "
+                             f"this one holds {self.capacity}")
+        other_path = os.path.abspath(state['path']) != os.path.abspath(self.path)
+        writes = int((self._open_counter(state['path']) if other_path else self.write_counter)[0])
+        if state.get('writes') != writes:
+            raise ValueError(f"Replay buffer in {state['path']} has been written since this checkpoint "
+                             f"({writes} writes, the checkpoint expects {state.get('writes')}), refusing to pair "
+                             f"it with newer transitions. Use an in-memory replay_storage to keep older "
+                             f"checkpoints loadable.")
+        if other_path:
+            self._reopen(state['path'])
+        self.pos, self.tail, self.size = state['pos'], state['tail'], state['size']
+
+    def _reopen(self, path):
+        arrays = OrderedDict(
+            (name, np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode='r+'))
+            for name in self.arrays
+        )
+        for name, array in arrays.items():
+            shape, dtype = self.fields[name]
+            if array.shape != (self.capacity,) + tuple(shape) or array.dtype != np.dtype(dtype):
+                raise ValueError(f"Replay buffer in {path} has a different layout, refusing to reopen it")
+        self.path = path
+        self.arrays = arrays
+        self.priorities = np.lib.format.open_memmap(os.path.join(path, "priorities.npy"), mode='r+')
+        self.write_counter = self._open_counter(path)
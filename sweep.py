@@ -0,0 +1,19 @@
+import argparse
+import logging
+import yaml
+from src.training.sweep import SweepRunner
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a hyperparameter sweep over agent.yaml / simulation.yaml.")
+    parser.add_argument("--config", default="configs/sweep.yaml", help="Sweep definition")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    runner = SweepRunner(load_config(args.config)['sweep'],
+                         load_config("configs/simulation.yaml"),
+                         load_config("configs/agent.yaml"))
+    runner.run()
@@ -0,0 +1,28 @@
+import copy
+import os
+import sys
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # src/ is imported from the repository root, like main.py does
+
+
+@pytest.fixture(scope="session")
+def base_sim_config():
+    with open(os.path.join(ROOT, "configs", "simulation.yaml"), 'r') as f:
+        return yaml.safe_load(f)
+
+
+@pytest.fixture
+def sim_config(base_sim_config):
+    """simulation.yaml with short episodes (60 simulated seconds), free to modify."""
+    config = copy.deepcopy(base_sim_config)
+    config['simulation']['duration'] = 60
+    return config
+
+
+@pytest.fixture(scope="session")
+def base_agent_config():
+    with open(os.path.join(ROOT, "configs", "agent.yaml"), 'r') as f:
+        return yaml.safe_load(f)
@@ -0,0 +1,53 @@
+import copy
+import numpy as np
+from src.agents.dqn_agent import DQNAgent
+from src.core.aimsun_env import AimsunEnv
+from src.training.async_trainer import AsyncTrainer
+
+
+def _steps_per_episode(sim_config):
+    env = AimsunEnv(sim_config)
+    try:
+        state, info = env.reset()
+        steps, done, truncated = 0, False, False
+        while not (done or truncated):
+            state, reward, done, truncated, info = env.step(int(np.flatnonzero(info['action_mask'])[0]))
+            steps += 1
+        return steps
+    finally:
+        env.close()
+
+
+def test_partial_outboxes_reach_the_learner(sim_config, base_agent_config):
+    agent_config = copy.deepcopy(base_agent_config)
+    agent_config['agent'].update(n_step=1, batch_size=8, memory_size=100000, prefetch_batches=0)
+    # Bigger than anything the actor produces: every transition comes in the final flush at stop
+    agent_config['training']['async'].update(num_actors=1, actor_send_every=100000)
+    steps = _steps_per_episode(sim_config)
+
+    env = AimsunEnv(sim_config)
+    agent = DQNAgent(env.observation_space.shape[-1], env.action_dim, 0, agent_config['agent'])
+    env.close()
+    trainer = AsyncTrainer(agent, sim_config, agent_config, seed=0)
+    scores = trainer.train(2)
+
+    assert len(scores) == 2
+    assert trainer.received == len(agent.memory) >= 2 * steps
+
+
+def test_actors_feed_the_learner(sim_config, base_agent_config):
+    agent_config = copy.deepcopy(base_agent_config)
+    agent_config['agent'].update(n_step=1, batch_size=8, memory_size=100000, prefetch_batches=0)
+    agent_config['training']['async'].update(num_actors=2, actor_send_every=8, broadcast_every=2,
+                                             updates_per_transition=0.25)
+
+    env = AimsunEnv(sim_config)
+    agent = DQNAgent(env.observation_space.shape[-1], env.action_dim, 0, agent_config['agent'])
+    env.close()
+    trainer = AsyncTrainer(agent, sim_config, agent_config, seed=0)
+    scores = trainer.train(3)
+
+    assert len(scores) == 3
+    assert trainer.received == len(agent.memory)
+    assert trainer.updates > 0
+    assert trainer.weights_version.value == trainer.updates // 2
@@ -0,0 +1,87 @@
+import json
+import threading
+import numpy as np
+import pytest
+from src.analysis.logger import BufferedWriter, MetricTracker
+
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+        self.written = threading.Event()
+
+    def append(self, rows):
+        self.batches.append(list(rows))
+        self.written.set()
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+def test_close_writes_everything_in_order():
+    sink = RecordingSink()
+    writer = BufferedWriter(sink, flush_every=1000, flush_interval=60.0)
+    for i in range(250):
+        writer.add((i,))
+    assert sink.batches == []  # nothing written from add()
+    writer.close()
+    assert sink.rows == [(i,) for i in range(250)]
+    writer.close()  # closing twice is harmless
+
+
+def test_writer_thread_flushes_every_n_rows():
+    sink = RecordingSink()
+    writer = BufferedWriter(sink, flush_every=10, flush_interval=60.0)
+    try:
+        for i in range(10):
+            writer.add((i,))
+        assert sink.written.wait(5.0)
+        assert sink.rows == [(i,) for i in range(10)]
+    finally:
+        writer.close()
+
+
+def test_writer_thread_flushes_after_the_interval():
+    sink = RecordingSink()
+    writer = BufferedWriter(sink, flush_every=1000, flush_interval=0.05)
+    try:
+        writer.add((1,))
+        assert sink.written.wait(5.0)
+        assert sink.rows == [(1,)]
+    finally:
+        writer.close()
+
+
+def test_add_flushes_itself_past_max_pending():
+    sink = RecordingSink()
+    writer = BufferedWriter(sink, flush_every=1000, flush_interval=60.0, max_pending=5)
+    try:
+        for i in range(5):
+            writer.add((i,))
+        # Written synchronously by the fifth add(), no waiting on the thread
+        assert sink.rows == [(i,) for i in range(5)]
+    finally:
+        writer.close()
+
+
+@pytest.mark.parametrize("file_format", ["csv", "binary"])
+def test_tracker_files(tmp_path, file_format):
+    tracker = MetricTracker(None, str(tmp_path), file_format=file_format, flush_every=1000, flush_interval=60.0)
+    for episode in range(1, 4):
+        tracker.log_episode(episode, -episode * 1.5, 0.5)
+    tracker.close()
+    if file_format == 'csv':
+        lines = open(tracker.metrics_file).read().splitlines()
+        assert lines == ["Episode,Reward,Epsilon", "1,-1.5,0.5", "2,-3.0,0.5", "3,-4.5,0.5"]
+    else:
+        with open(tmp_path / "training_metrics.json") as f:
+            columns = json.load(f)['columns']
+        rows = np.fromfile(tracker.metrics_file, dtype='<f8').reshape(-1, len(columns))
+        np.testing.assert_array_equal(rows[:, 1], [-1.5, -3.0, -4.5])
+    assert list(tracker.episode_rewards) == [-1.5, -3.0, -4.5]
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError, match="metrics format"):
+        MetricTracker(None, str(tmp_path), file_format='parquet')
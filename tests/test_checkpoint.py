@@ -0,0 +1,18 @@
+import os
+from src.training.checkpoint import CheckpointManager
+
+
+def test_retention_keeps_the_latest_and_the_best(tmp_path):
+    checkpoints = CheckpointManager(str(tmp_path), keep_last=3, keep_best=1)
+    for episode, score in enumerate([1.0, 3.0, 2.0], start=1):
+        checkpoints.save({'episode': episode}, episode, score)
+    checkpoints.wait()
+    # Fewer checkpoints than keep_last: all of them stay
+    assert sorted(os.listdir(tmp_path)) == ["checkpoint_000001.pt", "checkpoint_000002.pt",
+                                            "checkpoint_000003.pt", CheckpointManager.INDEX_FILE]
+    for episode, score in enumerate([0.5, 0.1], start=4):
+        checkpoints.save({'episode': episode}, episode, score)
+    checkpoints.close()
+    kept = sorted(entry['episode'] for entry in CheckpointManager(str(tmp_path)).index)
+    assert kept == [2, 3, 4, 5]  # the last three and the best (episode 2)
+    assert CheckpointManager(str(tmp_path)).load()['episode'] == 5
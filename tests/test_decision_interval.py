@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from src.core.aimsun_api import INTERPHASE, AimsunAPI
+from src.core.aimsun_env import AimsunEnv
+
+
+class RecordingAPI(AimsunAPI):
+    """Mock that remembers the control calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def set_traffic_light_phases(self, junction_ids, phases):
+        self.calls.append(('phases', list(np.asarray(phases).tolist())))
+
+    def advance(self, steps=1):
+        self.calls.append(('advance', steps))
+
+
+@pytest.fixture
+def env(sim_config):
+    sim_config['simulation']['stochastic_events']['accident_probability'] = 0.0
+    sim_config['env']['control'] = {'decision_interval': 10, 'min_green': 10.0, 'yellow': 3.0}
+    env = AimsunEnv(sim_config, aimsun_api_instance=RecordingAPI())
+    yield env
+    env.close()
+
+
+def test_a_change_starts_with_the_interphase(env):
+    env.reset()
+    env.aimsun_api.calls.clear()
+    env.green_time[:] = env.min_green  # allowed to change
+    env.step(2)
+    yellow = env.yellow_steps
+    assert env.aimsun_api.calls == [('phases', [INTERPHASE, 0, 0, 0]), ('advance', yellow),
+                                    ('phases', [2, 0, 0, 0]), ('advance', env.decision_interval - yellow)]
+    # The new phase has been green for the rest of the interval only
+    assert env.green_time[0] == (env.decision_interval - yellow) * env.step_size
+
+
+def test_min_green_holds_the_phase_in_the_mask(env):
+    _, info = env.reset()
+    # At the start the junction is within min_green of phase 0: only phase 0 is allowed
+    assert info['action_mask'].tolist() == [True, False, False, False]
+    env.aimsun_api.calls.clear()
+    _, _, _, _, info = env.step(0)  # keeping the phase needs no interphase
+    assert env.aimsun_api.calls == [('phases', [0, 0, 0, 0]), ('advance', env.decision_interval)]
+    assert env.green_time[0] == env.decision_interval * env.step_size
+    # 5 s per decision, min_green 10 s: free after two decisions
+    _, _, _, _, info = env.step(0)
+    assert info['action_mask'].all()
+
+
+def test_a_held_junction_ignores_a_requested_change(env):
+    env.reset()
+    env.step(3)  # phase 3 is requested while phase 0 is held: nothing changes
+    assert env.phases[0] == 0
+
+
+def test_episode_length_is_counted_in_decisions(env):
+    env.reset()
+    decisions = int(env.duration / (env.decision_interval * env.step_size))
+    for k in range(decisions):
+        _, _, _, truncated, _ = env.step(0)
+        assert truncated == (k == decisions - 1)
+    assert env.sim_time == env.duration
+
+
+def test_yellow_must_fit_in_the_interval(sim_config):
+    sim_config['env']['control'] = {'decision_interval': 4, 'yellow': 3.0}  # 6 steps at 0.5 s
+    with pytest.raises(ValueError):
+        AimsunEnv(sim_config, aimsun_api_instance=RecordingAPI())
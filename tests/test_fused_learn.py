@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import torch
+from src.agents.dqn_agent import DQNAgent
+
+STATE_SIZE, ACTIONS = 6, 4
+
+
+def _agent(base_agent_config, fused, n_step=1):
+    config = dict(base_agent_config['agent'], fused_learn=fused, compile_learn=False, n_step=n_step,
+                  prefetch_batches=0, batch_size=16, memory_size=256)
+    torch.manual_seed(0)
+    agent = DQNAgent(STATE_SIZE, ACTIONS, 0, config)
+    rng = np.random.default_rng(0)
+    n = 100
+    masks = rng.random((n, ACTIONS)) < 0.7
+    masks[:, 0] = True
+    transitions = (rng.random((n, STATE_SIZE), dtype=np.float32), rng.integers(ACTIONS, size=n),
+                   rng.random(n, dtype=np.float32), rng.random((n, STATE_SIZE), dtype=np.float32),
+                   (rng.random(n) < 0.1).astype(np.float32), masks)
+    if n_step > 1:
+        transitions += (agent.gamma ** rng.integers(1, n_step + 1, size=n).astype(np.float32),)
+    agent.memory.add_batch(*transitions)
+    return agent
+
+
+@pytest.mark.parametrize("n_step", [1, 3])
+def test_fused_learn_matches_the_reference(base_agent_config, n_step):
+    reference, fused = _agent(base_agent_config, False, n_step), _agent(base_agent_config, True, n_step)
+    for step in range(5):
+        for agent in (reference, fused):
+            np.random.seed(step)
+            agent.learn(agent.memory.sample(), agent.gamma)
+    for network in ('qnetwork_local', 'qnetwork_target'):
+        for p_ref, p_fused in zip(getattr(reference, network).parameters(), getattr(fused, network).parameters()):
+            torch.testing.assert_close(p_fused, p_ref, rtol=1e-5, atol=1e-6)
+    # Same TD errors, so the same priorities
+    np.testing.assert_allclose(fused.memory.sum_tree.tree, reference.memory.sum_tree.tree, rtol=1e-5, atol=1e-4)
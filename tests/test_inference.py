@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import torch
+from src.agents.inference import export_policy, fold_weights, load_policy
+from src.agents.models import QNetwork
+
+STATE_SIZE, ACTIONS = 20, 4
+
+
+@pytest.fixture
+def network():
+    network = QNetwork(STATE_SIZE, ACTIONS, 0, [32, 16])
+    # Non-zero biases everywhere, so folding them is actually exercised
+    with torch.no_grad():
+        for parameter in network.parameters():
+            parameter.add_(torch.randn_like(parameter) * 0.1)
+    return network.eval()
+
+
+def _states(n=64):
+    return np.random.default_rng(0).standard_normal((n, STATE_SIZE)).astype(np.float32)
+
+
+def test_folded_weights_give_the_dueling_q_values(network):
+    weights = fold_weights(network)
+    states = _states()
+    hidden = np.maximum(np.maximum(states @ weights['w1'] + weights['b1'], 0) @ weights['w2'] + weights['b2'], 0)
+    with torch.no_grad():
+        expected = network(torch.from_numpy(states)).numpy()
+    np.testing.assert_allclose(hidden @ weights['wq'] + weights['bq'], expected, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("filename", ["policy.npz", "policy.pt"])
+def test_exported_policy_acts_like_the_network(network, tmp_path, filename):
+    export_policy(network, str(tmp_path / filename))
+    policy = load_policy(str(tmp_path / filename), **({'max_batch': 64} if filename.endswith('.npz') else {}))
+    states = _states()
+    with torch.no_grad():
+        q = network(torch.from_numpy(states)).numpy()
+    np.testing.assert_array_equal(policy.act_batch(states), q.argmax(axis=1))
+    mask = np.array([False, True, True, False])
+    assert policy.act(states[0], mask) == int(np.where(mask, q[0], -np.inf).argmax())
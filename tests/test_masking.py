@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import torch
+from src.agents.dqn_agent import DQNAgent
+from src.utils.memory import Batch
+
+STATE_SIZE, ACTIONS, BATCH = 4, 5, 16
+
+
+def _agent(base_agent_config, **overrides):
+    config = dict(base_agent_config['agent'], n_step=1, prefetch_batches=0, **overrides)
+    return DQNAgent(STATE_SIZE, ACTIONS, 0, config)
+
+
+def _batch(mask_greedy, agent):
+    """Random transitions whose next-state masks forbid the local network's greedy action, if asked."""
+    rng = np.random.default_rng(0)
+    next_states = torch.as_tensor(rng.random((BATCH, STATE_SIZE), dtype=np.float32))
+    next_masks = torch.ones((BATCH, ACTIONS), dtype=torch.bool)
+    if mask_greedy:
+        with torch.no_grad():
+            greedy = agent.qnetwork_local(next_states).argmax(1)
+        next_masks[torch.arange(BATCH), greedy] = False
+    return Batch(states=torch.as_tensor(rng.random((BATCH, STATE_SIZE), dtype=np.float32)),
+                 actions=torch.as_tensor(rng.integers(ACTIONS, size=(BATCH, 1))),
+                 rewards=torch.as_tensor(rng.random((BATCH, 1), dtype=np.float32)),
+                 next_states=next_states, dones=torch.zeros((BATCH, 1)),
+                 indices=np.arange(BATCH), weights=torch.ones((BATCH, 1)), next_masks=next_masks)
+
+
+def test_act_never_picks_a_masked_action(base_agent_config):
+    agent = _agent(base_agent_config)
+    state = np.ones(STATE_SIZE, dtype=np.float32)
+    greedy = agent.act(state, eps=0.0)
+    mask = np.ones(ACTIONS, dtype=bool)
+    mask[greedy] = False
+    assert agent.act(state, eps=0.0, mask=mask) != greedy
+    mask = np.zeros(ACTIONS, dtype=bool)
+    mask[[0, 2]] = True
+    assert {agent.act(state, eps=1.0, mask=mask) for _ in range(200)} == {0, 2}
+
+
+@pytest.mark.parametrize("fused", [False, True])
+def test_bootstrap_only_over_valid_next_actions(base_agent_config, fused):
+    agent = _agent(base_agent_config, fused_learn=fused)
+    batch = _batch(True, agent)
+    with torch.no_grad():
+        if fused:
+            loss, td_errors, Q_expected = agent._fused_loss(batch.states, batch.actions, batch.rewards, batch.next_states,
+                                                            batch.dones, batch.weights, batch.next_masks,
+                                                            agent.gamma)
+        else:
+            loss, td_errors, Q_expected = agent._reference_loss(batch, agent.gamma)
+        # Double DQN target by hand: best valid local action, evaluated by the target network
+        local = agent.qnetwork_local(batch.next_states).masked_fill(~batch.next_masks, float('-inf'))
+        best = local.argmax(1, keepdim=True)
+        targets = batch.rewards + agent.gamma * agent.qnetwork_target(batch.next_states).gather(1, best)
+    torch.testing.assert_close(td_errors, (targets - Q_expected).reshape(-1))
+    # Without the masks the targets differ, so the masks really are applied
+    unmasked = batch._replace(next_masks=torch.ones_like(batch.next_masks))
+    with torch.no_grad():
+        _, td_unmasked, _ = agent._reference_loss(unmasked, agent.gamma)
+    assert not torch.allclose(td_errors, td_unmasked)
+
+
+def test_learn_stores_masked_transitions(base_agent_config):
+    agent = _agent(base_agent_config, batch_size=8, update_every=1)
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        mask = np.zeros(ACTIONS, dtype=bool)
+        mask[:2] = True
+        agent.step(rng.random(STATE_SIZE, dtype=np.float32), 0, 1.0, rng.random(STATE_SIZE, dtype=np.float32),
+                   False, mask)
+    batch = agent.memory.sample()
+    assert batch.next_masks.dtype == torch.bool
+    assert batch.next_masks[:, :2].all() and not batch.next_masks[:, 2:].any()
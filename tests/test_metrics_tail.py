@@ -0,0 +1,24 @@
+import numpy as np
+from src.analysis.metrics_tail import MetricsTail
+
+
+def test_rows_with_the_wrong_field_count_are_dropped(tmp_path):
+    path = tmp_path / "metrics.csv"
+    # A short row and a long one add up to two full rows, they must not shift into each other
+    path.write_text("Episode,Score,Epsilon\n1,-10.0,1.0\n2,-9.0\n3,-8.0,0.9,7\n4,-7.0,0.8\n")
+    tail = MetricsTail(str(path))
+    assert tail.poll() == 2
+    np.testing.assert_array_equal(tail.column("Episode"), [1, 4])
+    np.testing.assert_array_equal(tail.column("Score"), [-10.0, -7.0])
+
+
+def test_incremental_reads_and_empty_fields(tmp_path):
+    path = tmp_path / "metrics.csv"
+    path.write_text("Episode,Score\n1,-10.0\n2,")
+    tail = MetricsTail(str(path))
+    assert tail.poll() == 1  # the half-written last line waits
+    with open(path, 'a') as f:
+        f.write("\n3,-8.0\n")
+    assert tail.poll() == 2
+    np.testing.assert_array_equal(tail.column("Episode"), [1, 2, 3])
+    assert np.isnan(tail.column("Score")[1])
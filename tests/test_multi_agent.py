@@ -0,0 +1,66 @@
+import copy
+import random
+import numpy as np
+from src.agents.dqn_agent import DQNAgent
+from src.core.aimsun_env import AimsunEnv
+from src.training.episode import run_episode
+
+
+def _env(sim_config, multi_agent):
+    config = copy.deepcopy(sim_config)
+    config['api']['backend'] = 'queue'
+    config['env']['multi_agent'] = multi_agent
+    config['simulation']['stochastic_events']['accident_probability'] = 0.0
+    random.seed(0)
+    np.random.seed(0)
+    return AimsunEnv(config)
+
+
+def test_states_and_rewards_are_stacked_per_junction(sim_config):
+    env = _env(sim_config, True)
+    try:
+        state, info = env.reset()
+        junctions = env.num_agents
+        assert state.shape == env.observation_space.shape == (junctions, env.observation_space.shape[-1])
+        assert info['action_mask'].shape == (junctions, env.action_dim)
+        state, reward, done, truncated, info = env.step(np.zeros(junctions, dtype=np.int64))
+        assert state.shape == (junctions, env.observation_space.shape[-1])
+        assert reward.shape == (junctions,)
+        assert info['reward_components'].shape == (junctions, len(env.REWARD_COMPONENTS))
+        np.testing.assert_allclose(info['reward_components'].sum(1), reward, rtol=1e-5)
+    finally:
+        env.close()
+
+
+def test_junction_zero_matches_single_agent_mode(sim_config):
+    # Single-agent mode controls junction 0 and leaves the others on phase 0
+    traces = []
+    for multi_agent in (False, True):
+        env = _env(sim_config, multi_agent)
+        try:
+            state, info = env.reset()
+            trace = [state if not multi_agent else state[0]]
+            for t in range(10):
+                phase = t // 3 % env.action_dim
+                action = phase if not multi_agent else [phase] + [0] * (env.num_agents - 1)
+                state, reward, done, truncated, info = env.step(action)
+                if multi_agent:
+                    state, reward = state[0], reward[0]
+                trace += [state, reward]
+        finally:
+            env.close()
+        traces.append(trace)
+    for single, multi in zip(*traces):
+        np.testing.assert_allclose(single, multi, rtol=1e-6)
+
+
+def test_episode_stores_one_transition_per_junction(sim_config, base_agent_config):
+    env = _env(sim_config, True)
+    config = dict(base_agent_config['agent'], n_step=1, prefetch_batches=0, memory_size=10000)
+    agent = DQNAgent(env.observation_space.shape[-1], env.action_dim, 0, config)
+    try:
+        score = run_episode(env, agent, 1.0, 5)
+    finally:
+        env.close()
+    assert len(agent.memory) == 5 * env.num_agents
+    assert np.isfinite(score)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from src.utils.nstep import NStepAccumulator
+
+GAMMA = 0.9
+
+
+def _push(acc, t, done=False, truncated=False):
+    # Stream of one scalar state per step: state t, reward t + 1
+    return acc.push([[t]], [t % 2], [t + 1.0], [[t + 1]], [done], None, [truncated])
+
+
+def test_full_n_step_return():
+    acc = NStepAccumulator(3, GAMMA)
+    assert len(_push(acc, 0)[0]) == 0
+    assert len(_push(acc, 1)[0]) == 0
+    states, actions, returns, next_states, dones, masks, discounts = _push(acc, 2)
+    assert states.tolist() == [[0]] and actions.tolist() == [0]
+    assert returns[0] == pytest.approx(1 + GAMMA * 2 + GAMMA ** 2 * 3)
+    assert next_states.tolist() == [[3]]  # bootstraps from the state n steps later
+    assert discounts[0] == pytest.approx(GAMMA ** 3)
+
+
+def test_episode_end_flushes_every_pending_transition():
+    acc = NStepAccumulator(3, GAMMA)
+    _push(acc, 0)
+    states, _, returns, _, dones, _, discounts = _push(acc, 1, done=True)
+    assert states.tolist() == [[0], [1]]  # oldest first
+    np.testing.assert_allclose(returns, [1 + GAMMA * 2, 2])
+    np.testing.assert_allclose(discounts, [GAMMA ** 2, GAMMA])
+    assert dones.tolist() == [1.0, 1.0]
+    # Nothing leaks into the next episode
+    assert len(_push(acc, 10)[0]) == 0
+
+
+def test_truncation_bootstraps_from_the_last_state():
+    acc = NStepAccumulator(3, GAMMA)
+    _push(acc, 0)
+    states, _, _, next_states, dones, _, _ = _push(acc, 1, truncated=True)
+    assert len(states) == 2
+    assert dones.tolist() == [0.0, 0.0]
+    assert next_states.tolist() == [[2], [2]]
+
+
+def test_one_step_is_the_plain_transition():
+    acc = NStepAccumulator(1, GAMMA)
+    states, _, returns, next_states, _, _, discounts = _push(acc, 4)
+    assert states.tolist() == [[4]] and next_states.tolist() == [[5]]
+    assert returns[0] == 5.0 and discounts[0] == pytest.approx(GAMMA)
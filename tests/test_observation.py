@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from src.core.observation import ObservationBuilder
+
+# Junction 135 has a single-detector arm and a two-detector arm, junction 136 one arm
+ENV_CONFIG = {'action_dim': 2, 'state_dim': 12,
+              'intersections': [{'id': 135, 'detectors': [10, [11, 12]]}, {'id': 136, 'detectors': [13]}]}
+READINGS = {10: [4.0, 50.0, 25.0], 11: [2.0, 20.0, 40.0], 12: [6.0, 60.0, 20.0], 13: [10.0, 100.0, 0.0]}
+
+
+class FakeAPI:
+    def __init__(self, readings=READINGS, departures=None):
+        self.readings = readings
+        self.departures = departures or {}
+
+    def get_detectors_data(self, ids, out):
+        out[:] = [self.readings[i] for i in ids]
+
+    def get_detectors_history(self, ids, out, departures=None):
+        for step in range(len(out)):
+            out[step] = [np.array(self.readings[i]) * (step + 1) for i in ids]
+            departures[step] = [self.departures.get(i, 0.0) for i in ids]
+
+
+def _builder(**kwargs):
+    return ObservationBuilder(ENV_CONFIG, duration=100.0, max_arms=2, queue_scale=10.0, speed_scale=50.0, **kwargs)
+
+
+def test_arms_are_aggregated_and_scaled():
+    state = _builder().build(FakeAPI(), np.array([1, 0]), 25.0)
+    assert state.shape == (2, 12)
+    # Junction 135: arm 0 as read, arm 1 queues summed and occupancy/speed averaged
+    np.testing.assert_allclose(state[0, :6], [0.4, 0.5, 0.5, 0.8, 0.4, 0.6])
+    # Junction 136 has no second arm, its slot stays 0
+    np.testing.assert_allclose(state[1, :6], [1.0, 1.0, 0.0, 0.0, 0.0, 0.0])
+    np.testing.assert_array_equal(state[:, 6:8], [[0, 1], [1, 0]])
+    # Network means over the three arms with detectors, then the elapsed fraction
+    np.testing.assert_allclose(state[0, 8:], [(0.4 + 0.8 + 1.0) / 3, (0.5 + 0.4 + 1.0) / 3, (0.5 + 0.6) / 3, 0.25])
+    np.testing.assert_array_equal(state[0, 8:], state[1, 8:])
+
+
+def test_failed_detectors_read_as_empty():
+    readings = {**READINGS, 10: [np.nan, -1.0, np.nan]}
+    state = _builder().build(FakeAPI(readings), np.array([0, 0]), 0.0)
+    np.testing.assert_array_equal(state[0, :3], 0.0)
+    assert np.isfinite(state).all()
+
+
+def test_history_keeps_every_step_and_the_departures():
+    builder = _builder(max_steps=3)
+    api = FakeAPI(departures={11: 1.0, 12: 2.0, 13: 5.0})
+    state = builder.build_history(api, 3, np.array([0, 1]), 50.0)
+    # The state comes from the last step, which reads 3x the base values
+    expected = _builder().build(FakeAPI({i: np.array(v) * 3 for i, v in READINGS.items()}), np.array([0, 1]), 50.0)
+    np.testing.assert_allclose(state, expected)
+    np.testing.assert_allclose(builder.arm_history[0, :, 0], [0.4, 0.8, 1.0, 0.0])
+    # Departures are summed per arm and counted in queue_scale vehicles
+    np.testing.assert_allclose(builder.departure_history[:3], [[0.0, 0.3, 0.5, 0.0]] * 3)
+
+
+def test_state_dim_and_arm_count_are_validated():
+    with pytest.raises(ValueError, match="state_dim"):
+        ObservationBuilder(dict(ENV_CONFIG, state_dim=13), duration=100.0, max_arms=2)
+    with pytest.raises(ValueError, match="max_arms"):
+        ObservationBuilder(dict(ENV_CONFIG, state_dim=9), duration=100.0, max_arms=1)
@@ -0,0 +1,69 @@
+import numpy as np
+import time
+import torch
+from src.agents.dqn_agent import DQNAgent
+from src.utils.memory import ReplayBuffer
+from src.utils.prefetch import PrefetchSampler
+
+STATE_SIZE, ACTIONS, CAPACITY, BATCH = 5, 3, 64, 8
+
+
+def _sampler(**kwargs):
+    buffer = ReplayBuffer(ACTIONS, CAPACITY, BATCH, torch.device("cpu"), state_size=STATE_SIZE)
+    sampler = PrefetchSampler(buffer, **kwargs)
+    for t in range(40):
+        state = np.full(STATE_SIZE, t, dtype=np.float32)
+        sampler.add(state, t % ACTIONS, float(t), state + 1, False)
+    return sampler
+
+
+def test_prefetched_batches_match_the_buffer():
+    sampler = _sampler()
+    try:
+        for _ in range(5):
+            batch = sampler.sample()
+            np.testing.assert_array_equal(batch.rewards[:, 0].numpy(), batch.indices.astype(np.float32))
+    finally:
+        sampler.close()
+
+
+def test_stale_batches_are_resampled():
+    sampler = _sampler(num_batches=2, max_staleness=1)
+    try:
+        batch = sampler.sample()
+        # Wait until the worker has queued a batch drawn before the updates below
+        deadline = time.time() + 5.0
+        while sampler._ready.qsize() < sampler.num_batches and time.time() < deadline:
+            time.sleep(0.01)
+        for _ in range(3):
+            sampler.update_priorities(batch.indices, np.ones(BATCH))
+        sampler.sample()
+        assert sampler.stale_batches == 1
+    finally:
+        sampler.close()
+
+
+def test_updates_for_overwritten_slots_are_dropped():
+    sampler = _sampler()
+    try:
+        batch = sampler.sample()
+        # Wrap around the whole buffer, every sampled slot now holds a newer transition
+        for _ in range(CAPACITY):
+            sampler.add(np.zeros(STATE_SIZE, dtype=np.float32), 0, 0.0, np.zeros(STATE_SIZE, dtype=np.float32), False)
+        after_adds = sampler.buffer.sum_tree.sum()
+        sampler.update_priorities(batch.indices, np.full(BATCH, 100.0))
+        assert sampler.buffer.sum_tree.sum() == after_adds
+    finally:
+        sampler.close()
+
+
+def test_agent_close_stops_the_worker(base_agent_config):
+    config = dict(base_agent_config['agent'], prefetch_batches=2, batch_size=BATCH, memory_size=CAPACITY,
+                  n_step=1)
+    agent = DQNAgent(STATE_SIZE, ACTIONS, 0, config)
+    for _ in range(20):
+        agent.memory.add(np.zeros(STATE_SIZE, dtype=np.float32), 0, 0.0, np.zeros(STATE_SIZE, dtype=np.float32), False)
+    agent.memory.sample()
+    worker = agent.memory._worker
+    agent.close()
+    assert not worker.is_alive()
@@ -0,0 +1,70 @@
+import csv
+import pstats
+import time
+import pytest
+from src.analysis.profiler import Profiler
+
+
+def _rows(log_dir):
+    with open(log_dir / "profile.csv") as f:
+        return list(csv.DictReader(f))
+
+
+def test_disabled_profiler_does_nothing(tmp_path):
+    profiler = Profiler()
+    profiler.configure(enabled=False, log_dir=str(tmp_path))
+    first, second = profiler.section("a"), profiler.section("b")
+    assert first is second  # one shared no-op section
+    with first:
+        pass
+    profiler.count("calls")
+    profiler.start()
+    profiler.end_episode(1)
+    profiler.close()
+    assert profiler.sections == {} and profiler.counters == {}
+    assert not (tmp_path / "profile.csv").exists()
+
+
+def test_sections_and_counters_per_episode(tmp_path):
+    profiler = Profiler()
+    profiler.configure(enabled=True, report_every=0, log_dir=str(tmp_path))
+    profiler.start()
+    for episode in (1, 2):
+        for _ in range(3):
+            with profiler.section("outer"):
+                with profiler.section("inner"):
+                    time.sleep(0.001)
+        profiler.count("events", 2)
+        if episode == 1:
+            profiler.count("events")
+        profiler.end_episode(episode)
+    profiler.close()
+
+    rows = _rows(tmp_path)
+    by_episode = {(row['Episode'], row['Name']): row for row in rows}
+    for episode in ('1', '2'):
+        assert by_episode[(episode, 'outer')]['Calls'] == '3'  # counts restart every episode
+        outer = float(by_episode[(episode, 'outer')]['Total_ms'])
+        inner = float(by_episode[(episode, 'inner')]['Total_ms'])
+        assert outer >= inner >= 3.0  # inclusive times
+        assert float(by_episode[(episode, 'outer')]['Share']) <= 1.0
+    assert by_episode[('1', 'events')]['Calls'] == '3' and by_episode[('1', 'events')]['Total_ms'] == ''
+    assert by_episode[('2', 'events')]['Calls'] == '2'
+
+
+def test_cprofile_covers_the_episode_range(tmp_path):
+    profiler = Profiler()
+    path = tmp_path / "run.prof"
+    profiler.configure(enabled=True, report_every=1, log_dir=str(tmp_path),
+                       cprofile={'episodes': [2, 3], 'path': str(path)})
+    profiler.start()
+    for episode in range(1, 5):
+        assert (profiler._cprofile is not None) == (episode in (2, 3))
+        profiler.end_episode(episode)
+        assert path.exists() == (episode >= 3)
+    profiler.close()
+    assert pstats.Stats(str(path)).total_calls > 0
+
+    with pytest.raises(ValueError):
+        profiler.configure(enabled=True, log_dir=str(tmp_path), cprofile={'episodes': [3, 2]})
+    profiler.close()
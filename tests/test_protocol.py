@@ -0,0 +1,73 @@
+import threading
+import numpy as np
+import pytest
+from src.core import protocol
+from src.core.aimsun_client import AimsunClient
+from src.core.aimsun_server import make_server
+from src.core.queue_sim import QueueSimulator
+
+
+def test_frame_layout():
+    data = protocol.frame(protocol.OP_ADVANCE, protocol.UINT32.pack(7))
+    length, opcode = protocol.HEADER.unpack_from(data)
+    assert (length, opcode) == (4, protocol.OP_ADVANCE)
+    assert len(data) == protocol.HEADER.size + 4
+    assert protocol.UINT32.unpack_from(data, protocol.HEADER.size) == (7,)
+
+
+def test_phases_round_trip():
+    junctions, phases = protocol.decode_phases(protocol.encode_phases([135, 136, 137], [2, -1, 0]))
+    assert junctions.tolist() == [135, 136, 137]
+    assert phases.tolist() == [2, -1, 0]
+
+
+@pytest.fixture
+def client(sim_config):
+    server, address = make_server('tcp', None, 'queue', sim_config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = AimsunClient('tcp', address)
+    client.connect()
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_matches_the_simulator_with_one_round_trip_per_interval(client, sim_config):
+    local = QueueSimulator(sim_config)
+    ids = local.detector_ids
+    remote_out, local_out = np.zeros((10, len(ids), 3), np.float32), np.zeros((10, len(ids), 3), np.float32)
+    remote_dep, local_dep = np.zeros((10, len(ids)), np.float32), np.zeros((10, len(ids)), np.float32)
+    for sim in (client, local):
+        sim.reset_simulation()
+        sim.set_traffic_light_phases([135, 136, 137, 138], [0, 1, 1, 0])
+        sim.advance(10)
+    trips = client.round_trips
+    client.get_detectors_history(ids, remote_out, departures=remote_dep)
+    assert client.round_trips == trips + 1  # the commands went out with the request
+    local.get_detectors_history(ids, local_out, departures=local_dep)
+    np.testing.assert_array_equal(remote_out, local_out)
+    np.testing.assert_array_equal(remote_dep, local_dep)
+
+
+def test_pipelined_command_error_is_raised_by_the_next_request(client):
+    client.close_lane(123, 60)  # not a detector link
+    with pytest.raises(RuntimeError, match="Unknown link"):
+        client.sync()
+    client.sync()  # reported once, the session goes on
+
+
+def test_rng_state_travels_as_json(client):
+    state = client.get_rng_state()
+    out = np.zeros((5, 14, 3), np.float32)
+    ids = [101, 102, 103, 104, 201, 202, 203, 204, 301, 302, 401, 402, 403, 404]
+    client.reset_simulation()
+    client.advance(5)
+    client.get_detectors_history(ids, out)
+    first = out.copy()
+    client.set_rng_state(state)
+    client.reset_simulation()
+    client.advance(5)
+    client.get_detectors_history(ids, out)
+    np.testing.assert_array_equal(out, first)
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+import torch
+from src.utils.memory import ReplayBuffer
+
+STATE_SIZE, ACTIONS, CAPACITY, BATCH = 5, 3, 64, 8
+
+
+def _buffer(storage='array', **kwargs):
+    return ReplayBuffer(ACTIONS, CAPACITY, BATCH, torch.device("cpu"), state_size=STATE_SIZE, storage=storage,
+                        **kwargs)
+
+
+def _fill(buffer, n=40):
+    for t in range(n):
+        state = np.full(STATE_SIZE, t, dtype=np.float32)
+        buffer.add(state, t % ACTIONS, float(t), state + 1, float(t % 10 == 9))
+
+
+def test_batches_are_written_into_the_slot():
+    buffer = _buffer()
+    _fill(buffer)
+    slot = buffer.allocate_batch()
+    batch = buffer.sample(out=slot)
+    assert batch.states.data_ptr() == slot.tensors[0].data_ptr()
+    assert batch.weights is slot.weights
+    # Every field agrees with the transitions at the sampled slots
+    rewards = batch.rewards[:, 0].numpy()
+    np.testing.assert_array_equal(rewards, batch.indices.astype(np.float32))
+    np.testing.assert_array_equal(batch.states[:, 0].numpy(), rewards)
+    np.testing.assert_array_equal(batch.next_states[:, 0].numpy(), rewards + 1)
+    np.testing.assert_array_equal(batch.actions[:, 0].numpy(), batch.indices % ACTIONS)
+
+
+def test_internal_slot_is_reused():
+    buffer = _buffer()
+    _fill(buffer)
+    first = buffer.sample()
+    second = buffer.sample()
+    assert first.states.data_ptr() == second.states.data_ptr()
+
+
+def test_device_storage_samples_like_host_storage():
+    host, device = _buffer('array'), _buffer('device')
+    _fill(host)
+    _fill(device)
+    assert device.storage_mode == 'device'
+    np.random.seed(0)
+    expected = host.sample()
+    np.random.seed(0)
+    batch = device.sample()
+    np.testing.assert_array_equal(batch.indices, expected.indices)
+    for name in ('states', 'actions', 'rewards', 'next_states', 'dones', 'weights'):
+        assert torch.equal(getattr(batch, name), getattr(expected, name)), name
+
+
+def test_update_priorities_matches_per_slot_updates():
+    vectorized, looped = _buffer(), _buffer()
+    _fill(vectorized)
+    _fill(looped)
+    indices = np.array([3, 7, 7, 12, 30])
+    errors = np.array([0.5, -2.0, 1.5, 0.0, 4.0])
+    vectorized.update_priorities(indices, torch.as_tensor(errors))
+    for i, e in zip(indices, errors):
+        looped.update_priorities([i], [e])
+    # Repeated slots keep the last error, as a loop would
+    np.testing.assert_allclose(vectorized.sum_tree.tree, looped.sum_tree.tree)
+    np.testing.assert_allclose(vectorized.min_tree.tree, looped.min_tree.tree)
+    assert vectorized.max_priority == looped.max_priority
+
+
+def test_update_priorities_drops_overwritten_slots():
+    buffer = _buffer()
+    _fill(buffer)
+    written_before = buffer.write_count
+    state = np.zeros(STATE_SIZE, dtype=np.float32)
+    buffer.add(state, 0, 0.0, state, 0.0)  # lands in slot 40
+    before = buffer.sum_tree[np.array([5, 40])]
+    buffer.update_priorities(np.array([5, 40]), np.array([9.0, 9.0]), written_before=written_before)
+    after = buffer.sum_tree[np.array([5, 40])]
+    assert after[0] != before[0]
+    assert after[1] == before[1]
+
+
+def test_priority_stats():
+    buffer = _buffer()
+    _fill(buffer)
+    buffer.update_priorities(np.arange(10), np.linspace(0.0, 3.0, 10))
+    stats = buffer.priority_stats(bins=4)
+    leaves = buffer.sum_tree[np.arange(len(buffer))]
+    assert stats['sum'] == pytest.approx(leaves.sum())
+    assert stats['min'] == pytest.approx(leaves.min())
+    assert stats['mean'] == pytest.approx(leaves.mean())
+    assert stats['max'] >= leaves.max()
+    counts, edges = stats['histogram']
+    assert counts.sum() == len(buffer) and len(edges) == 5
+    assert _buffer(prioritized=False).priority_stats() is None
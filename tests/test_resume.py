@@ -0,0 +1,105 @@
+import copy
+import random
+import numpy as np
+import pytest
+import torch
+from src.agents.dqn_agent import DQNAgent
+from src.core.aimsun_env import AimsunEnv
+from src.training.checkpoint import CheckpointManager, rng_state, set_rng_state
+from src.training.episode import run_episode
+
+
+
+def _rollout(env, episodes):
+    """Random valid actions until the simulated period is over, every reward of every episode."""
+    rewards = []
+    for _ in range(episodes):
+        state, info = env.reset()
+        truncated = False
+        while not truncated:
+            action = random.choice(np.flatnonzero(info['action_mask']))
+            state, reward, done, truncated, info = env.step(action)
+            rewards.append(reward)
+    return rewards
+
+
+@pytest.mark.parametrize("backend, server_backend", [("mock", None), ("queue", None), ("client", "queue")])
+def test_env_resume_reproduces_the_run(sim_config, backend, server_backend):
+    sim_config['api'].update(backend=backend, server_backend=server_backend)
+    sim_config['env']['reward']['normalization'] = 'running'
+    sim_config['simulation']['duration'] = 300  # long enough for the running std to refresh
+    sim_config['simulation']['stochastic_events']['accident_probability'] = 1.0
+    random.seed(0)
+    np.random.seed(0)
+    env = AimsunEnv(sim_config)
+    try:
+        _rollout(env, 1)
+        snapshot = rng_state(), env.state_dict()
+        expected = _rollout(env, 2)
+    finally:
+        env.close()
+
+    # A fresh process would build a fresh simulator from the same config
+    env = AimsunEnv(sim_config)
+    try:
+        env.load_state_dict(snapshot[1])
+        set_rng_state(snapshot[0])
+        assert _rollout(env, 2) == expected
+    finally:
+        env.close()
+
+
+def _seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def _agent_config(base_agent_config):
+    config = copy.deepcopy(base_agent_config['agent'])
+    config.update(batch_size=8, memory_size=1000, target_update_input=20)
+    return config
+
+
+def _train(env, agent, episodes, eps, scores, checkpoints=None):
+    """main.py's sync loop: an episode, epsilon decay, a checkpoint after every episode."""
+    for i_episode in episodes:
+        scores.append(run_episode(env, agent, eps, 1000))
+        eps = max(0.01, 0.9 * eps)
+        if checkpoints is not None:
+            checkpoints.save({'agent': agent.state_dict(), 'episode': i_episode, 'eps': eps,
+                              'scores': list(scores), 'rng': rng_state(), 'env': env.state_dict()},
+                             i_episode, scores[-1])
+    return scores
+
+
+@pytest.mark.parametrize("backend, server_backend", [("mock", None), ("queue", None), ("client", "queue")])
+def test_training_resumes_from_a_checkpoint(sim_config, base_agent_config, tmp_path, backend, server_backend):
+    sim_config['api'].update(backend=backend, server_backend=server_backend)
+    sim_config['simulation']['stochastic_events']['accident_probability'] = 0.5
+    agent_config = _agent_config(base_agent_config)
+
+    def build():
+        _seed(7)
+        env = AimsunEnv(sim_config)
+        return env, DQNAgent(env.observation_space.shape[-1], env.action_dim, 7, agent_config)
+
+    env, agent = build()
+    checkpoints = CheckpointManager(str(tmp_path), keep_last=5)
+    try:
+        expected = _train(env, agent, range(1, 5), 1.0, [], checkpoints)
+    finally:
+        checkpoints.close()
+        env.close()
+
+    # A new process: built and seeded from the configs like main.py does, then --resume
+    env, agent = build()
+    try:
+        checkpoint = CheckpointManager(str(tmp_path)).load(str(tmp_path / "checkpoint_000002.pt"))
+        agent.load_state_dict(checkpoint['agent'])
+        env.load_state_dict(checkpoint['env'])
+        set_rng_state(checkpoint['rng'])
+        resumed = _train(env, agent, range(3, 5), checkpoint['eps'], list(checkpoint['scores']))
+    finally:
+        env.close()
+    np.testing.assert_allclose(resumed, expected, rtol=1e-6)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from src.core.reward import RewardEngine
+
+JUNCTIONS, ARMS, STEPS = 3, 4, 5
+
+
+def _engine(normalization='none', weights=None):
+    env_config = {'reward_weights': weights or {'throughput': 2.0, 'wait_time': -1.0, 'queue_length': -0.8, 'stops': -0.5},
+                  'reward': {'normalization': normalization}}
+    return RewardEngine(env_config, JUNCTIONS, ARMS, max_steps=STEPS)
+
+
+def _interval(rng):
+    arms = rng.random((STEPS, JUNCTIONS * ARMS, 3)).astype(np.float32)
+    departures = rng.random((STEPS, JUNCTIONS * ARMS)).astype(np.float32)
+    return arms, departures
+
+
+def test_breakdown_sums_to_the_reward():
+    engine = _engine()
+    arms, departures = _interval(np.random.default_rng(0))
+    engine.reset(np.zeros((JUNCTIONS * ARMS, 3), dtype=np.float32))
+    reward, breakdown = engine.compute(arms, departures)
+    np.testing.assert_allclose(breakdown.sum(axis=1), reward, rtol=1e-5)
+
+
+def test_components_of_an_interval():
+    engine = _engine()
+    arms, departures = _interval(np.random.default_rng(1))
+    engine.reset(np.zeros((JUNCTIONS * ARMS, 3), dtype=np.float32))
+    engine.compute(arms, departures)
+    queue = arms[..., 0].reshape(STEPS, JUNCTIONS, ARMS)
+    previous = np.concatenate((np.zeros((1, JUNCTIONS, ARMS)), queue[:-1]))
+    expected = np.stack((
+        departures.reshape(STEPS, JUNCTIONS, ARMS).sum(axis=(0, 2)),  # throughput: real departures
+        queue.sum(axis=(0, 2)),                                       # wait_time
+        queue.max(axis=2).sum(axis=0),                                # queue_length
+        np.maximum(queue - previous, 0).sum(axis=(0, 2)),             # stops
+    ), axis=1)
+    np.testing.assert_allclose(engine.features, expected, rtol=1e-5)
+
+
+def test_interval_reward_is_the_sum_of_step_rewards():
+    arms, departures = _interval(np.random.default_rng(2))
+    start = np.random.default_rng(3).random((JUNCTIONS * ARMS, 3)).astype(np.float32)
+    bulk, single = _engine(), _engine()
+    bulk.reset(start)
+    single.reset(start)
+    total = sum(single.compute(arms[t], departures[t])[0].copy() for t in range(STEPS))
+    np.testing.assert_allclose(bulk.compute(arms, departures)[0], total, rtol=1e-5)
+
+
+def test_unknown_weight_is_rejected():
+    with pytest.raises(ValueError):
+        _engine(weights={'speed': 1.0})
+
+
+def test_running_statistics_round_trip():
+    engine = _engine('running')
+    rng = np.random.default_rng(4)
+    engine.reset(np.zeros((JUNCTIONS * ARMS, 3), dtype=np.float32))
+    for _ in range(RewardEngine.STD_REFRESH + 10):
+        engine.compute(*_interval(rng))
+    state = engine.state_dict()
+    previous_queue = engine.previous_queue.copy()
+    arms, departures = _interval(rng)
+    expected = engine.compute(arms, departures)[0].copy()
+
+    restored = _engine('running')
+    restored.load_state_dict(state)
+    restored.reset(np.zeros((JUNCTIONS * ARMS, 3), dtype=np.float32))
+    restored.previous_queue[:] = previous_queue  # within an episode, not part of the checkpoint
+    np.testing.assert_allclose(restored.compute(arms, departures)[0], expected, rtol=1e-5)
@@ -0,0 +1,48 @@
+import numpy as np
+from src.utils.segment_tree import MinSegmentTree, SumSegmentTree
+
+
+def test_sum_and_min_follow_the_leaves():
+    rng = np.random.default_rng(0)
+    values = rng.random(100)
+    sum_tree, min_tree = SumSegmentTree(100), MinSegmentTree(100)
+    for i, v in enumerate(values):
+        sum_tree[i] = v
+        min_tree[i] = v
+    assert np.isclose(sum_tree.sum(), values.sum())
+    assert min_tree.min() == values.min()
+
+
+def test_batched_update_matches_single_updates_last_value_wins():
+    rng = np.random.default_rng(1)
+    single, batched = SumSegmentTree(37), SumSegmentTree(37)
+    indices = rng.integers(0, 37, 200)
+    values = rng.random(200)
+    for i, v in zip(indices, values):
+        single[int(i)] = v
+    batched.update(indices, values)
+    np.testing.assert_allclose(batched.tree, single.tree)
+
+
+def test_build_matches_updates():
+    values = np.random.default_rng(2).random(50)
+    built, updated = MinSegmentTree(50), MinSegmentTree(50)
+    built.build(values)
+    updated.update(np.arange(50), values)
+    np.testing.assert_array_equal(built.tree, updated.tree)
+
+
+def test_prefix_sum_search():
+    tree = SumSegmentTree(8)
+    tree.build(np.array([1.0, 0.0, 2.0, 3.0, 0.0, 0.0, 4.0, 0.0]))
+    # Cumulative: [0,1) -> 0, [1,3) -> 2, [3,6) -> 3, [6,10) -> 6; empty leaves are never hit
+    np.testing.assert_array_equal(tree.find_prefixsum_idx([0.0, 0.99, 1.0, 2.5, 3.0, 5.9, 6.0, 9.99]),
+                                  [0, 0, 2, 2, 3, 3, 6, 6])
+
+
+def test_sampling_frequency_follows_priorities():
+    priorities = np.array([1.0, 2.0, 3.0, 4.0])
+    tree = SumSegmentTree(4)
+    tree.build(priorities)
+    draws = tree.find_prefixsum_idx(np.random.default_rng(3).random(40000) * tree.sum())
+    np.testing.assert_allclose(np.bincount(draws, minlength=4) / len(draws), priorities / priorities.sum(), atol=0.01)
@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+import torch
+from src.utils.memory import ReplayBuffer
+
+STATE_SIZE, ACTIONS, CAPACITY = 6, 3, 64
+
+
+def _buffer(storage, **storage_kwargs):
+    return ReplayBuffer(ACTIONS, CAPACITY, 8, torch.device("cpu"), state_size=STATE_SIZE, storage=storage,
+                        storage_kwargs=storage_kwargs)
+
+
+def _fill(buffer, n, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        buffer.add(rng.random(STATE_SIZE, dtype=np.float32), int(rng.integers(ACTIONS)), float(rng.random()),
+                   rng.random(STATE_SIZE, dtype=np.float32), False)
+
+
+def test_memmap_state_dict_refers_to_the_files(tmp_path):
+    buffer = _buffer('memmap', path=str(tmp_path / "a"))
+    _fill(buffer, 100)
+    state = buffer.state_dict()
+    assert 'arrays' not in state['memory']  # nothing copied into the checkpoint
+    assert state['memory']['path'] == str(tmp_path / "a")
+
+    restored = _buffer('memmap', path=str(tmp_path / "b"))
+    restored.load_state_dict(state)
+    assert len(restored.memory) == len(buffer.memory) == CAPACITY
+    assert restored.memory.path == str(tmp_path / "a")
+    for name, array in buffer.memory.arrays.items():
+        np.testing.assert_array_equal(restored.memory.arrays[name], array)
+
+
+def test_memmap_rejects_another_capacity(tmp_path):
+    buffer = _buffer('memmap', path=str(tmp_path / "a"))
+    _fill(buffer, 10)
+    state = buffer.state_dict()
+    other = ReplayBuffer(ACTIONS, CAPACITY * 2, 8, torch.device("cpu"), state_size=STATE_SIZE, storage='memmap',
+                         storage_kwargs={'path': str(tmp_path / "b")})
+    with pytest.raises(ValueError):
+        other.load_state_dict(state)
+
+
+def test_memmap_refuses_checkpoints_the_files_moved_past(tmp_path):
+    buffer = _buffer('memmap', path=str(tmp_path / "a"))
+    _fill(buffer, 10)
+    state = buffer.state_dict()
+    assert state['memory']['writes'] == 10
+    _fill(buffer, 5, seed=1)  # overwrites nothing yet, but the ring pointers moved on
+    for target in (buffer, _buffer('memmap', path=str(tmp_path / "b"))):
+        with pytest.raises(ValueError, match="written since this checkpoint"):
+            target.load_state_dict(state)
+    assert buffer.memory.path == str(tmp_path / "a") and len(buffer.memory) == 15
+    # The current state is still fine
+    _buffer('memmap', path=str(tmp_path / "c")).load_state_dict(buffer.state_dict())
+
+
+def test_memmap_write_counter_survives_a_reopen(tmp_path):
+    buffer = _buffer('memmap', path=str(tmp_path / "a"))
+    _fill(buffer, 10)
+    state = buffer.state_dict()
+    buffer.flush()
+    del buffer
+    reopened = _buffer('memmap', path=str(tmp_path / "a"))
+    assert reopened.memory.write_counter[0] == 10
+    reopened.load_state_dict(state)
+    _fill(reopened, 1)
+    with pytest.raises(ValueError):
+        _buffer('memmap', path=str(tmp_path / "b")).load_state_dict(state)
+
+
+def _transitions(n, offset=0):
+    states = np.arange(offset, offset + n, dtype=np.float32)[:, None] * np.ones(STATE_SIZE, dtype=np.float32)
+    return (states, np.arange(n) % ACTIONS, np.arange(offset, offset + n, dtype=np.float32), states + 1,
+            np.zeros(n, dtype=np.float32))
+
+
+def test_array_storage_ring_wraps_around():
+    from src.utils.storage import ArrayStorage, transition_fields
+    storage = ArrayStorage(8, transition_fields(STATE_SIZE))
+    storage.add_batch(*_transitions(5))
+    slots = storage.add_batch(*_transitions(5, offset=5))
+    assert slots.tolist() == [5, 6, 7, 0, 1]
+    assert (len(storage), storage.tail, storage.pos) == (8, 2, 2)
+    # The oldest valid slot holds transition 2, the newest transition 9
+    rewards = storage.gather((storage.tail + np.arange(8)) % 8)[2]
+    assert rewards[:, 0].tolist() == list(range(2, 10))
+
+
+def test_array_storage_gathers_into_preallocated_rows():
+    from src.utils.storage import ArrayStorage, transition_fields
+    fields = transition_fields(STATE_SIZE)
+    storage = ArrayStorage(16, fields)
+    for row in zip(*_transitions(10)):
+        storage.add(*row)
+    out = tuple(np.zeros((4,) + shape, dtype=dtype) for shape, dtype in fields.values())
+    gathered = storage.gather(np.array([0, 3, 3, 9]), out=out)
+    assert all(g is o for g, o in zip(gathered, out))  # written in place
+    assert out[0][:, 0].tolist() == [0, 3, 3, 9]
+    assert out[3][:, 0].tolist() == [1, 4, 4, 10]
+
+
+def _frame_storage(capacity=8):
+    from src.utils.storage import FrameStorage, transition_fields
+    return FrameStorage(capacity, transition_fields(STATE_SIZE))
+
+
+def test_frame_storage_reconstructs_states_and_next_states():
+    storage = _frame_storage()
+    rng = np.random.default_rng(0)
+    episode = rng.random((6, STATE_SIZE), dtype=np.float32)
+    other = rng.random((3, STATE_SIZE), dtype=np.float32)
+    transitions = [(episode[t], t % ACTIONS, float(t), episode[t + 1], 0.0) for t in range(5)]
+    transitions += [(other[t], 0, -1.0, other[t + 1], float(t == 1)) for t in range(2)]  # a new episode
+    for transition in transitions:
+        storage.add(*transition)
+    # One observation per step within an episode, plus the first of each episode
+    assert storage.obs_count == 6 + 3
+
+    states, actions, rewards, next_states, dones = storage.gather(np.arange(len(transitions)))
+    for i, (state, action, reward, next_state, done) in enumerate(transitions):
+        np.testing.assert_array_equal(states[i], state)
+        np.testing.assert_array_equal(next_states[i], next_state)
+        assert (actions[i], rewards[i], dones[i]) == (action, reward, done)
+
+
+def test_frame_storage_evicts_transitions_whose_frames_are_gone():
+    from src.utils.storage import FrameStorage, transition_fields
+    storage = FrameStorage(8, transition_fields(STATE_SIZE), obs_capacity=6)
+    evicted = []
+    storage.on_evict = evicted.append
+    frames = np.arange(12 * STATE_SIZE, dtype=np.float32).reshape(12, STATE_SIZE)
+    for t in range(8):
+        storage.add(frames[t], 0, 0.0, frames[t + 1], 0.0)
+    assert len(storage) == 5 and evicted == [0, 1, 2]
+    states, _, _, next_states, _ = storage.gather((storage.tail + np.arange(len(storage))) % storage.capacity)
+    np.testing.assert_array_equal(states, frames[3:8])
+    np.testing.assert_array_equal(next_states, frames[4:9])
+
+
+def test_memmap_buffer_reopens_after_flush(tmp_path):
+    buffer = _buffer('memmap', path=str(tmp_path))
+    _fill(buffer, 20)
+    buffer.update_priorities(np.arange(5), np.full(5, 3.0))
+    buffer.flush()
+    total = buffer.sum_tree.sum()
+
+    reopened = _buffer('memmap', path=str(tmp_path))
+    assert len(reopened.memory) == 20
+    assert reopened.sum_tree.sum() == pytest.approx(total)
+    for name, array in buffer.memory.arrays.items():
+        np.testing.assert_array_equal(reopened.memory.arrays[name][:20], array[:20])
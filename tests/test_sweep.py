@@ -0,0 +1,72 @@
+import copy
+import threading
+import pytest
+import yaml
+from src.training.sweep import SweepRunner, _keep_going, apply_overrides, expand_space, rungs, run_trial
+
+
+def test_grid_is_the_cartesian_product():
+    trials = expand_space({'agent.gamma': [0.9, 0.99], 'agent.batch_size': [32, 64, 128]}, 'grid')
+    assert len(trials) == 6
+    assert {'agent.gamma': 0.99, 'agent.batch_size': 64} in trials
+    with pytest.raises(ValueError, match="list of values"):
+        expand_space({'agent.gamma': {'low': 0.9, 'high': 0.99}}, 'grid')
+
+
+def test_random_draws_stay_in_range():
+    space = {'agent.learning_rate': {'low': 1e-4, 'high': 1e-2, 'log': True},
+             'agent.update_every': {'low': 1, 'high': 8, 'int': True}}
+    trials = expand_space(space, 'random', num_trials=20, seed=3)
+    assert trials == expand_space(space, 'halving', num_trials=20, seed=3)
+    for params in trials:
+        assert 1e-4 <= params['agent.learning_rate'] <= 1e-2
+        assert isinstance(params['agent.update_every'], int) and 1 <= params['agent.update_every'] <= 8
+
+
+def test_overrides_go_into_copies(base_sim_config, base_agent_config):
+    sim_config, agent_config = apply_overrides(
+        base_sim_config, base_agent_config, {'agent.gamma': 0.5, 'env.reward_weights.wait_time': -3.0})
+    assert agent_config['agent']['gamma'] == 0.5
+    assert sim_config['env']['reward_weights']['wait_time'] == -3.0
+    assert base_agent_config['agent']['gamma'] != 0.5
+    with pytest.raises(ValueError, match="Unknown config key"):
+        apply_overrides(base_sim_config, base_agent_config, {'agent.gama': 0.5})
+    with pytest.raises(ValueError, match="belongs to"):
+        apply_overrides(base_sim_config, base_agent_config, {'model.gamma': 0.5})
+
+
+def test_halving():
+    assert rungs(10, 90, 3) == [10, 30]
+    lock = threading.Lock()
+    rung_scores = {}
+    # The first eta trials at a rung always continue, after that only the top 1/eta
+    assert _keep_going(rung_scores, 10, 1.0, 3, lock)
+    assert _keep_going(rung_scores, 10, 5.0, 3, lock)
+    assert not _keep_going(rung_scores, 10, 2.0, 3, lock)
+    assert _keep_going(rung_scores, 10, 6.0, 3, lock)
+    assert rung_scores[10] == [1.0, 5.0, 2.0, 6.0]
+
+
+def _trial_configs(sim_config, base_agent_config, tmp_path):
+    agent_config = copy.deepcopy(base_agent_config)
+    agent_config['agent'].update(n_step=1, prefetch_batches=0)
+    sweep_config = {'episodes': 1, 'strategy': 'random', 'seed': 100, 'log_dir': str(tmp_path)}
+    return sim_config, agent_config, sweep_config
+
+
+def test_trial_seed(sim_config, base_agent_config, tmp_path):
+    sim_config, agent_config, sweep_config = _trial_configs(sim_config, base_agent_config, tmp_path)
+    run_trial(2, {}, sim_config, agent_config, sweep_config)
+    run_trial(3, {'simulation.random_seed': 7}, sim_config, agent_config, sweep_config)
+    seeds = []
+    for trial in ("trial_002", "trial_003"):
+        with open(tmp_path / trial / "config.yaml") as f:
+            seeds.append(yaml.safe_load(f)['simulation']['simulation']['random_seed'])
+    # Seeds in the search space win over the per-trial ones
+    assert seeds == [102, 7]
+
+
+def test_empty_results_table(base_sim_config, base_agent_config, tmp_path):
+    runner = SweepRunner({'log_dir': str(tmp_path)}, base_sim_config, base_agent_config)
+    runner._write_table([])
+    assert not list(tmp_path.rglob("results.csv"))
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import torch
+from src.agents.dqn_agent import DQNAgent
+from src.analysis.telemetry import RingBuffer, Telemetry, TensorRingBuffer
+
+
+@pytest.mark.parametrize("ring", [RingBuffer, TensorRingBuffer])
+def test_ring_wraps_around(ring):
+    buffer = ring(5, (2,))
+    for i in range(7):
+        buffer.record(torch.full((2,), float(i)) if ring is TensorRingBuffer else np.full(2, i))
+    window = buffer.since(2)
+    assert isinstance(window, np.ndarray)
+    # Rows 2..6 live in slots 2, 3, 4, 0, 1: the window crosses the wrap, oldest first
+    np.testing.assert_array_equal(window[:, 0], [2, 3, 4, 5, 6])
+    np.testing.assert_array_equal(buffer.since(5)[:, 0], [5, 6])
+    np.testing.assert_array_equal(buffer.since(0)[:, 0], [2, 3, 4, 5, 6])  # older rows are gone
+    assert buffer.since(7).shape == (0, 2)
+
+
+def test_aggregation(tmp_path):
+    telemetry = Telemetry(None, str(tmp_path), capacity=100, aggregate_every=4)
+    telemetry.add_channel("reward", 2, fields=('wait', 'queue'))
+    telemetry.add_action_channel("action", 3)
+    for step in range(4):
+        telemetry.record("reward", [[step, 10.0], [step, 20.0]])
+        telemetry.record("action", step % 2)
+        telemetry.tick()
+    with pytest.raises(ValueError):
+        telemetry.add_channel("late")
+    telemetry.close()
+    lines = open(tmp_path / "telemetry.csv").read().splitlines()
+    columns, row = lines[0].split(","), [float(v) for v in lines[1].split(",")]
+    values = dict(zip(columns, row))
+    assert values['Step'] == 4
+    assert values['reward/wait/mean'] == pytest.approx(1.5)
+    assert values['reward/queue/mean'] == pytest.approx(15.0)
+    assert (values['action/a0'], values['action/a1'], values['action/a2']) == (0.5, 0.5, 0.0)
+
+
+def test_learn_statistics_stay_on_the_agent_device(tmp_path, base_agent_config):
+    config = dict(base_agent_config['agent'], n_step=1, prefetch_batches=0, batch_size=8, update_every=1)
+    agent = DQNAgent(4, 3, 0, config)
+    telemetry = Telemetry(None, str(tmp_path), aggregate_every=1000)
+    agent.attach_telemetry(telemetry)
+    channel = telemetry.channels["learn"]
+    assert isinstance(channel, TensorRingBuffer) and channel.data.device.type == agent.device.type
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        agent.step(rng.random(4, dtype=np.float32), 0, 1.0, rng.random(4, dtype=np.float32), False)
+    assert channel.count == 20 - config['batch_size']  # learns once the buffer holds more than a batch
+    telemetry.aggregate()
+    telemetry.close()
+    lines = open(tmp_path / "telemetry.csv").read().splitlines()
+    values = dict(zip(lines[0].split(","), (float(v) for v in lines[1].split(","))))
+    assert values['learn/loss/mean'] > 0
+    assert all(np.isfinite(v) for k, v in values.items() if k.startswith('learn/'))
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from src.agents.dqn_agent import DQNAgent
+from src.core.vector_env import make_vector_env
+
+
+@pytest.mark.parametrize("backend", ["sync", "subprocess"])
+def test_episodes_are_truncated_and_reset(sim_config, backend):
+    vec_env = make_vector_env(sim_config, 2, backend, max_episode_steps=3)
+    try:
+        obs, infos = vec_env.reset(seed=0)
+        assert obs.shape == (2,) + vec_env.observation_space.shape
+        for step in range(1, 4):
+            actions = [int(np.flatnonzero(info['action_mask'])[0]) for info in infos]
+            obs, rewards, terminated, truncated, infos = vec_env.step(actions)
+            assert rewards.shape == (2,)
+            assert truncated.all() == (step == 3)
+        for info in infos:
+            assert info['final_observation'].shape == vec_env.observation_space.shape
+            assert 'action_mask' in info['final_info']
+    finally:
+        vec_env.close()
+
+
+def test_unknown_backend(sim_config):
+    with pytest.raises(ValueError, match="backend"):
+        make_vector_env(sim_config, 2, backend='threads')
+
+
+def _agent(base_agent_config, state_size=6, action_size=4):
+    return DQNAgent(state_size, action_size, 0, dict(base_agent_config['agent'], n_step=1, prefetch_batches=0))
+
+
+def test_act_batch_is_greedy_like_act(base_agent_config):
+    agent = _agent(base_agent_config)
+    states = np.random.default_rng(0).random((16, 6), dtype=np.float32)
+    masks = np.random.default_rng(1).random((16, 4)) < 0.5
+    masks[:, 0] = True
+    actions = agent.act_batch(states, eps=0.0, masks=masks)
+    expected = [agent.act(state, eps=0.0, mask=mask) for state, mask in zip(states, masks)]
+    np.testing.assert_array_equal(actions, expected)
+
+
+def test_act_batch_explores_valid_actions_only(base_agent_config):
+    agent = _agent(base_agent_config)
+    states = np.zeros((500, 6), dtype=np.float32)
+    masks = np.zeros((500, 4), dtype=bool)
+    masks[:, [1, 3]] = True
+    np.random.seed(0)
+    actions = agent.act_batch(states, eps=1.0, masks=masks)
+    assert set(actions) == {1, 3}
+    assert set(agent.act_batch(states, eps=1.0)) == {0, 1, 2, 3}
+
+
+def test_each_env_gets_its_own_seed(sim_config):
+    vec_env = make_vector_env(sim_config, 3)
+    try:
+        seeds = [env.config['simulation']['random_seed'] for env in vec_env.envs]
+    finally:
+        vec_env.close()
+    base = sim_config['simulation']['random_seed']
+    assert seeds == [base, base + 1, base + 2]